@@ -372,7 +372,8 @@ class DataService {
           final filename = p.basename(entity.path);
           if (filename.endsWith('.jpg') ||
               filename.endsWith('.jpeg') ||
-              filename.endsWith('.png')) {
+              filename.endsWith('.png') ||
+              filename.endsWith('.webp')) {
             if (filename.toLowerCase() != 'cover.jpg') {
               imagePaths.add(entity.path);
             }
@@ -0,0 +1,327 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "requests",
+#     "Pillow",
+# ]
+# ///
+"""
+Offline benchmark for create_and_fetch_tvshows.py.
+
+Starts a local stand-in for the TMDB API and image CDN (search, details and image
+endpoints, with configurable latency, error rate and 429 injection), points the
+fetcher at it and runs it end-to-end over synthetic catalogs. Reports titles/sec,
+p50/p95 per-title latency and bytes/sec, and can compare against a saved run.
+
+Usage:
+    python scripts/bench_fetcher.py --sizes 10,100 --latency-ms 20 --output bench.json
+    python scripts/bench_fetcher.py --sizes 10,100 --compare bench.json
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Lower-is-better metrics, everything else in a run result is higher-is-better
+LOWER_IS_BETTER = {'p50_latency_ms', 'p95_latency_ms', 'wall_seconds'}
+BACKDROPS_PER_TITLE = 12
+IMAGE_VARIANTS = 16
+
+
+def _make_jpeg(size, seed):
+    """A small but valid JPEG whose content depends on `seed`, so hashes differ between variants."""
+    from PIL import Image
+    rng = random.Random(seed)
+    x0, y0 = rng.uniform(-2.2, -0.5), rng.uniform(-1.2, 0.2)
+    span = rng.uniform(0.3, 1.5)
+    img = Image.effect_mandelbrot(size, (x0, y0, x0 + span * 16 / 9, y0 + span), 40 + seed % 60).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class FakeTMDBServer(ThreadingHTTPServer):
+    """In-process stand-in for api.themoviedb.org and image.tmdb.org."""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), FakeTMDBHandler)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'errors_injected': 0, 'rate_limited': 0}
+        # Thumbnails are hashed by the fetcher, originals are only written to disk
+        self.thumbnails = [_make_jpeg((300, 169), seed) for seed in range(IMAGE_VARIANTS)]
+        self.originals = [_make_jpeg((1280, 720), seed) for seed in range(IMAGE_VARIANTS)]
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections after a 429/503 are expected here
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def roll(self):
+        """Decides the fate of one request: None, 'error' or 'rate_limit'."""
+        with self.lock:
+            value = self.rng.random()
+        if value < self.rate_limit_rate:
+            return 'rate_limit'
+        if value < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return None
+
+
+def title_id(title):
+    return zlib.crc32(title.encode('utf-8')) % 900000 + 1000
+
+
+def fake_details(media_type, media_id):
+    backdrops = [{
+        'file_path': f"/bd_{media_id}_{k}.jpg",
+        'width': 1920, 'height': 1080, 'aspect_ratio': 1.778,
+        'vote_average': round(5 + (media_id + k) % 5 * 0.5, 1), 'vote_count': (media_id + k) % 20,
+        'iso_639_1': None if k % 3 else 'en',
+    } for k in range(BACKDROPS_PER_TITLE)]
+    details = {
+        'id': media_id,
+        'overview': f"Synthetic overview for {media_type} {media_id}. " * 4,
+        'poster_path': f"/poster_{media_id}.jpg",
+        'images': {'backdrops': backdrops, 'posters': [], 'logos': []},
+    }
+    if media_type == 'tv':
+        details.update(name=f"Show {media_id}", number_of_episodes=media_id % 60 + 1)
+    else:
+        details.update(title=f"Movie {media_id}")
+    return details
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass # Keep the benchmark output readable
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.stats['bytes_sent'] += len(body)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.stats['requests'] += 1
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + server.rng.uniform(-server.jitter, server.jitter)))
+
+        fate = server.roll()
+        if fate == 'rate_limit':
+            with server.lock:
+                server.stats['rate_limited'] += 1
+            return self._send(429, b'{"status_code":25}', headers={'Retry-After': '0'})
+        if fate == 'error':
+            with server.lock:
+                server.stats['errors_injected'] += 1
+            return self._send(503, b'{"status_code":11}')
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+
+        match = re.fullmatch(r'/3/search/(tv|movie)', path)
+        if match:
+            media_type, title = match.group(1), query.get('query', [''])[0]
+            # Titles ending in "(movie)" only exist as movies, to exercise the fallback search
+            is_movie = title.endswith('(movie)')
+            if (media_type == 'movie') != is_movie:
+                return self._send_json({'results': []})
+            media_id = title_id(title)
+            name_field = 'title' if is_movie else 'name'
+            return self._send_json({'results': [{'id': media_id, name_field: title, 'overview': 'synthetic'}]})
+
+        match = re.fullmatch(r'/3/(tv|movie)/(\d+)', path)
+        if match:
+            return self._send_json(fake_details(match.group(1), int(match.group(2))))
+
+        match = re.fullmatch(r'/t/p/(\w+)/(\w+)\.jpg', path)
+        if match:
+            variant = zlib.crc32(match.group(2).encode()) % IMAGE_VARIANTS
+            images = server.thumbnails if match.group(1).startswith('w') else server.originals
+            return self._send(200, images[variant], content_type='image/jpeg')
+
+        self._send(404, b'{"status_code":34}')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(fraction * len(ordered) + 0.5 - 1e-9))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def configure_fetcher(fetcher, server, output_dir):
+    fetcher.TMDB_API_KEY = 'offline-benchmark'
+    fetcher.TMDB_API_BASE_URL = f"{server.base_url}/3"
+    fetcher.TMDB_IMAGE_BASE_URL = f"{server.base_url}/t/p/original"
+    fetcher.TMDB_THUMB_BASE_URL = f"{server.base_url}/t/p/w300"
+    fetcher.TV_SHOWS_BASE_PATH = str(output_dir)
+    fetcher.RETRY_BACKOFF_SECONDS = 0.01
+
+
+def run_catalog(fetcher, server, size, seed):
+    """Runs the fetcher over `size` synthetic titles and returns the run metrics."""
+    rng = random.Random(seed)
+    titles = [f"Bench Title {i:05d}" + (" (movie)" if rng.random() < 0.2 else "") for i in range(size)]
+
+    with tempfile.TemporaryDirectory(prefix='bench_fetcher_') as output_dir:
+        configure_fetcher(fetcher, server, output_dir)
+        server.reset_stats()
+        latencies = []
+        failures = 0
+        wall_start = time.perf_counter()
+        for title in titles:
+            start = time.perf_counter()
+            try:
+                selected = fetcher.search_media(fetcher.TMDB_API_KEY, title, interactive=False)
+                if not selected:
+                    failures += 1
+                for media_data in selected:
+                    fetcher.process_single_media_data(media_data)
+            except Exception as e:
+                logging.error(f"Title '{title}' failed: {e}", exc_info=True)
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - wall_start
+        files_written = sum(1 for p in Path(output_dir).rglob('*') if p.is_file())
+
+    stats = dict(server.stats)
+    return {
+        'titles': size,
+        'failures': failures,
+        'files_written': files_written,
+        'wall_seconds': round(wall, 4),
+        'titles_per_sec': round(size / wall, 3) if wall else 0,
+        'p50_latency_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_latency_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'bytes_per_sec': round(stats['bytes_sent'] / wall) if wall else 0,
+        'requests': stats['requests'],
+        'bytes': stats['bytes_sent'],
+        'errors_injected': stats['errors_injected'],
+        'rate_limited': stats['rate_limited'],
+    }
+
+
+def compare_runs(baseline, current):
+    """Prints the relative change of every metric per catalog size; returns the worst regression in %."""
+    worst = 0.0
+    for size, metrics in current['runs'].items():
+        base = baseline.get('runs', {}).get(size)
+        if not base:
+            print(f"[{size} titles] no baseline run to compare with")
+            continue
+        print(f"[{size} titles] change vs baseline:")
+        for key in ('titles_per_sec', 'p50_latency_ms', 'p95_latency_ms', 'bytes_per_sec', 'requests'):
+            if not base.get(key):
+                continue
+            change = (metrics[key] - base[key]) * 100 / base[key]
+            regression = change if key in LOWER_IS_BETTER else -change
+            if key != 'requests':
+                worst = max(worst, regression)
+            marker = '  <-- regression' if regression > 5 and key != 'requests' else ''
+            print(f"  {key:>16}: {base[key]:>12} -> {metrics[key]:>12} ({change:+.1f}%){marker}")
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark create_and_fetch_tvshows.py against a local fake TMDB server.")
+    parser.add_argument('--sizes', default='10,100', help='Comma-separated synthetic catalog sizes (default: %(default)s).')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Added latency per request in ms (default: %(default)s).')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform +/- jitter on the latency in ms (default: %(default)s).')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503 (default: %(default)s).')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with 429 (default: %(default)s).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for catalogs and fault injection (default: %(default)s).')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against.')
+    parser.add_argument('--fail-threshold', type=float, help='With --compare, exit with status 1 if any metric regresses by more than this many percent.')
+    parser.add_argument('--verbose', action='store_true', help="Show the fetcher's own log messages.")
+    args = parser.parse_args()
+
+    # Configure logging before importing the fetcher so its per-request chatter stays out of the way
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    sys.path.insert(0, str(Path(__file__).parent))
+    import create_and_fetch_tvshows as fetcher
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    server = FakeTMDBServer(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.seed).start()
+    results = {
+        'config': {key: getattr(args, key) for key in ('latency_ms', 'jitter_ms', 'error_rate', 'rate_limit_rate', 'seed')},
+        'runs': {},
+    }
+    try:
+        for size in sizes:
+            print(f"Running {size} titles...", flush=True)
+            metrics = run_catalog(fetcher, server, size, args.seed)
+            results['runs'][str(size)] = metrics
+            print(f"  {metrics['titles_per_sec']} titles/s, p50 {metrics['p50_latency_ms']} ms, "
+                  f"p95 {metrics['p95_latency_ms']} ms, {metrics['bytes_per_sec'] / 1024 / 1024:.2f} MiB/s, "
+                  f"{metrics['requests']} requests ({metrics['rate_limited']} x 429, {metrics['errors_injected']} x 503), "
+                  f"{metrics['failures']} failed titles")
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        worst = compare_runs(baseline, results)
+        if args.fail_threshold is not None and worst > args.fail_threshold:
+            print(f"Worst regression {worst:.1f}% exceeds {args.fail_threshold}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
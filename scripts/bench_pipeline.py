@@ -0,0 +1,259 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "Pillow",
+# ]
+# ///
+"""
+Synthetic-catalog benchmarks for the image and archive pipelines.
+
+`generate` builds an assets/tv_shows-style tree with a configurable number of shows,
+stills in a mix of formats (PNG with alpha, palette GIF, large TIFF, JPEG), init.json
+files with quotes and theme songs. `run` generates trees at several scales and times
+the rename/convert pass of manage_tv_shows.py, the JSON pass, and create_tvshows_archive.py,
+writing machine-readable results.
+
+Usage:
+    python scripts/bench_pipeline.py generate --shows 42 --output /tmp/tv_shows
+    python scripts/bench_pipeline.py run --shows 42,500 --output bench_pipeline.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+# Relative weights of the still formats in a generated show
+FORMAT_MIX = {'jpeg': 5, 'png_alpha': 2, 'gif_palette': 1, 'tiff_large': 1}
+STILL_SIZE = (1280, 720)
+COVER_SIZE = (500, 750)
+# A silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, stereo, 417 bytes
+_MP3_FRAME = struct.pack('>I', 0xFFFB9064) + bytes(413)
+
+
+def _base_image(size, rng):
+    """A cheap, photo-like (smooth, not noise) RGB image."""
+    gradient = Image.linear_gradient('L').resize(size)
+    radial = Image.radial_gradient('L').resize(size)
+    img = Image.merge('RGB', (gradient, radial, gradient.rotate(180)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        w, h = rng.randrange(20, size[0] // 3), rng.randrange(20, size[1] // 3)
+        draw.ellipse((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img
+
+
+def write_still(path_base, kind, rng, tiff_size):
+    """Writes one still of the given kind and returns its path."""
+    if kind == 'jpeg':
+        path = path_base.with_suffix('.jpg')
+        _base_image(STILL_SIZE, rng).save(path, 'JPEG', quality=92)
+    elif kind == 'png_alpha':
+        path = path_base.with_suffix('.png')
+        img = _base_image(STILL_SIZE, rng).convert('RGBA')
+        img.putalpha(Image.radial_gradient('L').resize(STILL_SIZE))
+        img.save(path, 'PNG')
+    elif kind == 'gif_palette':
+        path = path_base.with_suffix('.gif')
+        _base_image(STILL_SIZE, rng).quantize(colors=128).save(path, 'GIF')
+    elif kind == 'tiff_large':
+        path = path_base.with_suffix('.tiff')
+        _base_image(tiff_size, rng).save(path, 'TIFF')
+    else:
+        raise ValueError(f"Unknown still kind: {kind}")
+    return path
+
+
+def generate_catalog(output_dir, shows=42, images_per_show=8, max_quotes=15, theme_song_seconds=30,
+                     tiff_size=(4000, 3000), seed=0):
+    """Builds a synthetic tv_shows tree in `output_dir` and returns (show_count, image_count, total_bytes)."""
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    kinds = [kind for kind, weight in FORMAT_MIX.items() for _ in range(weight)]
+    # 44100 / 1152 frames per second
+    theme_song = _MP3_FRAME * int(theme_song_seconds * 44100 / 1152)
+    image_count = 0
+
+    for show_index in range(shows):
+        name = f"合成剧集 {show_index:05d}"
+        show_dir = output_dir / name
+        show_dir.mkdir(exist_ok=True)
+        quotes = [f"第 {show_index} 部剧的第 {i} 句台词，{'很长的台词内容' * rng.randrange(1, 6)}。"
+                  for i in range(rng.randrange(0, max_quotes + 1))]
+        data = {
+            "name": name,
+            "tmdb_id": 100000 + show_index,
+            "media_type": "tv",
+            "overview": "合成的剧情简介。" * rng.randrange(5, 30),
+            "progress": {"current": 0, "total": rng.randrange(1, 60)},
+            "favorite": False,
+            "lines": quotes,
+            "thoughts": [],
+            "alias": "",
+            "inline_lines": {},
+        }
+        with open(show_dir / "init.json", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        _base_image(COVER_SIZE, rng).save(show_dir / "cover.jpg", 'JPEG', quality=90)
+        (show_dir / "themesong.mp3").write_bytes(theme_song)
+        for image_index in range(images_per_show):
+            write_still(show_dir / f"download-{image_index}", rng.choice(kinds), rng, tiff_size)
+            image_count += 1
+
+    total_bytes = sum(p.stat().st_size for p in output_dir.rglob('*') if p.is_file())
+    return shows, image_count, total_bytes
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_scale(shows, args, work_dir):
+    """Generates a catalog of `shows` shows and times each pipeline pass on it."""
+    import manage_tv_shows
+    import create_tvshows_archive
+
+    tree = work_dir / f"tv_shows_{shows}"
+    archive_path = work_dir / f"tv_shows_{shows}.zip"
+    (show_count, image_count, source_bytes), generate_seconds = _timed(
+        generate_catalog, tree, shows, args.images_per_show, args.max_quotes,
+        args.theme_song_seconds, args.tiff_size, args.seed)
+
+    manage_tv_shows.TV_SHOWS_BASE_PATH = tree
+    show_dirs = sorted(d for d in tree.iterdir() if d.is_dir())
+
+    def convert_all():
+        with manage_tv_shows.BoundedImageConverter(args.workers, args.memory_budget) as converter:
+            ok = all([manage_tv_shows.rename_and_convert_images(d, args.format, None, converter) for d in show_dirs])
+        return ok, converter
+
+    def json_pass():
+        for show_dir in show_dirs:
+            manage_tv_shows.modify_json_field(show_dir, 'add', 'bench_marker', 'x')
+        for show_dir in show_dirs:
+            manage_tv_shows.modify_json_field(show_dir, 'delete', 'bench_marker')
+
+    (convert_ok, converter), convert_seconds = _timed(convert_all)
+    _, json_seconds = _timed(json_pass)
+    converted_bytes = sum(p.stat().st_size for p in tree.rglob('*') if p.is_file())
+    _, archive_seconds = _timed(create_tvshows_archive.zip_directory, str(tree), str(archive_path))
+    archive_bytes = archive_path.stat().st_size
+
+    result = {
+        'shows': show_count,
+        'images': image_count,
+        'source_bytes': source_bytes,
+        'converted_bytes': converted_bytes,
+        'archive_bytes': archive_bytes,
+        'generate_seconds': round(generate_seconds, 3),
+        'convert_seconds': round(convert_seconds, 3),
+        'convert_images_per_sec': round(image_count / convert_seconds, 2) if convert_seconds else 0,
+        'convert_ok': convert_ok,
+        'convert_peak_worker_rss_kb': converter.peak_worker_rss_kb,
+        'json_seconds': round(json_seconds, 3),
+        'json_files_per_sec': round(2 * show_count / json_seconds, 1) if json_seconds else 0,
+        'archive_seconds': round(archive_seconds, 3),
+        'archive_mb_per_sec': round(converted_bytes / 1024 / 1024 / archive_seconds, 2) if archive_seconds else 0,
+    }
+    if not args.keep:
+        shutil.rmtree(tree, ignore_errors=True)
+        archive_path.unlink(missing_ok=True)
+    return result
+
+
+def extrapolate(results, target_shows):
+    """Linear per-show extrapolation from the largest measured scale."""
+    largest = max(results, key=lambda r: r['shows'])
+    factor = target_shows / largest['shows']
+    return {key: round(largest[key] * factor, 1)
+            for key in ('convert_seconds', 'json_seconds', 'archive_seconds', 'archive_bytes')}
+
+
+def parse_size(value):
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-catalog benchmarks for the image and archive pipelines.")
+    subparsers = parser.add_subparsers(dest='command', required=True, help='Sub-command help')
+
+    def add_catalog_arguments(sub):
+        sub.add_argument('--images-per-show', type=int, default=8, help='Stills per show (default: %(default)s).')
+        sub.add_argument('--max-quotes', type=int, default=15, help='Maximum quotes per show (default: %(default)s).')
+        sub.add_argument('--theme-song-seconds', type=float, default=30, help='Length of the generated theme songs (default: %(default)s).')
+        sub.add_argument('--tiff-size', type=parse_size, default=(4000, 3000), help='Size of the large TIFF stills, WxH (default: 4000x3000).')
+        sub.add_argument('--seed', type=int, default=0, help='Random seed (default: %(default)s).')
+
+    parser_generate = subparsers.add_parser('generate', help='Generate a synthetic assets/tv_shows-style tree.')
+    parser_generate.add_argument('--shows', type=int, default=42, help='Number of shows (default: %(default)s).')
+    parser_generate.add_argument('--output', required=True, help='Directory to create the tree in.')
+    add_catalog_arguments(parser_generate)
+
+    parser_run = subparsers.add_parser('run', help='Generate catalogs and time the conversion, JSON and archive passes.')
+    parser_run.add_argument('--shows', default='42', help='Comma-separated catalog sizes to benchmark (default: %(default)s).')
+    parser_run.add_argument('--format', default='jpeg', help='Output format for the conversion pass (default: %(default)s).')
+    parser_run.add_argument('--workers', type=int, help='Conversion worker processes (default: CPU count).')
+    parser_run.add_argument('--memory-budget', type=int, default=1024, help='Conversion memory budget in MB (default: %(default)s).')
+    parser_run.add_argument('--extrapolate', type=int, default=5000, help='Estimate timings for this many shows (default: %(default)s).')
+    parser_run.add_argument('--work-dir', help='Where to build the catalogs (default: a temporary directory).')
+    parser_run.add_argument('--keep', action='store_true', help='Keep the generated trees and archives.')
+    parser_run.add_argument('--output', help='Write the results as JSON to this file.')
+    add_catalog_arguments(parser_run)
+
+    args = parser.parse_args()
+    # Keep the per-image log chatter of the benchmarked scripts out of the results
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    sys.path.insert(0, str(Path(__file__).parent))
+
+    if args.command == 'generate':
+        shows, images, total_bytes = generate_catalog(args.output, args.shows, args.images_per_show, args.max_quotes,
+                                                      args.theme_song_seconds, args.tiff_size, args.seed)
+        print(f"Generated {shows} shows, {images} stills, {total_bytes / 1024 / 1024:.1f} MiB in {args.output}")
+        return
+
+    scales = [int(value) for value in args.shows.split(',') if value.strip()]
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    results = {'config': {'images_per_show': args.images_per_show, 'format': args.format,
+                          'tiff_size': list(args.tiff_size), 'workers': args.workers or os.cpu_count()},
+               'runs': []}
+    try:
+        for shows in scales:
+            print(f"Benchmarking {shows} shows...", flush=True)
+            result = run_scale(shows, args, work_dir)
+            results['runs'].append(result)
+            print(f"  convert {result['convert_seconds']}s ({result['convert_images_per_sec']} images/s), "
+                  f"json {result['json_seconds']}s, archive {result['archive_seconds']}s "
+                  f"({result['archive_bytes'] / 1024 / 1024:.1f} MiB)")
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if results['runs'] and args.extrapolate:
+        results['extrapolated'] = {'shows': args.extrapolate, **extrapolate(results['runs'], args.extrapolate)}
+        estimate = results['extrapolated']
+        print(f"Estimated at {args.extrapolate} shows: convert {estimate['convert_seconds']}s, "
+              f"json {estimate['json_seconds']}s, archive {estimate['archive_seconds']}s "
+              f"({estimate['archive_bytes'] / 1024 / 1024:.0f} MiB)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Size and speed of the catalog serialization formats (catalog_codec.py) on our own data.
+
+Every init.json below the source directory (and catalog.json, if present) is encoded with each
+available codec. Reported per codec: total size, size after deflate (what the file costs in
+tv_shows_archive.zip and therefore in the APK), and encode / decode time, the best of
+--repeat runs. Each codec must also decode its output back to the original data.
+
+Times are for the Python implementations here; the app decodes with Dart, so they only rank
+the formats. For a larger catalog, point --source at a tree made by
+`bench_pipeline.py generate --shows 5000 --images-per-show 0 --output /tmp/tv_shows`.
+
+Usage:
+    python scripts/bench_serialization.py
+    python scripts/bench_serialization.py --source /tmp/tv_shows --repeat 3 --output bench_serialization.json
+"""
+import argparse
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import catalog_codec
+
+DEFAULT_SOURCE = Path(__file__).parent.parent / "assets" / "tv_shows"
+# zipfile's ZIP_DEFLATED uses zlib's default level
+DEFLATE_LEVEL = 6
+
+
+def load_documents(source):
+    """Returns [(relative path, data)] for catalog.json and every <show>/init.json below `source`."""
+    paths = sorted(source.glob('*/init.json'))
+    if (source / 'catalog.json').is_file():
+        paths.insert(0, source / 'catalog.json')
+    documents = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents.append((path.relative_to(source).as_posix(), json.load(f)))
+    return documents
+
+
+def _best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def bench_codec(codec, documents, repeat):
+    encoded, encode_seconds = _best_time(lambda: [codec.dumps(data) for _, data in documents], repeat)
+    decoded, decode_seconds = _best_time(lambda: [codec.loads(blob) for blob in encoded], repeat)
+    mismatches = [path for (path, data), value in zip(documents, decoded) if value != data]
+    return {
+        'codec': codec.name,
+        'bytes': sum(len(blob) for blob in encoded),
+        'deflated_bytes': sum(len(zlib.compress(blob, DEFLATE_LEVEL)) for blob in encoded),
+        'encode_ms': round(encode_seconds * 1000, 2),
+        'decode_ms': round(decode_seconds * 1000, 2),
+        'round_trip_ok': not mismatches,
+        'mismatches': mismatches[:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare size and encode/decode time of the catalog serialization formats.")
+    parser.add_argument('--source', type=Path, default=DEFAULT_SOURCE, help='tv_shows directory to read the JSON files from (default: assets/tv_shows).')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the fastest counts (default: %(default)s).')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    documents = load_documents(args.source)
+    if not documents:
+        parser.error(f"No init.json files found below {args.source}")
+    missing = [name for name in catalog_codec.CODEC_NAMES if name not in catalog_codec.CODECS]
+    results = {'source': str(args.source), 'documents': len(documents), 'repeat': args.repeat, 'missing_codecs': missing, 'codecs': []}
+    for codec in catalog_codec.CODECS.values():
+        results['codecs'].append(bench_codec(codec, documents, max(1, args.repeat)))
+
+    baseline = results['codecs'][0]
+    print(f"{len(documents)} documents from {args.source} (best of {args.repeat} runs)")
+    print(f"{'format':<10} {'bytes':>11} {'':>6} {'deflated':>11} {'':>6} {'encode ms':>10} {'decode ms':>10}")
+    for result in results['codecs']:
+        print(f"{result['codec']:<10} {result['bytes']:>11} {result['bytes'] / baseline['bytes']:>6.0%} "
+              f"{result['deflated_bytes']:>11} {result['deflated_bytes'] / baseline['deflated_bytes']:>6.0%} "
+              f"{result['encode_ms']:>10} {result['decode_ms']:>10}" + ("" if result['round_trip_ok'] else "  ROUND TRIP FAILED"))
+    if missing:
+        print(f"Not installed: {', '.join(missing)}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"Results written to {args.output}")
+    if not all(result['round_trip_ok'] for result in results['codecs']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "requests",
+#     "Pillow",
+# ]
+# ///
+"""
+Incremental asset build (`shuangju build`, run from anywhere inside the project):
+
+    fetch (per title) -> lines (per show) -> rename-images (per show) -> archive
+
+Every stage of every show is a task in a small DAG. A show's tasks only depend on the same
+show's earlier tasks, so different shows build in parallel, and the archive waits for all of
+them. A task is only scheduled when its outputs are out of date:
+
+    fetch          the title (save_lines.py or --fetch) has no show folder with an init.json yet;
+                   a save_lines.py title matches a folder spelled with different punctuation or width
+                   (亲爱的热爱的 -> 亲爱的，热爱的)
+    lines          init.json's "lines" differ from the quotes in save_lines.py (with --dedupe-lines: deduplicated)
+    rename-images  the show folder's listing (names, sizes, mtimes) or the image options differ
+                   from what the last successful build left behind, or an earlier stage ran
+    archive        a show task ran, or assets/tv_shows / the zip / --catalog-format / --minify-json
+                   changed since the last build; a failed fetch does not hold it back, the new title
+                   simply isn't in the archive yet
+
+Listings are fingerprinted from stat() alone, nothing is read, so a no-op build only costs a
+directory scan. Fingerprints are kept in .cache/build_state.json; --force ignores them.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import os
+import sys
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, wait
+import create_and_fetch_tvshows as fetcher
+import create_tvshows_archive
+import lazy_modules
+import manage_tv_shows
+import pipeline_logging
+import pipeline_metrics
+import pipeline_profiling
+import save_lines
+
+LOG_FILE = 'build_pipeline.log'
+METRICS_FILE = pipeline_metrics.metrics_path_for(LOG_FILE)
+STATE_FILE = manage_tv_shows.CACHE_DIR / "build_state.json"
+STATE_VERSION = 1
+ARCHIVE_PATH = manage_tv_shows.PROJECT_ROOT / "assets" / "tv_shows_archive.zip"
+STAGES = ('fetch', 'lines', 'rename-images', 'archive')
+# Fetching is network bound, conversions have their own process pool, so a few threads suffice
+DEFAULT_JOBS = 4
+
+
+# --- Fingerprints and state ---
+
+def directory_fingerprint(path):
+    """sha1 over (relative path, size, mtime) of every file below `path`; no file is read."""
+    lines = []
+    stack = [(str(path), '')]
+    while stack:
+        directory, prefix = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, relative + '/'))
+                else:
+                    stat = entry.stat()
+                    lines.append(f"{relative}\0{stat.st_size}\0{stat.st_mtime_ns}\n")
+    digest = hashlib.sha1()
+    for line in sorted(lines):
+        digest.update(line.encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def tree_fingerprint(base_path, show_fingerprints):
+    """Combines the show fingerprints with the stat of the files directly in `base_path` (catalog.json)."""
+    digest = hashlib.sha1()
+    for name, fingerprint in sorted(show_fingerprints.items()):
+        digest.update(f"{name}/\0{fingerprint}\n".encode('utf-8', 'surrogateescape'))
+    with os.scandir(base_path) as entries:
+        for entry in sorted(entries, key=lambda e: e.name):
+            if not entry.is_dir(follow_symlinks=False):
+                stat = entry.stat()
+                digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def file_stamp(path):
+    """[size, mtime_ns] of `path`, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_state(force=False):
+    state = {} if force else manage_tv_shows.load_cache(STATE_FILE)
+    if state.get('version') != STATE_VERSION:
+        state = {'version': STATE_VERSION}
+    state.setdefault('shows', {})
+    state.setdefault('fetched', {})
+    state.setdefault('archive', {})
+    return state
+
+
+def image_options_key(args):
+    return f"{args.output_format}:{args.quality}:{args.max_pixels}"
+
+
+def archive_format_key(args):
+    return f"{args.catalog_format}:{args.minify_json}"
+
+
+# --- Stage tasks ---
+# Each returns True on success; they run in worker threads.
+
+def normalize_title(title):
+    """NFKC with punctuation and whitespace removed, so '亲爱的热爱的' matches the folder '亲爱的，热爱的'."""
+    return "".join(c for c in unicodedata.normalize('NFKC', title).casefold()
+                   if not unicodedata.category(c).startswith(('P', 'Z')))
+
+
+def fetch_title(title, folders):
+    """Searches TMDB for `title` (first result, no prompt) and downloads it into its show folder."""
+    results = fetcher.search_media(fetcher.TMDB_API_KEY, title, interactive=False)
+    if not results:
+        logging.error(f"[{title}] No TMDB result, nothing fetched.")
+        return False
+    media = results[0]
+    found_name = media.get('name' if media.get('media_type') == 'tv' else 'title', '')
+    existing = fetcher.safe_folder_name(found_name)
+    if existing and (manage_tv_shows.TV_SHOWS_BASE_PATH / existing / "init.json").is_file():
+        # Another show's folder, possibly being renamed by its own task right now
+        logging.error(f"[{title}] TMDB's first result is '{found_name}', which already has the folder "
+                      f"'{existing}'; rename the title to match it, nothing fetched.")
+        return False
+    folder_path = fetcher.process_single_media_data(results[0])
+    if folder_path is None:
+        return False
+    folders[title] = os.path.basename(folder_path)
+    return True
+
+
+def write_lines(title, folders, dedupe=None):
+    save_lines.save_quotes_to_json(folders[title], save_lines.tv_quotes[title], dedupe=dedupe)
+    return True
+
+
+def rename_images(title, folders, args, converter, fingerprints):
+    show_dir = manage_tv_shows.TV_SHOWS_BASE_PATH / folders[title]
+    ok = manage_tv_shows.rename_and_convert_images(show_dir, args.output_format, args.quality, converter)
+    if ok:
+        fingerprints[show_dir.name] = directory_fingerprint(show_dir)
+    return ok
+
+
+def build_archive(catalog_format='json', minify_json=False):
+    # Written next to the old zip first, so an interrupted build never leaves a truncated archive
+    temp_path = ARCHIVE_PATH.with_name(ARCHIVE_PATH.name + '.tmp')
+    create_tvshows_archive.zip_directory(manage_tv_shows.TV_SHOWS_BASE_PATH, temp_path, catalog_format, minify_json)
+    os.replace(temp_path, ARCHIVE_PATH)
+    return True
+
+
+def _run_task(key, function):
+    stage, name = key
+    with pipeline_metrics.stage(f"build.{stage}", name):
+        try:
+            return function()
+        except Exception as e:
+            logging.error(f"{stage} failed for '{name}': {e}", exc_info=True)
+            return False
+
+
+def run_tasks(tasks, jobs, progress=None):
+    """
+    Runs {key: (function, dependency keys[, optional dependency keys])} on up to `jobs` threads,
+    each task as soon as all of its dependencies succeeded and its optional dependencies finished,
+    whatever their result. Returns {key: 'ok' | 'failed' | 'skipped'}, skipped meaning a
+    (non-optional) dependency failed.
+    """
+    status = {}
+    waiting_on, optional = {}, {}
+    for key, (_, deps, *optional_deps) in tasks.items():
+        optional[key] = set(*optional_deps)
+        waiting_on[key] = set(deps) | optional[key]
+    dependents = {}
+    for key, deps in waiting_on.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(key)
+    running = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        def submit(key):
+            running[executor.submit(_run_task, key, tasks[key][0])] = key
+
+        def finish(key, result):
+            settled = [(key, result)]
+            while settled:
+                key, result = settled.pop()
+                if key in status:
+                    continue
+                status[key] = result
+                if progress:
+                    progress.update(**({} if result == 'ok' else {result: 1}))
+                for dependent in dependents.get(key, ()):
+                    if dependent in status:
+                        continue # already skipped by another dependency
+                    if result != 'ok' and key not in optional[dependent]:
+                        logging.warning(f"Skipping {dependent[0]} for '{dependent[1]}': {key[0]} {result}.")
+                        settled.append((dependent, 'skipped'))
+                    else:
+                        waiting_on[dependent].discard(key)
+                        if not waiting_on[dependent]:
+                            submit(dependent)
+
+        for key, deps in waiting_on.items():
+            if not deps:
+                submit(key)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                finish(key, 'ok' if future.result() else 'failed')
+    return status
+
+
+# --- Planning ---
+
+def plan_build(args, state):
+    """
+    Works out which tasks are out of date. Returns (tasks, folders, fingerprints): `folders` maps
+    each title to its show folder, `fingerprints` holds the current listing fingerprint of every
+    show folder (updated in place by the rename-images tasks).
+    """
+    base_path = manage_tv_shows.TV_SHOWS_BASE_PATH
+    base_path.mkdir(parents=True, exist_ok=True)
+    fingerprints = {entry.name: directory_fingerprint(entry.path)
+                    for entry in os.scandir(base_path) if entry.is_dir(follow_symlinks=False)}
+
+    titles = set(fingerprints) | set(save_lines.tv_quotes) | set(args.fetch)
+    if args.show_names:
+        titles &= set(args.show_names)
+    folders = {title: state['fetched'].get(title, title) for title in titles}
+    # Quote titles are often spelled without the folder's punctuation (亲爱的热爱的 / 亲爱的，热爱的)
+    by_normalized = {normalize_title(folder): folder for folder in fingerprints}
+    for title, folder in folders.items():
+        if folder not in fingerprints and title in save_lines.tv_quotes:
+            folders[title] = by_normalized.get(normalize_title(title), folder)
+    # A folder fetched under another title is that title's folder, not a title of its own
+    claimed = {folder for title, folder in folders.items() if folder != title}
+    for title in titles & claimed:
+        if title not in save_lines.tv_quotes and title not in args.fetch:
+            titles.discard(title)
+            del folders[title]
+
+    options_key = image_options_key(args)
+    tasks = {}
+    show_tasks = []
+    # Shows that are only being fetched now: the archive is built without them if that fails
+    new_show_tasks = []
+    not_fetched = []
+    planned_folders = {}
+    # Titles fetched into a differently named folder first: the folder is theirs
+    for title in sorted(titles, key=lambda title: (folders[title] == title, title)):
+        folder = folders[title]
+        if folder in planned_folders:
+            # Two show tasks on one folder would race on its renames
+            logging.warning(f"'{title}' and '{planned_folders[folder]}' both use the folder '{folder}', skipping '{title}'.")
+            continue
+        planned_folders[folder] = title
+        deps = []
+        new_show = False
+        if not (base_path / folder / "init.json").is_file() and (title in args.fetch or title in save_lines.tv_quotes):
+            if args.no_fetch:
+                not_fetched.append(title)
+                continue
+            key = ('fetch', title)
+            tasks[key] = (lambda title=title: fetch_title(title, folders), [])
+            deps = [key]
+            new_show = True
+        if title in save_lines.tv_quotes:
+            json_data = manage_tv_shows.load_show_json(base_path / folder)
+            if deps or json_data.get('lines') != save_lines.expected_lines(save_lines.tv_quotes[title], args.dedupe_lines):
+                key = ('lines', title)
+                tasks[key] = (lambda title=title: write_lines(title, folders, args.dedupe_lines), deps)
+                deps = [key]
+        recorded = state['shows'].get(folder, {})
+        if deps or recorded.get('fingerprint') != fingerprints.get(folder) or recorded.get('options') != options_key:
+            key = ('rename-images', title)
+            tasks[key] = (lambda title=title: rename_images(title, folders, args, args.converter, fingerprints), deps)
+            deps = [key]
+        (new_show_tasks if new_show else show_tasks).extend(deps)
+
+    if not_fetched:
+        logging.warning(f"{len(not_fetched)} title(s) have no show folder yet and were skipped (--no-fetch).")
+        logging.debug(f"Not fetched: {not_fetched}")
+
+    archive_state = state['archive']
+    archive_outdated = (not args.show_names and
+                        (archive_state.get('tree') != tree_fingerprint(base_path, fingerprints)
+                         or archive_state.get('zip') != file_stamp(ARCHIVE_PATH)
+                         or archive_state.get('format', archive_format_key(args)) != archive_format_key(args)))
+    if not args.no_archive and (show_tasks or archive_outdated):
+        tasks[('archive', 'tv_shows')] = (lambda: build_archive(args.catalog_format, args.minify_json),
+                                          show_tasks, new_show_tasks)
+    elif not args.no_archive and new_show_tasks:
+        # Only new shows: nothing to archive unless one of them made it to a fingerprinted folder
+        planned = dict(fingerprints)
+        tasks[('archive', 'tv_shows')] = (
+            lambda: fingerprints == planned or build_archive(args.catalog_format, args.minify_json),
+            [], new_show_tasks)
+    return tasks, folders, fingerprints
+
+
+# --- Main Execution ---
+
+def build(args):
+    started = time.perf_counter()
+    state = load_state(args.force)
+    with manage_tv_shows.BoundedImageConverter(args.workers, args.memory_budget, args.max_pixels) as converter:
+        args.converter = converter
+        tasks, folders, fingerprints = plan_build(args, state)
+        counts = {stage: sum(1 for stage_name, _ in tasks if stage_name == stage) for stage in STAGES}
+        logging.info("Out-of-date tasks: " + ", ".join(f"{stage}={count}" for stage, count in counts.items()))
+
+        if args.dry_run:
+            for stage, name in tasks:
+                print(f"{stage:<14} {name}")
+            return True
+        if any(stage == 'fetch' for stage, _ in tasks) and fetcher.TMDB_API_KEY in ("", "YOUR_TMDB_API_KEY"):
+            logging.error("TMDB_API_KEY is not set, titles that still need fetching will fail (use --no-fetch to skip them).")
+
+        # Tasks run on threads, so load requests / Pillow here rather than on first use in a task
+        lazy_modules.load(fetcher.requests, manage_tv_shows.Image)
+        progress = pipeline_logging.ProgressLogger("Tasks", len(tasks))
+        status = run_tasks(tasks, args.jobs, progress)
+        progress.finish()
+
+    # Remember what succeeded; a failed show is rebuilt next time
+    options_key = image_options_key(args)
+    for (stage, title), result in status.items():
+        if stage == 'fetch' and result == 'ok':
+            state['fetched'][title] = folders[title]
+        elif stage == 'rename-images':
+            folder = folders[title]
+            if result == 'ok':
+                state['shows'][folder] = {'fingerprint': fingerprints[folder], 'options': options_key}
+            else:
+                state['shows'].pop(folder, None)
+    for folder in list(state['shows']):
+        if not (manage_tv_shows.TV_SHOWS_BASE_PATH / folder).is_dir():
+            del state['shows'][folder]
+    if status.get(('archive', 'tv_shows')) == 'ok':
+        # Folders not touched by this build keep the fingerprint taken while planning
+        for entry in os.scandir(manage_tv_shows.TV_SHOWS_BASE_PATH):
+            if entry.is_dir(follow_symlinks=False) and entry.name not in fingerprints:
+                fingerprints[entry.name] = directory_fingerprint(entry.path)
+        state['archive'] = {'tree': tree_fingerprint(manage_tv_shows.TV_SHOWS_BASE_PATH, fingerprints),
+                            'zip': file_stamp(ARCHIVE_PATH), 'format': archive_format_key(args)}
+    if tasks:
+        manage_tv_shows.save_cache(STATE_FILE, state)
+
+    failed = sorted(key for key, result in status.items() if result != 'ok')
+    for stage, name in failed:
+        logging.error(f"{stage} {status[(stage, name)]}: {name}")
+    logging.info(f"Build finished in {time.perf_counter() - started:.2f}s: {len(tasks) - len(failed)} task(s) ran, "
+                 f"{len(failed)} failed or skipped" + ("" if tasks else " (everything up to date)"))
+    pipeline_metrics.write_report(METRICS_FILE)
+    return not failed
+
+
+def add_image_arguments(parser):
+    """The rename-images options, shared with watch_pipeline.py."""
+    parser.add_argument('--format', dest='output_format', choices=manage_tv_shows.STILL_FORMATS, default='jpeg', help='Output format for stills (default: %(default)s).')
+    parser.add_argument('--quality', type=int, help='Encoder quality (default: the format\'s default).')
+    parser.add_argument('--max-pixels', type=int, default=manage_tv_shows.DEFAULT_MAX_PIXELS, help='Downscale converted images larger than this many pixels, 0 to disable (default: %(default)s).')
+    parser.add_argument('--memory-budget', type=int, default=manage_tv_shows.DEFAULT_MEMORY_BUDGET_MB, help='Memory (MB) that concurrent conversions may use in total (default: %(default)s).')
+    parser.add_argument('--workers', type=int, help='Maximum number of conversion worker processes (default: CPU count).')
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Fetch, write lines, rename images and archive, rebuilding only what changed.")
+    parser.add_argument('show_names', nargs='*', help='Only build these titles / show folders (the archive is then only rebuilt if one of them changed).')
+    parser.add_argument('--fetch', action='append', default=[], metavar='TITLE', help='Also fetch this title from TMDB if it has no show folder yet (repeatable).')
+    parser.add_argument('--no-fetch', action='store_true', help='Never contact TMDB; titles without a show folder are skipped.')
+    parser.add_argument('--no-archive', action='store_true', help=f'Do not rebuild {ARCHIVE_PATH.name}.')
+    parser.add_argument('--force', action='store_true', help='Ignore the recorded fingerprints and re-run rename-images and archive.')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the out-of-date tasks.')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help='Number of tasks run concurrently (default: %(default)s).')
+    add_image_arguments(parser)
+    create_tvshows_archive.add_format_arguments(parser)
+    save_lines.add_dedupe_argument(parser)
+    pipeline_logging.add_logging_arguments(parser)
+    pipeline_profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    create_tvshows_archive.check_format_arguments(parser, args)
+    save_lines.check_dedupe_argument(parser, args)
+
+    # fetch, lines and archive use paths relative to the project root
+    os.chdir(manage_tv_shows.PROJECT_ROOT)
+    pipeline_logging.setup_logging(LOG_FILE, args.log_level, args.quiet)
+    pipeline_logging.register_secret(fetcher.TMDB_API_KEY)
+    ok = pipeline_profiling.run(args.profile, LOG_FILE, build, args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
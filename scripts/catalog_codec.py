@@ -0,0 +1,207 @@
+"""
+Serialization formats for the catalog files (init.json, catalog.json) written by the scripts.
+
+- 'json': pretty-printed (indent=4, non-ASCII kept), the format of the files in the repo,
+  made for editing and diffing.
+- 'json-min': the same JSON without any whitespace; any JSON parser reads it unchanged.
+- 'cbor': CBOR (RFC 8949), a compact binary encoding of the same data model, implemented here
+  in pure Python (definite lengths, shortest int/float forms, no tags on output).
+- 'msgpack': MessagePack, only available when the optional `msgpack` package is installed.
+
+Every codec turns data into bytes and back; bench_serialization.py compares them on the catalog.
+"""
+import json
+import math
+import struct
+
+try:
+    import msgpack # Optional, enables the 'msgpack' codec
+except ImportError:
+    msgpack = None
+
+DEFAULT_CODEC = 'json'
+
+
+class Codec:
+    __slots__ = ('name', 'extension', 'binary', 'dumps', 'loads')
+
+    def __init__(self, name, extension, binary, dumps, loads):
+        self.name, self.extension, self.binary = name, extension, binary
+        self.dumps, self.loads = dumps, loads
+
+
+# --- JSON ---
+
+def _json_dumps(data):
+    return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+
+def _json_min_dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _json_loads(data):
+    return json.loads(data.decode('utf-8') if isinstance(data, (bytes, bytearray)) else data)
+
+
+# --- CBOR ---
+
+def _cbor_head(out, major, value):
+    """Appends the initial byte(s) of a data item: major type and argument in the shortest form."""
+    major <<= 5
+    if value < 24:
+        out.append(major | value)
+    elif value < 0x100:
+        out += bytes((major | 24, value))
+    elif value < 0x10000:
+        out.append(major | 25)
+        out += value.to_bytes(2, 'big')
+    elif value < 0x100000000:
+        out.append(major | 26)
+        out += value.to_bytes(4, 'big')
+    elif value < 0x10000000000000000:
+        out.append(major | 27)
+        out += value.to_bytes(8, 'big')
+    else:
+        raise ValueError(f"Integer {value} does not fit in 64 bits")
+
+def _cbor_float(out, value):
+    """Appends a float as half, single or double precision, whichever is the shortest exact one."""
+    if math.isnan(value):
+        out += b'\xf9\x7e\x00'
+        return
+    for code, fmt in ((0xf9, '>e'), (0xfa, '>f')):
+        try:
+            packed = struct.pack(fmt, value)
+        except OverflowError:
+            continue
+        if struct.unpack(fmt, packed)[0] == value:
+            out.append(code)
+            out += packed
+            return
+    out.append(0xfb)
+    out += struct.pack('>d', value)
+
+def _cbor_encode(out, value):
+    if isinstance(value, str):
+        encoded = value.encode('utf-8')
+        _cbor_head(out, 3, len(encoded))
+        out += encoded
+    elif isinstance(value, bool): # Before int: bool is a subclass of int
+        out.append(0xf5 if value else 0xf4)
+    elif isinstance(value, int):
+        if value >= 0:
+            _cbor_head(out, 0, value)
+        else:
+            _cbor_head(out, 1, -1 - value)
+    elif isinstance(value, dict):
+        _cbor_head(out, 5, len(value))
+        for key, item in value.items():
+            _cbor_encode(out, key)
+            _cbor_encode(out, item)
+    elif isinstance(value, (list, tuple)):
+        _cbor_head(out, 4, len(value))
+        for item in value:
+            _cbor_encode(out, item)
+    elif value is None:
+        out.append(0xf6)
+    elif isinstance(value, float):
+        _cbor_float(out, value)
+    elif isinstance(value, (bytes, bytearray)):
+        _cbor_head(out, 2, len(value))
+        out += value
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} as CBOR")
+
+def cbor_dumps(data):
+    out = bytearray()
+    _cbor_encode(out, data)
+    return bytes(out)
+
+_CBOR_SIMPLE = {20: False, 21: True, 22: None, 23: None}
+
+def _cbor_decode(data, pos):
+    """Returns (value, position after it) for the data item at `pos`."""
+    initial = data[pos]
+    major, info = initial >> 5, initial & 0x1f
+    pos += 1
+    if major == 7:
+        if info in _CBOR_SIMPLE:
+            return _CBOR_SIMPLE[info], pos
+        if info == 25:
+            return struct.unpack_from('>e', data, pos)[0], pos + 2
+        if info == 26:
+            return struct.unpack_from('>f', data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from('>d', data, pos)[0], pos + 8
+        raise ValueError(f"Unsupported CBOR simple value {info} at offset {pos - 1}")
+    if info < 24:
+        value = info
+    elif info < 28:
+        size = 1 << (info - 24)
+        value = int.from_bytes(data[pos:pos + size], 'big')
+        pos += size
+    else:
+        raise ValueError(f"Unsupported CBOR length encoding {info} at offset {pos - 1}")
+
+    if major == 0:
+        return value, pos
+    if major == 1:
+        return -1 - value, pos
+    if major == 3:
+        return data[pos:pos + value].decode('utf-8'), pos + value
+    if major == 2:
+        return bytes(data[pos:pos + value]), pos + value
+    if major == 4:
+        items = []
+        for _ in range(value):
+            item, pos = _cbor_decode(data, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        mapping = {}
+        for _ in range(value):
+            key, pos = _cbor_decode(data, pos)
+            mapping[key], pos = _cbor_decode(data, pos)
+        return mapping, pos
+    # Major type 6: a tag, whose meaning is ignored
+    return _cbor_decode(data, pos)
+
+def cbor_loads(data):
+    value, pos = _cbor_decode(data, 0)
+    if pos != len(data):
+        raise ValueError(f"{len(data) - pos} trailing bytes after the CBOR data item")
+    return value
+
+
+# --- Registry ---
+
+CODECS = {
+    'json': Codec('json', '.json', False, _json_dumps, _json_loads),
+    'json-min': Codec('json-min', '.json', False, _json_min_dumps, _json_loads),
+    'cbor': Codec('cbor', '.cbor', True, cbor_dumps, cbor_loads),
+}
+if msgpack is not None:
+    CODECS['msgpack'] = Codec('msgpack', '.msgpack', True,
+                              lambda data: msgpack.packb(data, use_bin_type=True),
+                              lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False))
+# Names accepted on the command line, including codecs whose optional dependency is missing
+CODEC_NAMES = ['json', 'json-min', 'cbor', 'msgpack']
+
+
+def get_codec(name):
+    """Returns the codec called `name`; ValueError if it is unknown or its dependency is not installed."""
+    if name in CODECS:
+        return CODECS[name]
+    if name == 'msgpack':
+        raise ValueError("The 'msgpack' format needs the msgpack package (pip install msgpack)")
+    raise ValueError(f"Unknown format '{name}', expected one of {CODEC_NAMES}")
+
+def dumps(data, codec=DEFAULT_CODEC):
+    return get_codec(codec).dumps(data)
+
+def loads(data, codec=DEFAULT_CODEC):
+    return get_codec(codec).loads(data)
+
+def write_file(path, data, codec=DEFAULT_CODEC):
+    """Writes `data` to `path` encoded with `codec` (pretty JSON by default)."""
+    with open(path, 'wb') as f:
+        f.write(dumps(data, codec))
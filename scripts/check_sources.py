@@ -0,0 +1,413 @@
+"""
+Health check for the play sources in assets/sources.json (`shuangju sources`).
+
+Each source is a URL template with {name}, {media_type} and {tmdb_id}, filled in the way the
+app does it (lib/models/play_source.dart: the name percent-encoded, a template whose fields a
+show lacks is skipped for that show). The templates are expanded for a sample of catalog shows
+and all URLs are probed at once: at most --workers requests in flight, at most --per-host per
+host, so a dozen mirrors answer in about the time of the slowest one without hammering any of
+them. A probe is a GET that stops after the response headers (redirects followed); it records
+status, latency, final URL and error.
+
+A source is healthy in proportion to its probes that answered below 400, and ranked by that
+ratio, then by median latency. --write rewrites sources.json in that order, within each
+"[分类]" group (group order unchanged) unless --ignore-groups is given; sources are never
+removed, dead ones only move to the end.
+
+--stand-in runs everything against a local HTTP server instead of the real mirrors: every
+source is mapped to a simulated behavior (fast, slow, redirect, server error, not found, hang,
+flaky), which exercises the timeouts, the per-host limit (the server reports the highest
+concurrency it saw per host) and the ranking offline.
+
+Usage:
+    python scripts/check_sources.py --sample 5
+    python scripts/check_sources.py --sample 5 --write
+    python scripts/check_sources.py --stand-in --timeout 2 --output sources_report.json
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, urlsplit, urlunsplit
+from lazy_modules import lazy_import
+import manage_tv_shows
+
+requests = lazy_import('requests')
+
+SOURCES_FILE = manage_tv_shows.PROJECT_ROOT / "assets" / "sources.json"
+DEFAULT_SAMPLE = 3
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 2
+DEFAULT_TIMEOUT = 10.0
+# Some mirrors answer scripts with 403, so the probes look like the app's web view
+USER_AGENT = ('Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/124.0 Mobile Safari/537.36')
+# Characters Uri.encodeComponent leaves alone
+_COMPONENT_SAFE = "-_.!~*'()"
+_PLACEHOLDER_PATTERN = re.compile(r'\{(name|media_type|tmdb_id)\}')
+_GROUP_PATTERN = re.compile(r'^\[([^\]]+)\]')
+STAND_IN_BEHAVIORS = ['fast', 'slow', 'redirect', 'error', 'missing', 'hang', 'flaky']
+
+
+# --- Templates ---
+
+def load_sources(path):
+    """Returns the {name: template} mapping of a sources.json, in file order."""
+    with open(path, 'r', encoding='utf-8') as f:
+        sources = json.load(f)
+    if not isinstance(sources, dict) or not all(isinstance(value, str) for value in sources.values()):
+        raise ValueError(f"{path} must be a JSON object of name -> URL template")
+    return sources
+
+def save_sources(path, sources):
+    """Writes sources.json in the repo's layout (indent 2, non-ASCII kept)."""
+    temp_path = Path(f"{path}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(sources, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    temp_path.replace(path)
+
+def expand_template(template, show):
+    """The URL of `template` for `show` ({'name', 'media_type', 'tmdb_id'}), or None if a field is missing."""
+    values = {
+        'name': quote(show['name'], safe=_COMPONENT_SAFE) if show.get('name') else None,
+        'media_type': show.get('media_type') or None,
+        'tmdb_id': str(show['tmdb_id']) if show.get('tmdb_id') is not None else None,
+    }
+    if any(values[field] is None for field in _PLACEHOLDER_PATTERN.findall(template)):
+        return None
+    return _PLACEHOLDER_PATTERN.sub(lambda match: values[match.group(1)], template)
+
+def sample_shows(base_path, names=None, sample=DEFAULT_SAMPLE, seed=0):
+    """
+    Returns [{'name', 'media_type', 'tmdb_id'}] for the shows called `names`, or else for
+    `sample` random catalog shows, preferring those with a TMDB id so every placeholder is used.
+    """
+    shows = []
+    for show_dir in sorted(manage_tv_shows.get_target_shows(base_path, names)):
+        data = manage_tv_shows.load_show_json(show_dir)
+        shows.append({'name': data.get('name') or show_dir.name,
+                      'media_type': data.get('media_type'), 'tmdb_id': data.get('tmdb_id')})
+    if names:
+        return shows
+    rng = random.Random(seed)
+    complete = [show for show in shows if show['tmdb_id'] is not None and show['media_type']]
+    rest = [show for show in shows if show not in complete]
+    rng.shuffle(complete)
+    rng.shuffle(rest)
+    return (complete + rest)[:sample]
+
+def build_probes(sources, shows):
+    """One probe per (source, show) whose template can be filled in; duplicate URLs are probed once."""
+    probes, seen = [], set()
+    for source, template in sources.items():
+        for show in shows:
+            url = expand_template(template, show)
+            if url is None or (source, url) in seen:
+                continue
+            seen.add((source, url))
+            probes.append({'source': source, 'show': show['name'], 'url': url, 'host': urlsplit(url).hostname or ''})
+    return probes
+
+
+# --- Probing ---
+
+_sessions = threading.local()
+
+def _session():
+    """A requests session per worker thread, so connections to a host are reused across its probes."""
+    if not hasattr(_sessions, 'session'):
+        _sessions.session = requests.Session()
+        _sessions.session.headers['User-Agent'] = USER_AGENT
+    return _sessions.session
+
+def probe(url, timeout):
+    """GETs `url` up to the response headers. Returns {'status', 'ok', 'latency_ms', 'final_url', 'error'}."""
+    start = time.perf_counter()
+    result = {'status': None, 'ok': False, 'latency_ms': None, 'final_url': None, 'error': None}
+    try:
+        with _session().get(url, timeout=timeout, stream=True, allow_redirects=True) as response:
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            result['status'] = response.status_code
+            result['ok'] = response.status_code < 400
+            if response.url != url:
+                result['final_url'] = response.url
+    except requests.exceptions.Timeout:
+        result['error'] = f"timeout after {timeout}s"
+    except requests.exceptions.RequestException as e:
+        # ConnectionError wraps urllib3's MaxRetryError, whose `reason` names the actual failure
+        reason = getattr(e.args[0], 'reason', None) if e.args else None
+        result['error'] = f"{type(e).__name__}: {type(reason).__name__ if reason else e}"
+    return result
+
+def run_probes(probes, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT):
+    """
+    Probes everything concurrently: at most `workers` requests in flight and at most `per_host`
+    per host. Each probe gets its result merged in; returns the probes. Queued probes are
+    handed out round-robin over the hosts, so a slow host never holds up a free worker.
+    """
+    queues = {}
+    for item in probes:
+        queues.setdefault(item['host'], []).append(item)
+    in_flight = {host: 0 for host in queues}
+    running = {}
+    # Finish the lazy import here: workers triggering it at the same time see a half-run module
+    requests.Session
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def fill():
+            progress = True
+            while progress and len(running) < workers:
+                progress = False
+                for host, queue in queues.items():
+                    if queue and in_flight[host] < per_host and len(running) < workers:
+                        item = queue.pop(0)
+                        in_flight[host] += 1
+                        running[executor.submit(probe, item['url'], timeout)] = item
+                        progress = True
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                in_flight[item['host']] -= 1
+                item.update(future.result())
+                logging.debug(f"{item['source']} {item['show']}: {item['status'] or item['error']} in {item['latency_ms']} ms")
+            fill()
+    return probes
+
+
+# --- Ranking ---
+
+def summarize(sources, probes):
+    """Per source, in file order: probe count, healthy ratio, median / max latency of the healthy probes, errors."""
+    by_source = {source: [] for source in sources}
+    for item in probes:
+        by_source[item['source']].append(item)
+    summary = []
+    for source, items in by_source.items():
+        latencies = [item['latency_ms'] for item in items if item['ok']]
+        problems = sorted({str(item['status']) if item['error'] is None else item['error'] for item in items if not item['ok']})
+        redirects = sorted({urlsplit(item['final_url']).hostname for item in items
+                            if item.get('final_url') and urlsplit(item['final_url']).hostname != urlsplit(item['url']).hostname})
+        summary.append({
+            'source': source,
+            'probes': len(items),
+            'ok': len(latencies),
+            'health': round(len(latencies) / len(items), 3) if items else None,
+            'median_ms': round(statistics.median(latencies), 1) if latencies else None,
+            'max_ms': max(latencies) if latencies else None,
+            'problems': problems,
+            'redirected_to': redirects,
+        })
+    return summary
+
+def _rank_key(entry):
+    # Healthy sources by health and speed, then the ones that could not be probed, dead ones last
+    if entry['health'] is None:
+        return (1, 0, 0)
+    if entry['health'] == 0:
+        return (2, 0, 0)
+    return (0, -entry['health'], entry['median_ms'])
+
+def rank_sources(sources, summary, ignore_groups=False):
+    """Returns `sources` reordered by health; by default only within each "[分类]" group, groups staying in place."""
+    entries = {entry['source']: entry for entry in summary}
+    groups = {}
+    for source in sources:
+        match = _GROUP_PATTERN.match(source)
+        groups.setdefault('' if ignore_groups or not match else match.group(1), []).append(source)
+    ranked = {}
+    for members in groups.values():
+        # sorted() is stable: equally healthy sources keep their relative order
+        for source in sorted(members, key=lambda source: _rank_key(entries[source])):
+            ranked[source] = sources[source]
+    return ranked
+
+
+# --- Stand-in server ---
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the mirrors. URLs look like /<behavior>/<original host>/<path>; the
+    server answers according to <behavior> and counts concurrent requests per original host
+    (except for 'hang', whose requests outlive the probes that gave up on them).
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, slow_seconds=0.3, hang_seconds=30.0):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.slow_seconds = slow_seconds
+        self.hang_seconds = hang_seconds
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.requests = 0
+        self.flaky_counter = 0
+
+    def handle_error(self, request, client_address):
+        # Probes give up on hanging requests, which then find the connection gone
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def redirect_probes(self, sources, probes):
+        """
+        Points every probe at this server, keeping 'host' (and so the per-host limit) of the real
+        mirror. Behaviors are assigned to the sources in turn; returns {source: behavior}.
+        """
+        behaviors = {source: STAND_IN_BEHAVIORS[index % len(STAND_IN_BEHAVIORS)] for index, source in enumerate(sources)}
+        for item in probes:
+            url = urlsplit(item['url'])
+            item['url'] = urlunsplit(('http', f"127.0.0.1:{self.server_address[1]}",
+                                      f"/{behaviors[item['source']]}/{url.netloc}{url.path}", url.query, ''))
+        return behaviors
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, headers=None):
+        body = f"<html><body>{status}</body></html>".encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        _, behavior, host, *rest = self.path.split('/', 3) + ['']
+        counted = behavior != 'hang'
+        with server.lock:
+            server.requests += 1
+            if counted:
+                server.active[host] = server.active.get(host, 0) + 1
+                server.max_active[host] = max(server.max_active.get(host, 0), server.active[host])
+            if behavior == 'flaky':
+                server.flaky_counter += 1
+                flaky_failure = server.flaky_counter % 2 == 0
+        try:
+            if behavior in ('fast', 'final'):
+                time.sleep(0.01)
+                self._send(200)
+            elif behavior == 'slow':
+                time.sleep(server.slow_seconds)
+                self._send(200)
+            elif behavior == 'redirect':
+                self._send(302, {'Location': f"/final/moved.{host}/{rest[0]}"})
+            elif behavior == 'error':
+                self._send(503)
+            elif behavior == 'hang':
+                time.sleep(server.hang_seconds)
+                self._send(200)
+            elif behavior == 'flaky':
+                self._send(500 if flaky_failure else 200)
+            else:
+                self._send(404)
+        finally:
+            if counted:
+                with server.lock:
+                    server.active[host] -= 1
+
+
+# --- CLI ---
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Probe the play sources in assets/sources.json and rank them by health and latency.")
+    parser.add_argument('--sources', type=Path, default=SOURCES_FILE, help='sources.json to check (default: assets/sources.json).')
+    parser.add_argument('--shows', nargs='+', metavar='NAME', help='Show folders to fill the templates with (default: a random sample).')
+    parser.add_argument('--sample', type=int, default=DEFAULT_SAMPLE, help='Number of random catalog shows to probe each source with (default: %(default)s).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the show sample (default: %(default)s).')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Requests in flight at once (default: %(default)s).')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help='Requests in flight per host (default: %(default)s).')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Connect and read timeout per request in seconds (default: %(default)s).')
+    parser.add_argument('--write', action='store_true', help='Rewrite the sources file in ranked order.')
+    parser.add_argument('--ignore-groups', action='store_true', help='Rank across the "[分类]" groups instead of within each.')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if any source had no healthy probe.')
+    parser.add_argument('--stand-in', action='store_true', help='Probe a local stand-in server with simulated mirror behaviors instead of the real hosts.')
+    parser.add_argument('--output', help='Write the probes and the per-source summary as JSON to this file.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every probe.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(asctime)s - %(message)s')
+    if args.workers < 1 or args.per_host < 1:
+        parser.error("--workers and --per-host must be at least 1")
+    if args.stand_in and args.write and args.sources.resolve() == SOURCES_FILE.resolve():
+        parser.error("--stand-in measures simulated mirrors; use --write only with a copy passed via --sources")
+
+    try:
+        sources = load_sources(args.sources)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    shows = sample_shows(manage_tv_shows.TV_SHOWS_BASE_PATH, args.shows, args.sample, args.seed)
+    if not shows:
+        parser.error("No shows to fill the templates with")
+
+    probes = build_probes(sources, shows)
+    server, behaviors = None, {}
+    if args.stand_in:
+        server = StandInServer(hang_seconds=args.timeout * 2 + 1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        behaviors = server.redirect_probes(sources, probes)
+    logging.info(f"Probing {len(sources)} sources with {len(shows)} shows: {len(probes)} requests, "
+                 f"{args.workers} at once, {args.per_host} per host, timeout {args.timeout}s")
+    start = time.perf_counter()
+    try:
+        run_probes(probes, args.workers, args.per_host, args.timeout)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    seconds = round(time.perf_counter() - start, 2)
+
+    summary = summarize(sources, probes)
+    ranked = rank_sources(sources, summary, args.ignore_groups)
+    entries = {entry['source']: entry for entry in summary}
+    print(f"{len(probes)} probes in {seconds}s, ranked:")
+    for position, source in enumerate(ranked, 1):
+        entry = entries[source]
+        health = '-' if entry['health'] is None else f"{entry['ok']}/{entry['probes']}"
+        median = '-' if entry['median_ms'] is None else f"{entry['median_ms']:.0f} ms"
+        notes = ', '.join(entry['problems'] + [f"-> {host}" for host in entry['redirected_to']])
+        behavior = f" [{behaviors[source]}]" if behaviors else ''
+        print(f"  {position:>2}. {health:>5} {median:>9}  {source}{behavior}" + (f"  ({notes})" if notes else ''))
+    if server:
+        busiest = max(server.max_active.values(), default=0)
+        print(f"  stand-in: {server.requests} requests, at most {busiest} at once per host (limit {args.per_host})")
+
+    if args.output:
+        report = {'sources_file': str(args.sources), 'shows': [show['name'] for show in shows], 'seconds': seconds,
+                  'stand_in': behaviors or None, 'order': list(ranked), 'summary': summary, 'probes': probes}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"Results written to {args.output}")
+    if args.write:
+        if list(ranked) == list(sources):
+            print(f"{args.sources} is already in ranked order")
+        else:
+            save_sources(args.sources, ranked)
+            print(f"Rewrote {args.sources} in ranked order")
+    if args.check and any(entry['health'] == 0 for entry in summary):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,38 +2,80 @@
 # requires-python = ">=3.13"
 # dependencies = [
 #     "requests",
+#     "Pillow", # 计算剧照感知哈希
 # ]
 # ///
-import requests
+import argparse
+import io
 import os
+import time
 import json
 import sys
 import logging
 from datetime import datetime
+import catalog_codec
+import image_hashing
+from lazy_modules import lazy_import
+import pipeline_logging
+import pipeline_metrics
+import pipeline_profiling
 
-# --- 日志配置 ---
+# requests 只在真正发起请求时才加载，--help 等命令可以快速启动
+requests = lazy_import('requests')
+
+# --- 日志配置 (在 main() 中通过 pipeline_logging.setup_logging 生效) ---
 LOG_FILE = 'tmdb_script.log'
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout) # 同时输出到控制台
-    ]
-)
+# 各阶段耗时统计 (与日志文件放在一起)
+METRICS_FILE = pipeline_metrics.metrics_path_for(LOG_FILE)
 
 # --- 配置 ---
 # 在这里替换为你的 TMDB API Key
 TMDB_API_KEY = os.getenv("TMDB_API_KEY", "YOUR_TMDB_API_KEY")
-# TMDB API 端点
-TMDB_API_BASE_URL = "https://api.themoviedb.org/3"
+# TMDB API 端点 (可通过环境变量指向本地的模拟服务器，例如 bench_fetcher.py)
+TMDB_API_BASE_URL = os.getenv("TMDB_API_BASE_URL", "https://api.themoviedb.org/3")
 # 图片基础 URL
-TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/original"
+TMDB_IMAGE_BASE_URL = os.getenv("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p/original")
+# 缩略图 URL (仅用于计算感知哈希，挑选不重复的剧照)
+TMDB_THUMB_BASE_URL = os.getenv("TMDB_THUMB_BASE_URL", "https://image.tmdb.org/t/p/w300")
+# 遇到 429 (请求过多) 或 5xx 错误时的最大重试次数
+MAX_RETRIES = 3
+# 未提供 Retry-After 时的初始退避时间 (秒)，每次重试翻倍
+RETRY_BACKOFF_SECONDS = 1.0
+# 每部剧最多下载的剧照数量
+MAX_BACKDROPS = 5
+# 参与去重比较的候选剧照数量上限
+BACKDROP_CANDIDATES = 20
+# 剧照的最小宽度 (像素)，更小的候选不下载 (--min-backdrop-width)
+MIN_BACKDROP_WIDTH = 1280
+# 剧照语言偏好，靠前的优先；'null' 表示没有文字的图片 (--backdrop-languages)
+BACKDROP_LANGUAGES = ['null', 'zh', 'en']
+# 宽高比与 16:9 相差超过该值的候选不下载 (拼接图或裁剪有误的图片)
+BACKDROP_ASPECT_TOLERANCE = 0.1
+# 评分取贝叶斯平均：票数少的图片向先验评分靠拢，避免 1 票 10 分排在最前
+BACKDROP_PRIOR_VOTE = 5.0
+BACKDROP_PRIOR_COUNT = 3
 # 电视剧信息保存的基础路径 (相对于脚本运行位置)
 TV_SHOWS_BASE_PATH = "./assets/tv_shows" # 假设脚本在 scripts/ 目录下运行
 
 # --- TMDB API 函数 ---
 
+def _get_with_retry(url, **kwargs):
+    """requests.get 的封装：遇到 429 或 5xx 时按 Retry-After (或指数退避) 等待后重试"""
+    for attempt in range(MAX_RETRIES + 1):
+        response = requests.get(url, **kwargs)
+        if response.status_code != 429 and response.status_code < 500:
+            return response
+        if attempt == MAX_RETRIES:
+            break
+        retry_after = response.headers.get('Retry-After', '')
+        delay = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        # 重试是常态 (尤其是 429)，只在 debug 级别记录；最终失败时由调用方记录错误
+        logging.debug(f"请求 {url} 返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt + 1}/{MAX_RETRIES})。")
+        pipeline_metrics.count(f"http.retry.{response.status_code}")
+        response.close()
+        time.sleep(delay)
+    return response
+
 def _search_endpoint(api_key, query, endpoint_type):
     """Helper function to search a specific TMDB endpoint (tv or movie)."""
     if endpoint_type not in ['tv', 'movie']:
@@ -46,13 +88,15 @@ def _search_endpoint(api_key, query, endpoint_type):
         'query': query,
         'language': 'zh-CN'
     }
-    logging.info(f"开始搜索 {endpoint_type.upper()}: '{query}'")
+    logging.debug(f"开始搜索 {endpoint_type.upper()}: '{query}'")
     try:
-        logging.info(f"请求搜索 URL: {search_url}，参数: {params}")
-        response = requests.get(search_url, params=params, timeout=15) # 添加超时
-        response.raise_for_status()
-        results = response.json().get('results', [])
-        logging.info(f"搜索 {endpoint_type.upper()} '{query}' 找到 {len(results)} 个结果。")
+        logging.debug(f"请求搜索 URL: {search_url}，查询: '{query}'")
+        with pipeline_metrics.stage(f'tmdb.search.{endpoint_type}', query) as timer:
+            response = _get_with_retry(search_url, params=params, timeout=15) # 添加超时
+            response.raise_for_status()
+            timer.bytes = len(response.content)
+            results = response.json().get('results', [])
+        logging.debug(f"搜索 {endpoint_type.upper()} '{query}' 找到 {len(results)} 个结果。")
         # Add media_type to each result
         for result in results:
             result['media_type'] = endpoint_type
@@ -67,9 +111,12 @@ def _search_endpoint(api_key, query, endpoint_type):
         logging.error(f"解析 {endpoint_type.upper()} 搜索结果 '{query}' 时发生错误: {e}", exc_info=True)
         return [] # Return empty list on error
 
-def search_media(api_key, query):
-    """使用 TMDB API 搜索电视剧，如果找不到则搜索电影，并处理用户多选"""
-    logging.info(f"开始媒体搜索: '{query}'")
+def search_media(api_key, query, interactive=True):
+    """
+    使用 TMDB API 搜索电视剧，如果找不到则搜索电影，并处理用户多选。
+    interactive=False 时不询问用户：直接选择第一个结果 (用于批量/基准测试)。
+    """
+    logging.debug(f"开始媒体搜索: '{query}'")
 
     # 1. 搜索电视剧
     tv_results = _search_endpoint(api_key, query, 'tv')
@@ -77,13 +124,20 @@ def search_media(api_key, query):
     # 2. 如果电视剧无结果，则搜索电影
     movie_results = []
     if not tv_results:
-        logging.info(f"未找到电视剧 '{query}'，尝试搜索电影。")
+        logging.debug(f"未找到电视剧 '{query}'，尝试搜索电影。")
         movie_results = _search_endpoint(api_key, query, 'movie')
 
     # 3. 合并结果
     all_results = tv_results + movie_results
 
     # 4. 处理结果和用户选择
+    if not interactive:
+        if all_results:
+            logging.debug(f"非交互模式，自动选择 '{query}' 的第一个结果 (ID: {all_results[0].get('id')})")
+        else:
+            logging.warning(f"未找到与 '{query}' 相关的电视剧或电影。")
+        return all_results[:1]
+
     if not all_results:
         logging.warning(f"未找到与 '{query}' 相关的电视剧或电影。")
         # 询问是否重试 (仅在 TV 和 Movie 都搜索失败后)
@@ -106,7 +160,7 @@ def search_media(api_key, query):
         media_type = selected_media.get('media_type', '未知类型').upper()
         name_field = 'name' if selected_media.get('media_type') == 'tv' else 'title'
         media_name = selected_media.get(name_field, '未知名称')
-        logging.info(f"自动选择唯一结果 [{media_type}]: '{media_name}' (ID: {selected_media.get('id')})")
+        logging.debug(f"自动选择唯一结果 [{media_type}]: '{media_name}' (ID: {selected_media.get('id')})")
         return [selected_media] # 返回包含单个结果的列表
 
     # 处理多个结果 (TV 和 Movie)
@@ -174,28 +228,29 @@ def search_media(api_key, query):
 def get_tv_show_details(api_key, tv_id):
     """获取电视剧详细信息，包括修正后的图片请求"""
     details_url = f"{TMDB_API_BASE_URL}/tv/{tv_id}"
-    # 添加 include_image_language=en,null 以尝试获取剧照
+    # include_image_language 取剧照语言偏好 (默认 null,zh,en)
     # 'null' 用于获取无特定语言的图片 (通常是 backdrops)
-    # 'en' 用于获取英文相关图片 (可能包含一些海报或带文字的图片)
-    # 'zh' 也可以加入，但可能导致 backdrops 变少，如果需要中文海报可以考虑 'zh,en,null'
+    # 'zh'/'en' 用于获取中文/英文相关图片 (可能包含一些海报或带文字的图片)
     params = {
         'api_key': api_key,
         'language': 'zh-CN', # 主要信息语言
         'append_to_response': 'images',
-        'include_image_language': 'en,null' # 关键参数：获取英文和无语言图片
+        'include_image_language': ','.join(BACKDROP_LANGUAGES) # 关键参数：获取偏好语言和无语言图片
     }
-    logging.info(f"请求电视剧详情 (ID: {tv_id})，URL: {details_url}，参数: {params}")
+    logging.debug(f"请求电视剧详情 (ID: {tv_id})，URL: {details_url}")
     try:
-        response = requests.get(details_url, params=params)
-        response.raise_for_status()
-        details_data = response.json()
-        logging.info(f"成功获取电视剧详情 (ID: {tv_id})")
+        with pipeline_metrics.stage('tmdb.details.tv', tv_id) as timer:
+            response = _get_with_retry(details_url, params=params, timeout=15) # 添加超时
+            response.raise_for_status()
+            timer.bytes = len(response.content)
+            details_data = response.json()
+        logging.debug(f"成功获取电视剧详情 (ID: {tv_id})")
         # 记录获取到的图片数量，方便调试
         images_info = details_data.get('images', {})
         backdrop_count = len(images_info.get('backdrops', []))
         poster_count = len(images_info.get('posters', []))
         logo_count = len(images_info.get('logos', [])) # TMDB API v3 可能不直接返回 logos，但以防万一
-        logging.info(f"  - 图片信息: Backdrops={backdrop_count}, Posters={poster_count}, Logos={logo_count}")
+        logging.debug(f"  - 图片信息: Backdrops={backdrop_count}, Posters={poster_count}, Logos={logo_count}")
         return details_data
     except requests.exceptions.RequestException as e:
         logging.error(f"获取电视剧详情 (ID: {tv_id}) 时发生网络错误: {e}", exc_info=True)
@@ -211,20 +266,22 @@ def get_movie_details(api_key, movie_id):
         'api_key': api_key,
         'language': 'zh-CN',
         'append_to_response': 'images',
-        'include_image_language': 'en,null' # 与 TV 保持一致
+        'include_image_language': ','.join(BACKDROP_LANGUAGES) # 与 TV 保持一致
     }
-    logging.info(f"请求电影详情 (ID: {movie_id})，URL: {details_url}，参数: {params}")
+    logging.debug(f"请求电影详情 (ID: {movie_id})，URL: {details_url}")
     try:
-        response = requests.get(details_url, params=params, timeout=15) # 添加超时
-        response.raise_for_status()
-        details_data = response.json()
-        logging.info(f"成功获取电影详情 (ID: {movie_id})")
+        with pipeline_metrics.stage('tmdb.details.movie', movie_id) as timer:
+            response = _get_with_retry(details_url, params=params, timeout=15) # 添加超时
+            response.raise_for_status()
+            timer.bytes = len(response.content)
+            details_data = response.json()
+        logging.debug(f"成功获取电影详情 (ID: {movie_id})")
         # 记录获取到的图片数量
         images_info = details_data.get('images', {})
         backdrop_count = len(images_info.get('backdrops', []))
         poster_count = len(images_info.get('posters', []))
         logo_count = len(images_info.get('logos', []))
-        logging.info(f"  - 图片信息: Backdrops={backdrop_count}, Posters={poster_count}, Logos={logo_count}")
+        logging.debug(f"  - 图片信息: Backdrops={backdrop_count}, Posters={poster_count}, Logos={logo_count}")
         return details_data
     except requests.exceptions.Timeout:
         logging.error(f"获取电影详情 (ID: {movie_id}) 时发生超时错误。", exc_info=True)
@@ -237,15 +294,16 @@ def get_movie_details(api_key, movie_id):
         return None
 
 def download_image(url, save_path):
-    """下载图片并保存，添加日志记录"""
-    logging.info(f"尝试下载图片从 {url} 到 {save_path}")
+    """下载图片并保存 (成功时只记录一条 debug 日志，失败时记录错误)"""
     try:
-        response = requests.get(url, stream=True, timeout=30) # 添加超时
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        logging.info(f"图片成功下载并保存到: {save_path}")
+        with pipeline_metrics.stage('image.download', url) as timer:
+            response = _get_with_retry(url, stream=True, timeout=30) # 添加超时
+            response.raise_for_status()
+            with open(save_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    f.write(chunk)
+                    timer.bytes += len(chunk)
+        logging.debug(f"图片已下载: {url} -> {save_path} ({timer.bytes} 字节)")
         return True
     except requests.exceptions.Timeout:
         logging.error(f"下载图片 {url} 时发生超时错误。", exc_info=True)
@@ -260,12 +318,80 @@ def download_image(url, save_path):
         logging.error(f"下载或保存图片 {url} 时发生未知错误: {e}", exc_info=True)
         return False
 
+def backdrop_rank(backdrop, languages=None):
+    """剧照的排序键 (越小越好)：语言偏好的位置、贝叶斯平均评分、像素数"""
+    languages = BACKDROP_LANGUAGES if languages is None else languages
+    language = backdrop.get('iso_639_1') or 'null'
+    language_rank = languages.index(language) if language in languages else len(languages)
+    votes = backdrop.get('vote_count') or 0
+    rating = ((backdrop.get('vote_average') or 0) * votes + BACKDROP_PRIOR_VOTE * BACKDROP_PRIOR_COUNT) / (votes + BACKDROP_PRIOR_COUNT)
+    pixels = (backdrop.get('width') or 0) * (backdrop.get('height') or 0)
+    return language_rank, -round(rating, 2), -pixels
+
+def _backdrop_acceptable(backdrop, min_width):
+    """分辨率和宽高比是否合格 (API 未提供的字段不作判断)"""
+    width, height = backdrop.get('width'), backdrop.get('height')
+    if width and width < min_width:
+        return False
+    aspect_ratio = backdrop.get('aspect_ratio') or (width / height if width and height else None)
+    return not aspect_ratio or abs(aspect_ratio - 16 / 9) <= BACKDROP_ASPECT_TOLERANCE
+
+def rank_backdrops(backdrops, min_width=None, languages=None):
+    """
+    在下载任何图片之前，仅凭 TMDB 返回的元数据 (width/height/aspect_ratio/vote_average/
+    vote_count/iso_639_1) 过滤并排序候选剧照。没有合格的候选时按同样的顺序使用全部候选。
+    """
+    min_width = MIN_BACKDROP_WIDTH if min_width is None else min_width
+    candidates = [b for b in backdrops if b.get('file_path')]
+    acceptable = [b for b in candidates if _backdrop_acceptable(b, min_width)]
+    if not acceptable and candidates:
+        logging.warning(f"  没有宽度 ≥ {min_width} 且接近 16:9 的剧照，改为从全部 {len(candidates)} 张候选中挑选。")
+        acceptable = candidates
+    elif len(acceptable) < len(candidates):
+        logging.debug(f"  排除 {len(candidates) - len(acceptable)} 张分辨率或宽高比不合格的候选剧照。")
+    return sorted(acceptable, key=lambda b: backdrop_rank(b, languages))
+
+def select_diverse_backdrops(backdrops, limit=MAX_BACKDROPS):
+    """
+    下载候选剧照的缩略图并计算感知哈希，按给定顺序 (rank_backdrops 的排序) 挑选彼此不相似的剧照，
+    避免下载重复裁剪或仅有文字差异的图片。任何候选都无法计算哈希时退回前 limit 张。
+    """
+    candidates = [b for b in backdrops if b.get('file_path')][:BACKDROP_CANDIDATES]
+    if len(candidates) <= 1:
+        return candidates[:limit]
+
+    hashed = []
+    for backdrop in candidates:
+        thumb_url = f"{TMDB_THUMB_BASE_URL}{backdrop['file_path']}"
+        try:
+            with pipeline_metrics.stage('image.thumbnail', thumb_url) as timer:
+                response = _get_with_retry(thumb_url, timeout=15)
+                response.raise_for_status()
+                timer.bytes = len(response.content)
+                hashed.append((backdrop['file_path'], image_hashing.compute_hash(io.BytesIO(response.content))))
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"  下载缩略图 {thumb_url} 失败，跳过该候选剧照: {e}")
+        except OSError as e:
+            logging.warning(f"  无法识别缩略图 {thumb_url}，跳过该候选剧照: {e}")
+
+    if not hashed:
+        logging.warning("  无法计算任何候选剧照的哈希，按原顺序选择剧照。")
+        return candidates[:limit]
+
+    selected_paths = set(image_hashing.select_diverse(hashed, limit))
+    selected = [b for b in candidates if b['file_path'] in selected_paths]
+    logging.debug(f"  从 {len(candidates)} 张候选剧照中挑选出 {len(selected)} 张互不相似的剧照。")
+    return selected
+
 # --- 文件和目录操作 ---
 
+def safe_folder_name(show_name):
+    """清理名称，避免创建无效的文件夹名 (移除不安全字符)"""
+    return "".join(c for c in show_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+
 def create_tv_show_folder(show_name):
     """创建电视剧文件夹"""
-    # 清理名称，避免创建无效的文件夹名 (移除不安全字符)
-    safe_show_name = "".join(c for c in show_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_show_name = safe_folder_name(show_name)
     folder_path = os.path.join(TV_SHOWS_BASE_PATH, safe_show_name)
     os.makedirs(folder_path, exist_ok=True) # exist_ok=True 表示如果文件夹已存在则不报错
     return folder_path, safe_show_name
@@ -295,10 +421,10 @@ def update_init_json(folder_path, media_name, media_id, media_type, total_eps, o
 
     if os.path.exists(init_file_path):
         try:
-            logging.info(f"尝试读取现有的 init.json: {init_file_path}")
+            logging.debug(f"尝试读取现有的 init.json: {init_file_path}")
             with open(init_file_path, 'r', encoding='utf-8') as f:
                 existing_data = json.load(f)
-            logging.info(f"成功读取现有的 init.json")
+            logging.debug(f"成功读取现有的 init.json")
 
             # 更新字段，保留其他可能存在的自定义字段
             existing_data["name"] = media_name
@@ -317,7 +443,7 @@ def update_init_json(folder_path, media_name, media_id, media_type, total_eps, o
             elif "progress" in existing_data:
                 # 如果之前是 TV 现在变成 Movie，或者错误地包含了 progress，则移除它
                 del existing_data["progress"]
-                logging.info(f"媒体类型不是 TV，已从现有 init.json 中移除 progress 字段。")
+                logging.debug(f"媒体类型不是 TV，已从现有 init.json 中移除 progress 字段。")
 
 
             # 保留现有的 favorite 和 lines
@@ -325,15 +451,15 @@ def update_init_json(folder_path, media_name, media_id, media_type, total_eps, o
             existing_data["lines"] = existing_data.get("lines", [])
 
             data_to_write = existing_data # 使用更新后的现有数据
-            logging.info(f"准备更新 '{media_name}' (ID: {media_id}, Type: {media_type}) 的 init.json")
+            logging.debug(f"准备更新 '{media_name}' (ID: {media_id}, Type: {media_type}) 的 init.json")
 
         except (json.JSONDecodeError, IOError) as e:
             logging.warning(f"读取或解析现有的 init.json ({init_file_path}) 失败: {e}。将创建新的文件。", exc_info=True)
             # 如果读取失败，则使用全新的结构 (已包含 media_type 和可能的 progress)
 
     try:
-        logging.info(f"写入 init.json 到: {init_file_path}")
-        with open(init_file_path, 'w', encoding='utf-8') as f:
+        logging.debug(f"写入 init.json 到: {init_file_path}")
+        with pipeline_metrics.stage('json.dump', init_file_path):
             # 为了确保 name, tmdb_id, media_type 在前面，可以手动构建字典顺序
             # 但标准 json 不保证顺序，这里仅为可读性尝试
             ordered_data = {}
@@ -346,8 +472,8 @@ def update_init_json(folder_path, media_name, media_id, media_type, total_eps, o
                 if key not in ordered_data:
                     ordered_data[key] = value
 
-            json.dump(ordered_data, f, ensure_ascii=False, indent=4)
-        logging.info(f"成功创建/更新 '{media_name}' (ID: {media_id}, Type: {media_type}) 的 init.json。")
+            catalog_codec.write_file(init_file_path, ordered_data)
+        logging.debug(f"成功创建/更新 '{media_name}' (ID: {media_id}, Type: {media_type}) 的 init.json。")
     except IOError as e:
         logging.error(f"写入 init.json ({init_file_path}) 失败: {e}", exc_info=True)
 
@@ -355,7 +481,7 @@ def update_init_json(folder_path, media_name, media_id, media_type, total_eps, o
 # --- 主处理逻辑 ---
 
 def process_single_media_data(media_data):
-    """根据已获取的媒体数据字典 (TV或Movie) 进行处理：获取详情、创建文件、下载图片"""
+    """根据已获取的媒体数据字典 (TV或Movie) 进行处理：获取详情、创建文件、下载图片。返回剧集文件夹路径，失败时返回 None"""
     media_type = media_data.get('media_type')
     media_id = media_data.get('id')
 
@@ -372,10 +498,10 @@ def process_single_media_data(media_data):
          logging.error(f"媒体数据 (ID: {media_id}, Type: {media_type}) 缺少名称。")
          return
 
-    logging.info(f"\n--- 开始处理已选定媒体 [{media_type.upper()}]: '{found_name}' (ID: {media_id}) ---")
+    logging.debug(f"\n--- 开始处理已选定媒体 [{media_type.upper()}]: '{found_name}' (ID: {media_id}) ---")
 
     # 1. 获取详细信息 (根据类型调用不同函数)
-    logging.info(f"获取 '{found_name}' (ID: {media_id}, Type: {media_type}) 的详细信息...")
+    logging.debug(f"获取 '{found_name}' (ID: {media_id}, Type: {media_type}) 的详细信息...")
     details = None
     if media_type == 'tv':
         details = get_tv_show_details(TMDB_API_KEY, media_id)
@@ -399,38 +525,38 @@ def process_single_media_data(media_data):
     total_eps = None
     if media_type == 'tv':
         total_eps = details.get('number_of_episodes')
-        logging.info(f"'{found_name}' (TV, ID: {media_id}) 信息: 总集数={total_eps if total_eps is not None else '未知'}, "
+        logging.debug(f"'{found_name}' (TV, ID: {media_id}) 信息: 总集数={total_eps if total_eps is not None else '未知'}, "
                      f"简介='{overview[:50]}...'")
     else: # Movie
-         logging.info(f"'{found_name}' (Movie, ID: {media_id}) 信息: 简介='{overview[:50]}...'")
+         logging.debug(f"'{found_name}' (Movie, ID: {media_id}) 信息: 简介='{overview[:50]}...'")
 
 
     # 2. 创建文件夹 (使用统一的名称)
     # 注意：如果电影和电视剧重名，它们会存入同一个文件夹，这可能是期望行为，也可能不是。
     # 如果需要区分，可以在文件夹名称中加入类型，例如 create_folder(f"{found_name} [{media_type.upper()}]")
     folder_path, safe_media_name = create_tv_show_folder(found_name) # 复用现有函数，但变量名改为 media
-    logging.info(f"确保文件夹存在/已创建: {folder_path}")
+    logging.debug(f"确保文件夹存在/已创建: {folder_path}")
 
     # 3. 创建/更新 init.json (传递 media_type)
     update_init_json(folder_path, found_name, media_id, media_type, total_eps, overview)
 
     # 4. 下载海报
+    poster_ok = False
     if poster_path:
         poster_url = f"{TMDB_IMAGE_BASE_URL}{poster_path}"
         cover_save_path = os.path.join(folder_path, "cover.jpg") # 仍然叫 cover.jpg
-        logging.info(f"开始下载海报 '{poster_path}' 到 {cover_save_path}")
-        if download_image(poster_url, cover_save_path):
-             logging.info(f"海报成功下载到 {cover_save_path}")
+        poster_ok = download_image(poster_url, cover_save_path)
     else:
         logging.warning(f"未找到 '{found_name}' (ID: {media_id}, Type: {media_type}) 的海报 (poster_path)。")
 
-    # 5. 下载剧照 (最多5张)
+    # 5. 下载剧照 (最多 MAX_BACKDROPS 张，按元数据评分排序，跳过近似重复的剧照)
+    download_count = 0
     if backdrops:
-        logging.info(f"开始下载 '{found_name}' (ID: {media_id}, Type: {media_type}) 的剧照 (最多 5 张)...")
-        download_count = 0
+        logging.debug(f"开始下载 '{found_name}' (ID: {media_id}, Type: {media_type}) 的剧照 (最多 {MAX_BACKDROPS} 张)...")
+        backdrops = select_diverse_backdrops(rank_backdrops(backdrops), MAX_BACKDROPS)
         for i, backdrop in enumerate(backdrops):
-            if download_count >= 5:
-                logging.info("已达到剧照下载数量上限 (5 张)。")
+            if download_count >= MAX_BACKDROPS:
+                logging.debug(f"已达到剧照下载数量上限 ({MAX_BACKDROPS} 张)。")
                 break
             backdrop_path = backdrop.get('file_path')
             if backdrop_path:
@@ -439,19 +565,21 @@ def process_single_media_data(media_data):
                 # 文件名保持一致格式，但基于 safe_media_name
                 backdrop_filename = f"{safe_media_name}-{timestamp}-{i+1}.jpg"
                 backdrop_save_path = os.path.join(folder_path, backdrop_filename)
-                logging.info(f"  下载剧照 {i+1}: '{backdrop_path}' 到 {backdrop_filename}")
                 if download_image(backdrop_url, backdrop_save_path):
                     download_count += 1
             else:
                  logging.warning(f"  剧照 {i+1} 数据中缺少 'file_path': {backdrop}")
-        logging.info(f"为 '{found_name}' (ID: {media_id}, Type: {media_type}) 共成功下载 {download_count} 张剧照。")
+        logging.debug(f"为 '{found_name}' (ID: {media_id}, Type: {media_type}) 共成功下载 {download_count} 张剧照。")
     else:
         logging.warning(f"未找到 '{found_name}' (ID: {media_id}, Type: {media_type}) 的剧照 (backdrops)。")
 
-    logging.info(f"--- 完成处理媒体 [{media_type.upper()}]: '{found_name}' (ID: {media_id}) ---")
+    logging.info(f"完成 [{media_type.upper()}] '{found_name}' (ID: {media_id}): "
+                 f"海报{'已下载' if poster_ok else '缺失'}，剧照 {download_count} 张")
+    return folder_path
 
 
-if __name__ == "__main__":
+def fetch_all(initial_tv_show_names):
+    """依次搜索并处理命令行给出的每个名称，最后输出处理总结"""
     logging.info("脚本开始运行。")
     # 确保 TV_SHOWS_BASE_PATH 存在
     try:
@@ -461,9 +589,6 @@ if __name__ == "__main__":
         logging.critical(f"无法创建基础目录 {TV_SHOWS_BASE_PATH}: {e}", exc_info=True)
         sys.exit(1) # 无法继续
 
-    # 从命令行参数获取电视剧名称 (忽略脚本名称本身)
-    initial_tv_show_names = sys.argv[1:]
-
     if not initial_tv_show_names:
         print("\n用法: python create_and_fetch_tvshows.py \"电视剧名称1\" \"电视剧名称2\" ...")
         logging.warning("没有提供命令行参数。")
@@ -476,13 +601,16 @@ if __name__ == "__main__":
     else:
         logging.info("TMDB API Key 已配置。")
 
-    logging.info(f"开始处理命令行输入的名称: {initial_tv_show_names}")
+    logging.info(f"开始处理命令行输入的 {len(initial_tv_show_names)} 个名称。")
+    logging.debug(f"名称列表: {initial_tv_show_names}")
 
     processed_count = 0
     failed_count = 0
+    # 每隔几秒输出一行汇总进度，代替逐条目的日志
+    progress = pipeline_logging.ProgressLogger("标题", len(initial_tv_show_names))
 
     for name in initial_tv_show_names:
-        logging.info(f"\n===== 开始处理命令行参数: '{name}' =====")
+        logging.debug(f"\n===== 开始处理命令行参数: '{name}' =====")
         try:
             # 调用新的搜索函数 search_media
             selected_media_list = search_media(TMDB_API_KEY, name)
@@ -492,7 +620,7 @@ if __name__ == "__main__":
                 failed_count +=1 # 计入失败/跳过
                 continue # 处理下一个命令行参数
 
-            logging.info(f"对于 '{name}'，将处理 {len(selected_media_list)} 个选定的媒体条目。")
+            logging.debug(f"对于 '{name}'，将处理 {len(selected_media_list)} 个选定的媒体条目。")
             for media_data in selected_media_list:
                 try:
                     # 调用新的处理函数 process_single_media_data
@@ -509,7 +637,10 @@ if __name__ == "__main__":
         except Exception as outer_e: # 捕获搜索或选择过程中的意外错误
              failed_count += 1
              logging.error(f"处理命令行参数 '{name}' 的搜索或选择时发生意外错误: {outer_e}", exc_info=True)
-        logging.info(f"===== 完成处理命令行参数: '{name}' =====")
+        finally:
+            progress.update()
+        logging.debug(f"===== 完成处理命令行参数: '{name}' =====")
+    progress.finish()
 
 
     logging.info("\n--- 处理总结 ---")
@@ -517,4 +648,28 @@ if __name__ == "__main__":
     logging.info(f"成功处理的媒体条目数: {processed_count}") # 更新描述
     logging.info(f"处理失败或跳过的媒体条目数: {failed_count}") # 更新描述
     logging.info(f"详细日志请查看: {LOG_FILE}")
-    logging.info("脚本运行结束。")
\ No newline at end of file
+    pipeline_metrics.write_report(METRICS_FILE)
+    logging.info(f"各阶段耗时统计已写入: {METRICS_FILE}")
+    for stage_name, item, seconds in pipeline_metrics.METRICS.slowest(5):
+        logging.info(f"  最慢: {stage_name} {seconds * 1000:.0f} ms - {item}")
+    logging.info("脚本运行结束。")
+
+
+def main(argv=None, prog=None):
+    global MIN_BACKDROP_WIDTH, BACKDROP_LANGUAGES
+    parser = argparse.ArgumentParser(prog=prog, description="从 TMDB 搜索电视剧/电影，创建文件夹和 init.json，并下载海报与剧照。")
+    parser.add_argument('names', nargs='*', help='要搜索的电视剧/电影名称')
+    parser.add_argument('--min-backdrop-width', type=int, default=MIN_BACKDROP_WIDTH, help='剧照的最小宽度 (像素，默认: %(default)s)')
+    parser.add_argument('--backdrop-languages', default=','.join(BACKDROP_LANGUAGES), help="剧照语言偏好，逗号分隔，靠前的优先，'null' 表示无文字 (默认: %(default)s)")
+    pipeline_logging.add_logging_arguments(parser)
+    pipeline_profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    MIN_BACKDROP_WIDTH = args.min_backdrop_width
+    BACKDROP_LANGUAGES = [language.strip() for language in args.backdrop_languages.split(',') if language.strip()]
+    pipeline_logging.setup_logging(LOG_FILE, args.log_level, args.quiet)
+    pipeline_logging.register_secret(TMDB_API_KEY)
+    pipeline_profiling.run(args.profile, LOG_FILE, fetch_all, args.names)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,100 @@
+import argparse
+import concurrent.futures
+import io
+import json
+import logging
+import mmap
+import multiprocessing
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
 import zipfile
+import zlib
 import os
+try:
+    import resource # 仅 Unix，用于统计峰值内存
+except ImportError:
+    resource = None
+import catalog_codec
+import manage_tv_shows
+import pipeline_logging
+import pipeline_metrics
+import pipeline_profiling
+import quote_cards
 
+# 各阶段耗时统计
+METRICS_FILE = pipeline_metrics.metrics_path_for('create_tvshows_archive')
+# --profile 的输出文件名前缀 (create_tvshows_archive.cpu.prof 等)
+PROFILE_NAME = 'create_tvshows_archive'
+# 源目录根下的目录索引，可用 --catalog-format 换成其他格式打包
+CATALOG_NAME = 'catalog.json'
+ARCHIVE_PATH = os.path.join('assets', 'tv_shows_archive.zip')
+# 校验和流式解压时每次处理的字节数
+CHUNK_SIZE = 256 * 1024
+# verify 模拟的应用解压方式：
+#   in-memory  应用当前的做法 (DataService)：整个压缩包读入内存，ZipDecoder().decodeBytes 解码，
+#              各条目解压后的内容在遍历结束前一直保留在 Archive 对象中
+#   streaming  逐个条目边解压边写入文件，内存中只有一个块
+EXTRACTION_STRATEGIES = ['in-memory', 'streaming']
+# 剧集目录下的派生文件：台词卡片、裁剪变体和主题曲试听片段，应用不读取，不打包
+DERIVED_DIR_NAMES = {quote_cards.CARDS_DIR_NAME, manage_tv_shows.CROPS_DIR_NAME}
+DERIVED_FILE_NAMES = {manage_tv_shows.PREVIEW_SONG_NAME}
 
-def zip_directory(src_dir, dst_zip):
+
+def add_format_arguments(parser):
+    """打包格式参数 (create_tvshows_archive.py、build 和 watch 共用)"""
+    parser.add_argument('--catalog-format', choices=catalog_codec.CODEC_NAMES, default='json',
+                        help='压缩包中 catalog.json 的格式 (cbor / msgpack 时扩展名随之改变，默认: %(default)s)')
+    parser.add_argument('--minify-json', action='store_true', help='压缩包中的其他 .json 文件 (init.json 等) 去掉缩进和空白')
+
+
+def check_format_arguments(parser, args):
+    """msgpack 需要可选依赖，未安装时报错退出"""
+    try:
+        catalog_codec.get_codec(args.catalog_format)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def is_packed(rel_path):
+    """相对源目录的路径是否打包 (剧集目录下的派生目录和派生文件不打包)"""
+    parts = rel_path.replace(os.sep, '/').split('/')
+    if len(parts) < 2:
+        return True
+    if len(parts) == 2:
+        return parts[1] not in DERIVED_FILE_NAMES
+    return parts[1] not in DERIVED_DIR_NAMES
+
+
+def write_entry(zipf, file_path, rel_path, catalog_format='json', minify_json=False):
     """
-    将源目录递归压缩到ZIP文件，确保中文文件名使用UTF-8编码
+    将一个文件写入压缩包。catalog.json 按 catalog_format 重新编码，minify_json 时其余 .json 写为
+    紧凑 JSON；无法解析的 JSON 原样写入。
+    """
+    with pipeline_metrics.stage('zip.write', rel_path) as timer:
+        timer.bytes = os.path.getsize(file_path)
+        is_catalog = rel_path == CATALOG_NAME
+        if rel_path.endswith('.json') and ((is_catalog and catalog_format != 'json') or (minify_json and not is_catalog)):
+            codec = catalog_codec.get_codec(catalog_format if is_catalog else 'json-min')
+            try:
+                with open(file_path, 'rb') as f:
+                    data = codec.dumps(json.loads(f.read()))
+            except ValueError as e:
+                logging.warning(f"{rel_path} 不是有效的 JSON，原样打包: {e}")
+            else:
+                info = zipfile.ZipInfo.from_file(file_path, rel_path[:-len('.json')] + codec.extension)
+                zipf.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+                return
+        zipf.write(file_path, rel_path)
+
+
+def zip_directory(src_dir, dst_zip, catalog_format='json', minify_json=False):
+    """
+    将源目录递归压缩到ZIP文件，确保中文文件名使用UTF-8编码 (catalog_format / minify_json 见 write_entry)。
+    派生文件 (见 is_packed) 不打包
     """
     with zipfile.ZipFile(dst_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
         # 遍历目录树
@@ -14,11 +104,157 @@ def zip_directory(src_dir, dst_zip):
                 
                 # 计算相对于源目录的路径（保证压缩包内路径正确）
                 rel_path = os.path.relpath(file_path, src_dir)
+                if not is_packed(rel_path):
+                    continue
                 
                 # 将文件添加到ZIP（自动处理UTF-8编码）
-                zipf.write(file_path, rel_path)
+                write_entry(zipf, file_path, rel_path, catalog_format, minify_json)
 
-if __name__ == "__main__":
+# 中央目录文件头和中央目录结束记录 (APPNOTE 4.3.12 / 4.3.16)。patch_archive 原样复制条目后自己写中央目录，
+# 不改动 ZipFile 的内部状态；需要 zip64 的压缩包 (4 GB 以上或 65535 个以上条目) 不支持，完整重建
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+_ZIP_LIMIT = 0xFFFFFFFF
+_ZIP_COUNT_LIMIT = 0xFFFF
+
+
+def _read_central_directory(f):
+    """
+    读取压缩包的中央目录，返回 (中央目录的偏移, [(文件名, 本地文件头偏移, 中央目录记录)])。
+    zip64 或分卷的压缩包抛出 zipfile.LargeZipFile，格式错误抛出 zipfile.BadZipFile。
+    """
+    f.seek(0, os.SEEK_END)
+    f.seek(max(0, f.tell() - _END_RECORD.size - 0xFFFF))
+    tail = f.read()
+    position = tail.rfind(_END_SIGNATURE)
+    if position < 0 or len(tail) - position < _END_RECORD.size:
+        raise zipfile.BadZipFile("找不到中央目录结束记录")
+    _, disk, start_disk, _, count, size, offset, _ = _END_RECORD.unpack_from(tail, position)
+    if disk or start_disk or count == _ZIP_COUNT_LIMIT or offset == _ZIP_LIMIT:
+        raise zipfile.LargeZipFile("zip64 或分卷压缩包")
+    f.seek(offset)
+    data = f.read(size)
+    entries = []
+    position = 0
+    for _ in range(count):
+        try:
+            fields = _CENTRAL_HEADER.unpack_from(data, position)
+        except struct.error:
+            raise zipfile.BadZipFile("中央目录被截断")
+        if fields[0] != _CENTRAL_SIGNATURE:
+            raise zipfile.BadZipFile("中央目录文件头损坏")
+        flag_bits, compress_size, file_size = fields[5], fields[10], fields[11]
+        name_length, extra_length, comment_length, header_offset = fields[12], fields[13], fields[14], fields[18]
+        if _ZIP_LIMIT in (compress_size, file_size, header_offset):
+            raise zipfile.LargeZipFile("zip64 条目")
+        name_start = position + _CENTRAL_HEADER.size
+        name = data[name_start:name_start + name_length].decode('utf-8' if flag_bits & 0x800 else 'cp437')
+        end = name_start + name_length + extra_length + comment_length
+        entries.append((name, header_offset, data[position:end]))
+        position = end
+    return offset, entries
+
+
+def _copy_entries(out, f, central_offset, entries, keep=None):
+    """
+    将 keep(文件名) 为真 (未指定时全部) 的条目原样复制到 out 的当前位置，不解压也不重新压缩，
+    返回 [(文件名, 改写了本地文件头偏移的中央目录记录)]。
+    每个条目 (本地文件头 + 压缩数据 + 数据描述符) 一直延伸到下一个条目或中央目录的开头。
+    """
+    copied = []
+    entries = sorted(entries, key=lambda entry: entry[1])
+    ends = [offset for _, offset, _ in entries[1:]] + [central_offset]
+    for (name, offset, record), end in zip(entries, ends):
+        if keep is not None and not keep(name):
+            continue
+        new_offset = out.tell()
+        if new_offset >= _ZIP_LIMIT:
+            raise zipfile.LargeZipFile("压缩包超过 4 GB")
+        f.seek(offset)
+        out.write(f.read(end - offset))
+        # 本地文件头偏移是中央目录文件头的最后一个字段
+        copied.append((name, record[:_CENTRAL_HEADER.size - 4] + struct.pack('<L', new_offset) + record[_CENTRAL_HEADER.size:]))
+    return copied
+
+
+def _write_central_directory(out, records):
+    """在 out 的当前位置写出中央目录和中央目录结束记录"""
+    offset = out.tell()
+    if len(records) >= _ZIP_COUNT_LIMIT or offset >= _ZIP_LIMIT:
+        raise zipfile.LargeZipFile("条目或大小超出限制，需要 zip64")
+    data = b''.join(records)
+    out.write(data)
+    out.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, len(records), len(records), len(data), offset, 0))
+
+
+def _check_patched(zip_path, expected_names):
+    """重新打开打补丁后的压缩包：条目列表应与写入时一致，每个条目在新位置上 CRC 正确。正常时返回 None"""
+    try:
+        infos, errors = verify_entries(zip_path)
+    except zipfile.BadZipFile as e:
+        return f"无法读取中央目录: {e}"
+    if [info.filename for info in infos] != expected_names:
+        return "条目列表与写入的不一致"
+    for name, error in errors.items():
+        return f"{name}: {error}"
+    return None
+
+
+def patch_archive(src_dir, dst_zip, changed_dirs, catalog_format='json', minify_json=False):
+    """
+    增量更新压缩包：只重新压缩 changed_dirs 中的剧集目录 (已删除的目录则移除) 和源目录根下的文件
+    (catalog.json 等)，其余条目原样复制 (不解压也不重新压缩)，中央目录由 _write_central_directory 写出。
+    压缩包不存在、需要 zip64 或打补丁后的压缩包校验失败时完整创建。
+    """
+    if not os.path.exists(dst_zip):
+        zip_directory(src_dir, dst_zip, catalog_format, minify_json)
+        return
+    changed = set(changed_dirs)
+
+    def kept(name):
+        top, sep, _ = name.partition('/')
+        return sep and top not in changed and is_packed(name)
+
+    temp_zip = f"{dst_zip}.tmp"
+    try:
+        with pipeline_metrics.stage('zip.patch', dst_zip), open(dst_zip, 'rb') as old_file, \
+                tempfile.TemporaryFile() as fresh_file, open(temp_zip, 'wb') as out:
+            old_offset, old_entries = _read_central_directory(old_file)
+            # 重新压缩的条目先用 zipfile 写入临时压缩包，再和旧条目一样原样复制过来
+            with zipfile.ZipFile(fresh_file, 'w', zipfile.ZIP_DEFLATED) as fresh_zip:
+                for entry in sorted(os.scandir(src_dir), key=lambda e: e.name):
+                    if entry.is_file():
+                        write_entry(fresh_zip, entry.path, entry.name, catalog_format, minify_json)
+                for name in sorted(changed):
+                    show_dir = os.path.join(src_dir, name)
+                    for root, dirs, files in os.walk(show_dir):
+                        for file in files:
+                            file_path = os.path.join(root, file)
+                            rel_path = os.path.relpath(file_path, src_dir)
+                            if is_packed(rel_path):
+                                write_entry(fresh_zip, file_path, rel_path, catalog_format, minify_json)
+            fresh_offset, fresh_entries = _read_central_directory(fresh_file)
+
+            copied = _copy_entries(out, old_file, old_offset, old_entries, kept)
+            copied += _copy_entries(out, fresh_file, fresh_offset, fresh_entries)
+            _write_central_directory(out, [record for _, record in copied])
+    except zipfile.LargeZipFile as e:
+        logging.info(f"无法增量更新压缩包 ({e})，完整重建")
+    except zipfile.BadZipFile as e:
+        logging.warning(f"无法读取原压缩包 ({e})，完整重建")
+    else:
+        error = _check_patched(temp_zip, [name for name, _ in copied])
+        if error is None:
+            os.replace(temp_zip, dst_zip)
+            return
+        logging.warning(f"增量更新后的压缩包校验失败 ({error})，完整重建")
+    if os.path.exists(temp_zip):
+        os.remove(temp_zip)
+    zip_directory(src_dir, dst_zip, catalog_format, minify_json)
+
+def create_archive(catalog_format='json', minify_json=False):
     # 若压缩文件存在则删除
     if os.path.exists('assets/tv_shows_archive.zip'):
         os.remove('assets/tv_shows_archive.zip')
@@ -31,5 +267,199 @@ if __name__ == "__main__":
         raise FileNotFoundError(f"源目录 '{src_dir}' 不存在")
 
     # 执行压缩操作
-    zip_directory(src_dir, dst_zip)
+    zip_directory(src_dir, dst_zip, catalog_format, minify_json)
     print(f"压缩包已创建：{os.path.abspath(dst_zip)}")
+    pipeline_metrics.write_report(METRICS_FILE)
+    print(f"各阶段耗时统计已写入：{os.path.abspath(METRICS_FILE)}")
+
+
+def _check_entry(view, info):
+    """校验一个条目的本地文件头、解压后的大小和 CRC32，正常时返回 None，否则返回错误说明"""
+    offset = info.header_offset
+    header = bytes(view[offset:offset + 30])
+    if len(header) < 30 or header[:4] != b'PK\x03\x04':
+        return "本地文件头损坏"
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    start = offset + 30 + name_length + extra_length
+    data = view[start:start + info.compress_size]
+    if len(data) < info.compress_size:
+        return "数据被截断"
+    if info.flag_bits & 0x1:
+        return "条目已加密，应用无法解压"
+
+    crc, size = 0, 0
+    if info.compress_type == zipfile.ZIP_STORED:
+        crc, size = zlib.crc32(data), len(data)
+    elif info.compress_type == zipfile.ZIP_DEFLATED:
+        # 分块解压并限制每次的输出大小，内存占用与条目大小无关
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            for position in range(0, len(data), CHUNK_SIZE):
+                pending = data[position:position + CHUNK_SIZE]
+                while pending:
+                    chunk = decompressor.decompress(pending, CHUNK_SIZE)
+                    pending = decompressor.unconsumed_tail
+                    crc, size = zlib.crc32(chunk, crc), size + len(chunk)
+            chunk = decompressor.flush()
+            crc, size = zlib.crc32(chunk, crc), size + len(chunk)
+        except zlib.error as e:
+            return f"解压失败: {e}"
+        if not decompressor.eof:
+            return "压缩数据不完整"
+    else:
+        return f"不支持的压缩方式 {info.compress_type}"
+    if size != info.file_size:
+        return f"解压后大小 {size} 与记录的 {info.file_size} 不符"
+    if crc != info.CRC:
+        return f"CRC 不符 (记录 {info.CRC:08x}，实际 {crc:08x})"
+    return None
+
+def verify_entries(zip_path, workers=None):
+    """
+    内存映射压缩包并用线程池并行校验每个条目的 CRC (zlib 解压和 crc32 会释放 GIL)。
+    返回 (条目列表, {文件名: 错误说明})。
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+    errors = {}
+    seen = set()
+    for info in infos:
+        if info.filename in seen:
+            errors[info.filename] = "文件名重复"
+        seen.add(info.filename)
+
+    with open(zip_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for info, error in zip(infos, executor.map(lambda info: _check_entry(view, info), infos)):
+                    if error:
+                        errors[info.filename] = error
+        finally:
+            view.release()
+    return infos, errors
+
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak # macOS 以字节为单位
+
+def simulate_extraction(zip_path, strategy, target_dir):
+    """
+    在独立的子进程中运行：按 strategy 将压缩包解压到 target_dir。返回
+    {'seconds', 'peak_rss_kb', 'rss_growth_kb', 'python_peak_bytes'}；RSS 增长不含解释器本身。
+    """
+    baseline_rss = _peak_rss_kb()
+    tracemalloc.start()
+    started = time.perf_counter()
+    if strategy == 'in-memory':
+        # rootBundle.load 读入整个压缩包，decodeBytes 后每个条目的 content 都留在内存中
+        with open(zip_path, 'rb') as f:
+            data = f.read()
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            contents = [(info.filename, archive.read(info)) for info in archive.infolist() if not info.is_dir()]
+        for name, content in contents:
+            destination = os.path.join(target_dir, name)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with open(destination, 'wb') as out:
+                out.write(content)
+    elif strategy == 'streaming':
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                destination = os.path.join(target_dir, info.filename)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                with archive.open(info) as source, open(destination, 'wb') as out:
+                    shutil.copyfileobj(source, out, CHUNK_SIZE)
+    else:
+        raise ValueError(f"未知的解压方式: {strategy}")
+    seconds = time.perf_counter() - started
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss = _peak_rss_kb()
+    return {
+        'seconds': round(seconds, 3),
+        'peak_rss_kb': peak_rss,
+        'rss_growth_kb': peak_rss - baseline_rss if peak_rss is not None else None,
+        'python_peak_bytes': python_peak,
+    }
+
+def verify_archive(zip_path=ARCHIVE_PATH, workers=None, simulate=True, output_path=None):
+    """校验压缩包并 (simulate 时) 模拟应用的各种解压方式，打印报告，全部条目正常时返回 True"""
+    if not os.path.exists(zip_path):
+        raise FileNotFoundError(f"压缩包 '{zip_path}' 不存在")
+    started = time.perf_counter()
+    try:
+        with pipeline_metrics.stage('verify.crc', zip_path) as timer:
+            timer.bytes = os.path.getsize(zip_path)
+            infos, errors = verify_entries(zip_path, workers)
+    except zipfile.BadZipFile as e:
+        print(f"无法读取压缩包的中央目录 (文件可能被截断): {e}")
+        return False
+    seconds = time.perf_counter() - started
+    compressed = sum(info.compress_size for info in infos)
+    uncompressed = sum(info.file_size for info in infos)
+    report = {
+        'archive': os.path.abspath(zip_path),
+        'archive_bytes': os.path.getsize(zip_path),
+        'entries': len(infos),
+        'compressed_bytes': compressed,
+        'uncompressed_bytes': uncompressed,
+        'crc_seconds': round(seconds, 3),
+        'errors': errors,
+        'extraction': {},
+    }
+    print(f"{len(infos)} 个条目，压缩后 {compressed / 1024 / 1024:.1f} MB，解压后 {uncompressed / 1024 / 1024:.1f} MB；"
+          f"CRC 校验耗时 {seconds:.2f}s ({uncompressed / 1024 / 1024 / seconds if seconds else 0:.0f} MB/s)")
+    for name, error in sorted(errors.items()):
+        print(f"  损坏: {name}: {error}")
+    print("所有条目均完好" if not errors else f"{len(errors)} 个条目损坏")
+
+    if simulate and not errors:
+        # 每种方式在新启动的进程中运行，峰值内存互不影响
+        context = multiprocessing.get_context('spawn')
+        for strategy in EXTRACTION_STRATEGIES:
+            target_dir = tempfile.mkdtemp(prefix='tv_shows_extract_')
+            try:
+                with pipeline_metrics.stage('verify.extract', strategy), \
+                        concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(simulate_extraction, os.path.abspath(zip_path), strategy, target_dir).result()
+            finally:
+                shutil.rmtree(target_dir, ignore_errors=True)
+            report['extraction'][strategy] = result
+            rss = (f"峰值 RSS 增长 {result['rss_growth_kb'] / 1024:.1f} MB" if result['rss_growth_kb'] is not None else "峰值 RSS 不可用")
+            print(f"模拟解压 ({strategy}): {result['seconds']:.2f}s，{rss}，"
+                  f"Python 分配峰值 {result['python_peak_bytes'] / 1024 / 1024:.1f} MB")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"校验结果已写入：{os.path.abspath(output_path)}")
+    pipeline_metrics.write_report(METRICS_FILE)
+    return not errors
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="将 assets/tv_shows 打包为 assets/tv_shows_archive.zip")
+    add_format_arguments(parser)
+    pipeline_profiling.add_profile_argument(parser)
+    subparsers = parser.add_subparsers(dest='command', help='不指定时创建压缩包')
+    parser_verify = subparsers.add_parser('verify', help='并行校验压缩包中每个条目的 CRC，并模拟应用的解压方式，统计耗时和峰值内存')
+    parser_verify.add_argument('--archive', default=ARCHIVE_PATH, help='要校验的压缩包 (默认: %(default)s)')
+    parser_verify.add_argument('--workers', type=int, help='校验线程数 (默认: CPU 数 + 4，最多 32)')
+    parser_verify.add_argument('--no-simulate', action='store_true', help='只校验 CRC，不模拟解压')
+    parser_verify.add_argument('--output', help='将校验结果以 JSON 写入此文件')
+    pipeline_logging.add_to_sub_commands(subparsers, pipeline_profiling.add_profile_argument)
+    args = parser.parse_args(argv)
+    check_format_arguments(parser, args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.command == 'verify':
+        ok = pipeline_profiling.run(args.profile, PROFILE_NAME, verify_archive, args.archive, args.workers, not args.no_simulate, args.output)
+        sys.exit(0 if ok else 1)
+    pipeline_profiling.run(args.profile, PROFILE_NAME, create_archive, args.catalog_format, args.minify_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+"""
+Local catalog server over assets/tv_shows (`shuangju serve`), so the app can be tested against
+a catalog that changes while it runs, instead of rebuilding the archive and reinstalling.
+
+    GET /                        {"entries": [...]}: catalog.json and the show folders ("name/")
+    GET /<show>/                 {"entries": [...]}: the files of a show
+    GET /<show>/init.json        any file below assets/tv_shows, as is (also catalog.json, media)
+    GET /<show>/<image>?w=320    a JPEG thumbnail at most w wide (and, with h=..., h high)
+
+Files and thumbnails carry strong ETags (SHA-1 of the file, cached per size and mtime) and
+Last-Modified, answer conditional GETs (If-None-Match / If-Modified-Since -> 304) and single
+byte ranges (Range, If-Range -> 206 / 416). Files are sent with sendfile. Cache-Control:
+no-cache makes clients revalidate, so edits show up on the next request.
+
+Thumbnails live in an LRU cache bounded by --cache-mb. Concurrent requests for the same
+thumbnail wait for a single rendering, and at most one rendering per CPU runs at once, so a
+burst of image requests cannot pile up decoded images in memory.
+
+Every connection gets its own thread (ThreadingHTTPServer, HTTP/1.1 keep-alive); Pillow and
+sendfile release the GIL, so image requests overlap. `stress` fires hundreds of parallel
+requests (thumbnails, full files, ranges, revalidations) at a server and reports throughput,
+latency percentiles and failures.
+
+For a phone on the same network use --host 0.0.0.0, or `adb reverse tcp:8765 tcp:8765`.
+
+Usage:
+    python scripts/dev_server.py serve --port 8765
+    python scripts/dev_server.py stress --requests 2000 --concurrency 200
+"""
+import argparse
+import email.utils
+import http.client
+import io
+import json
+import logging
+import mimetypes
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from lazy_modules import lazy_import
+import manage_tv_shows
+
+Image = lazy_import('PIL.Image')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_MB = 64
+THUMBNAIL_QUALITY = 82
+MIN_THUMBNAIL_SIDE = 16
+MAX_THUMBNAIL_SIDE = 4096
+IMAGE_EXTENSIONS = set(manage_tv_shows.JPEG_EXTENSIONS + manage_tv_shows.SUPPORTED_IMAGE_EXTENSIONS)
+_RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+# parse_range() result for a range that lies completely outside the content
+RANGE_NOT_SATISFIABLE = 'unsatisfiable'
+# Request mix of `stress`: kind -> weight
+STRESS_MIX = {'thumbnail': 6, 'full': 2, 'range': 1, 'revalidate': 1}
+STRESS_WIDTHS = [160, 320, 640]
+STRESS_RANGE_BYTES = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single 'bytes=' range of content of `size` bytes (end inclusive),
+    RANGE_NOT_SATISFIABLE, or None if the header is invalid or asks for several ranges,
+    in which case the whole content is sent.
+    """
+    match = _RANGE_PATTERN.fullmatch(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            return RANGE_NOT_SATISFIABLE
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return RANGE_NOT_SATISFIABLE
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def render_thumbnail(path, width, height):
+    """JPEG bytes of the image at `path` scaled down to fit width x height (never scaled up)."""
+    with Image.open(path) as source:
+        # The JPEG decoder can skip most of the work for a small thumbnail
+        source.draft('RGB', (width, height))
+        img = source.copy() if source.mode in ('RGBA', 'LA', 'P') else source.convert('RGB')
+    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    manage_tv_shows.save_still_image(img, buffer, 'jpeg', THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+class ETagCache:
+    """Strong ETags (SHA-1 of the content) of files, recomputed only when their size or mtime change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etags = {}
+
+    def get(self, path, stat):
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._etags.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        etag = f'"{manage_tv_shows.file_sha1(path)}"'
+        with self._lock:
+            self._etags[path] = (stamp, etag)
+        return etag
+
+
+class ThumbnailCache:
+    """
+    LRU cache of rendered thumbnails holding at most `max_bytes`. A thumbnail requested by
+    several threads at once is rendered by the first one while the others wait for it, and
+    at most `max_renders` renderings run at the same time.
+    """
+
+    def __init__(self, max_bytes, max_renders=None):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+        self._render_slots = threading.BoundedSemaphore(max_renders or os.cpu_count() or 1)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, render):
+        while True:
+            with self._lock:
+                data = self._entries.get(key)
+                if data is not None:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return data
+                done = self._rendering.get(key)
+                if done is None:
+                    done = self._rendering[key] = threading.Event()
+                    self.stats['misses'] += 1
+                    break
+            # Rendered by another thread meanwhile; if that failed (or was too large to
+            # keep), the next round renders it here
+            done.wait()
+
+        try:
+            with self._render_slots:
+                data = render()
+            with self._lock:
+                self._store(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._rendering[key]
+            done.set()
+
+    def _store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def summary(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries), 'bytes': self._size}
+
+
+class CatalogRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ShuangJuDevServer/1.0'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def _handle(self, send_body):
+        url = urlsplit(self.path)
+        path = self.server.resolve(unquote(url.path).lstrip('/'))
+        if path is None:
+            return self.send_error(HTTPStatus.NOT_FOUND)
+        if path.is_dir():
+            entries = sorted(entry.name + ('/' if entry.is_dir() else '') for entry in path.iterdir())
+            body = json.dumps({'entries': entries}, ensure_ascii=False).encode('utf-8')
+            return self._send_content(None, None, len(body), 'application/json; charset=utf-8',
+                                      lambda start, length: self.wfile.write(body[start:start + length]), send_body)
+
+        query = parse_qs(url.query)
+        if 'w' in query or 'h' in query:
+            return self._send_thumbnail(path, query, send_body)
+        stat = path.stat()
+
+        def write_file(start, length):
+            with open(path, 'rb') as f:
+                self.connection.sendfile(f, start, length)
+
+        self._send_content(self.server.etags.get(path, stat), stat.st_mtime, stat.st_size,
+                           self._content_type(path), write_file, send_body)
+
+    def _send_thumbnail(self, path, query, send_body):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            return self.send_error(HTTPStatus.BAD_REQUEST, "Thumbnails are only available for images")
+        try:
+            width = int(query.get('w', [MAX_THUMBNAIL_SIDE])[0])
+            height = int(query.get('h', [MAX_THUMBNAIL_SIDE])[0])
+        except ValueError:
+            return self.send_error(HTTPStatus.BAD_REQUEST, "w and h must be integers")
+        if not (MIN_THUMBNAIL_SIDE <= width <= MAX_THUMBNAIL_SIDE and MIN_THUMBNAIL_SIDE <= height <= MAX_THUMBNAIL_SIDE):
+            return self.send_error(HTTPStatus.BAD_REQUEST, f"w and h must be between {MIN_THUMBNAIL_SIDE} and {MAX_THUMBNAIL_SIDE}")
+
+        stat = path.stat()
+        source_etag = self.server.etags.get(path, stat).strip('"')
+        etag = f'"{source_etag}-{width}x{height}"'
+        # Revalidations are answered without rendering anything
+        if self._not_modified(etag, stat.st_mtime):
+            return self._send_not_modified(etag, stat.st_mtime)
+        key = (str(path), stat.st_size, stat.st_mtime_ns, width, height)
+        try:
+            data = self.server.thumbnails.get(key, lambda: render_thumbnail(path, width, height))
+        except (OSError, Image.DecompressionBombError) as e:
+            # The status line must stay latin-1, the error names a (CJK) path: details go to the body and the log
+            logging.warning(f"Cannot render a thumbnail of {path}: {e}")
+            return self.send_error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "Cannot read image", f"{type(e).__name__}: {e}")
+        self._send_content(etag, stat.st_mtime, len(data), 'image/jpeg',
+                           lambda start, length: self.wfile.write(data[start:start + length]), send_body)
+
+    @staticmethod
+    def _content_type(path):
+        if path.suffix.lower() == '.json':
+            return 'application/json; charset=utf-8'
+        return mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+    def _not_modified(self, etag, mtime):
+        if etag is None:
+            return False
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # Weak comparison, as RFC 9110 prescribes for If-None-Match
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        since = _parse_http_date(self.headers.get('If-Modified-Since'))
+        return since is not None and int(mtime) <= since
+
+    def _range_allowed(self, etag, mtime):
+        """False if an If-Range validator no longer matches, so the whole content has to be sent."""
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if etag is None:
+            return False
+        if_range = if_range.strip()
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag # Strong comparison; weak tags never match
+        date = _parse_http_date(if_range)
+        return date is not None and date == int(mtime)
+
+    def _validator_headers(self, etag, mtime):
+        headers = {'Cache-Control': 'no-cache'}
+        if etag is not None:
+            headers['ETag'] = etag
+            headers['Last-Modified'] = email.utils.formatdate(mtime, usegmt=True)
+        return headers
+
+    def _send_headers(self, status, headers):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, str(value))
+        self.end_headers()
+
+    def _send_not_modified(self, etag, mtime):
+        self._send_headers(HTTPStatus.NOT_MODIFIED, self._validator_headers(etag, mtime))
+
+    def _send_content(self, etag, mtime, size, content_type, write_body, send_body):
+        """Sends content of `size` bytes through write_body(start, length), honoring conditional and range headers."""
+        if self._not_modified(etag, mtime):
+            return self._send_not_modified(etag, mtime)
+        headers = self._validator_headers(etag, mtime)
+        headers['Accept-Ranges'] = 'bytes'
+        status, start, end = HTTPStatus.OK, 0, size - 1
+        range_header = self.headers.get('Range')
+        if range_header and self._range_allowed(etag, mtime):
+            byte_range = parse_range(range_header, size)
+            if byte_range == RANGE_NOT_SATISFIABLE:
+                headers.update({'Content-Range': f"bytes */{size}", 'Content-Length': 0})
+                return self._send_headers(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, headers)
+            if byte_range:
+                status, (start, end) = HTTPStatus.PARTIAL_CONTENT, byte_range
+                headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        headers.update({'Content-Type': content_type, 'Content-Length': end - start + 1})
+        self._send_headers(status, headers)
+        if send_body and end >= start:
+            write_body(start, end - start + 1)
+
+
+class CatalogServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of hundreds of connections from the app's image grid (or `stress`)
+    request_queue_size = 512
+
+    def __init__(self, address, base_path=manage_tv_shows.TV_SHOWS_BASE_PATH, cache_bytes=DEFAULT_CACHE_MB * 1024 * 1024, max_renders=None):
+        super().__init__(address, CatalogRequestHandler)
+        self.base_path = Path(base_path).resolve()
+        self.etags = ETagCache()
+        self.thumbnails = ThumbnailCache(cache_bytes, max_renders)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{'127.0.0.1' if host in ('0.0.0.0', '') else host}:{port}"
+
+    def resolve(self, relative_path):
+        """The file or directory below base_path that `relative_path` names, or None (also for anything outside it)."""
+        path = (self.base_path / relative_path).resolve()
+        if path != self.base_path and self.base_path not in path.parents:
+            return None
+        return path if path.exists() else None
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections mid-response are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+# --- Stress test ---
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, round(fraction * len(ordered) + 0.5 - 1e-9))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _get_json(connection, path):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"GET {path} returned {response.status}")
+    return json.loads(body)
+
+
+def list_images(host, port):
+    """URL paths of every image of every show on the server."""
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        images = []
+        for entry in _get_json(connection, '/')['entries']:
+            if not entry.endswith('/'):
+                continue
+            show_path = '/' + quote(entry)
+            images += [show_path + quote(name) for name in _get_json(connection, show_path)['entries']
+                       if Path(name).suffix.lower() in IMAGE_EXTENSIONS]
+        return images
+    finally:
+        connection.close()
+
+
+def _stress_worker(host, port, jobs, results):
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    for kind, path, width in jobs:
+        headers = {}
+        if kind == 'thumbnail':
+            path = f"{path}?w={width}"
+        elif kind == 'range':
+            headers['Range'] = f"bytes=0-{STRESS_RANGE_BYTES - 1}"
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            expected = {'range': (200, 206)}.get(kind, (200,))
+            ok = response.status in expected
+            if ok and kind == 'revalidate':
+                connection.request('GET', path, headers={'If-None-Match': response.getheader('ETag')})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 304
+            elif ok and response.status == 206:
+                ok = len(body) == min(STRESS_RANGE_BYTES, int(response.getheader('Content-Range').rsplit('/', 1)[1]))
+            results.append((kind, time.perf_counter() - started, len(body), ok, response.status))
+        except (OSError, http.client.HTTPException) as e:
+            results.append((kind, time.perf_counter() - started, 0, False, type(e).__name__))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+    connection.close()
+
+
+def stress(host, port, request_count, concurrency, widths=STRESS_WIDTHS, seed=0):
+    """
+    Sends `request_count` image requests from `concurrency` threads, each on its own keep-alive
+    connection, in the STRESS_MIX proportions. Returns a summary dict.
+    """
+    images = list_images(host, port)
+    if not images:
+        raise RuntimeError("The server has no images to request")
+    rng = random.Random(seed)
+    kinds = [kind for kind, weight in STRESS_MIX.items() for _ in range(weight)]
+    jobs = [(rng.choice(kinds), rng.choice(images), rng.choice(widths)) for _ in range(request_count)]
+    results = []
+    threads = [threading.Thread(target=_stress_worker, args=(host, port, jobs[index::concurrency], results))
+               for index in range(min(concurrency, len(jobs)))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency, _, _, _ in results]
+    failures = [(kind, status) for kind, _, _, ok, status in results if not ok]
+    summary = {
+        'images': len(images),
+        'requests': len(results),
+        'concurrency': len(threads),
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(results) / elapsed, 1) if elapsed else 0,
+        'mb_per_sec': round(sum(size for _, _, size, _, _ in results) / 1024 / 1024 / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'failures': len(failures),
+        'by_kind': {},
+    }
+    for kind in STRESS_MIX:
+        kind_latencies = [latency for result_kind, latency, _, _, _ in results if result_kind == kind]
+        if kind_latencies:
+            summary['by_kind'][kind] = {'requests': len(kind_latencies), 'p95_ms': round(percentile(kind_latencies, 0.95) * 1000, 1),
+                                        'failures': sum(1 for failed_kind, _ in failures if failed_kind == kind)}
+    if failures:
+        summary['failure_examples'] = [f"{kind}: {status}" for kind, status in failures[:10]]
+    return summary
+
+
+# --- Main Execution ---
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Serve assets/tv_shows over HTTP for testing the app (Range, ETags, on-demand thumbnails).")
+    subparsers = parser.add_subparsers(dest='command', required=True, help='Sub-command help')
+
+    def add_server_arguments(sub):
+        sub.add_argument('--root', default=str(manage_tv_shows.TV_SHOWS_BASE_PATH), help='Directory to serve (default: assets/tv_shows).')
+        sub.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB, help='Memory for cached thumbnails in MB (default: %(default)s).')
+        sub.add_argument('--max-renders', type=int, help='Thumbnails rendered at the same time (default: CPU count).')
+
+    parser_serve = subparsers.add_parser('serve', help='Run the server until interrupted.')
+    parser_serve.add_argument('--host', default=DEFAULT_HOST, help='Address to listen on, 0.0.0.0 for other devices (default: %(default)s).')
+    parser_serve.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port (default: %(default)s).')
+    parser_serve.add_argument('-v', '--verbose', action='store_true', help='Log every request.')
+    add_server_arguments(parser_serve)
+
+    parser_stress = subparsers.add_parser('stress', help='Fire parallel image requests at a server and report latency and failures.')
+    parser_stress.add_argument('--url', help='Server to test, e.g. http://127.0.0.1:8765 (default: start one in-process).')
+    parser_stress.add_argument('--requests', type=int, default=2000, help='Number of requests (default: %(default)s).')
+    parser_stress.add_argument('--concurrency', type=int, default=200, help='Parallel connections (default: %(default)s).')
+    parser_stress.add_argument('--widths', default=','.join(map(str, STRESS_WIDTHS)), help='Comma-separated thumbnail widths (default: %(default)s).')
+    parser_stress.add_argument('--seed', type=int, default=0, help='Random seed for the request mix (default: %(default)s).')
+    parser_stress.add_argument('--output', help='Write the results as JSON to this file.')
+    add_server_arguments(parser_stress)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if getattr(args, 'verbose', False) else logging.INFO, format='%(asctime)s - %(message)s')
+    if not Path(args.root).is_dir():
+        parser.error(f"{args.root} is not a directory")
+    cache_bytes = args.cache_mb * 1024 * 1024
+
+    if args.command == 'serve':
+        server = CatalogServer((args.host, args.port), args.root, cache_bytes, args.max_renders)
+        logging.info(f"Serving {server.base_path} at {server.base_url}/ (thumbnail cache {args.cache_mb} MB). Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info(f"Stopped. Thumbnail cache: {server.thumbnails.summary()}")
+        finally:
+            server.server_close()
+        return
+
+    try:
+        widths = [int(width) for width in args.widths.split(',') if width.strip()]
+    except ValueError:
+        parser.error("--widths must be comma-separated integers")
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        server = CatalogServer(('127.0.0.1', 0), args.root, cache_bytes, args.max_renders)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+    try:
+        summary = stress(host, port, args.requests, args.concurrency, widths, args.seed)
+    finally:
+        if server:
+            summary_cache = server.thumbnails.summary()
+            server.shutdown()
+            server.server_close()
+    if server:
+        summary['thumbnail_cache'] = summary_cache
+
+    print(f"{summary['requests']} requests over {summary['concurrency']} connections in {summary['seconds']}s: "
+          f"{summary['requests_per_sec']} req/s, {summary['mb_per_sec']} MB/s, "
+          f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, {summary['failures']} failed")
+    for kind, stats in summary['by_kind'].items():
+        print(f"  {kind:<10} {stats['requests']:>6} requests, p95 {stats['p95_ms']} ms, {stats['failures']} failed")
+    if 'thumbnail_cache' in summary:
+        print(f"  thumbnail cache: {summary['thumbnail_cache']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=4)
+        print(f"Results written to {args.output}")
+    if summary['failures']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Salient crop boxes for stills, so the app can show a 16:9 backdrop at a phone's aspect ratio
+with a plain scaled blit instead of cropping (and guessing) on the device.
+
+Saliency is edge energy on a small grayscale thumbnail with a mild center bias. For each
+target ratio the crop is the largest box of that ratio that fits the image, slid along the
+free axis to the position that keeps the most saliency.
+"""
+import math
+from lazy_modules import lazy_import
+
+Image = lazy_import('PIL.Image')
+ImageFilter = lazy_import('PIL.ImageFilter')
+
+# Home screen background (modern and older phones) and the square gallery grid cells
+DEFAULT_RATIOS = ['9:19.5', '9:16', '1:1']
+# Long side of the saliency map; crop positions are found to about 1% of the image size
+_ANALYSIS_SIZE = 96
+# Saliency is scaled down by up to this fraction towards the corners
+_CENTER_BIAS = 0.3
+
+
+def parse_ratio(text):
+    """'9:16' -> 0.5625 (width / height)."""
+    width, sep, height = text.partition(':')
+    try:
+        value = float(width) / float(height) if sep else float(text)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError(f"Invalid aspect ratio '{text}', expected W:H like 9:16") from None
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"Invalid aspect ratio '{text}', expected W:H like 9:16")
+    return value
+
+
+def saliency_map(img):
+    """Returns (width, height, [row-major saliency]) of a thumbnail of `img`."""
+    gray = img.convert('L')
+    gray.thumbnail((_ANALYSIS_SIZE, _ANALYSIS_SIZE), Image.Resampling.BILINEAR)
+    edges = gray.filter(ImageFilter.FIND_EDGES)
+    width, height = edges.size
+    values = list(edges.getdata())
+    center_x, center_y = (width - 1) / 2, (height - 1) / 2
+    max_distance = math.hypot(center_x, center_y) or 1
+    for y in range(height):
+        for x in range(width):
+            if x in (0, width - 1) or y in (0, height - 1):
+                # The edge filter sees the border as an edge
+                values[y * width + x] = 0
+            else:
+                distance = math.hypot(x - center_x, y - center_y) / max_distance
+                values[y * width + x] *= 1 - _CENTER_BIAS * distance
+    return width, height, values
+
+
+def focus_point(saliency):
+    """Saliency-weighted centroid as (x, y) fractions of the image size; the center if the image is flat."""
+    width, height, values = saliency
+    total = sum(values)
+    if not total:
+        return 0.5, 0.5
+    x_sum = sum(value * (index % width) for index, value in enumerate(values))
+    y_sum = sum(value * (index // width) for index, value in enumerate(values))
+    return (x_sum / total + 0.5) / width, (y_sum / total + 0.5) / height
+
+
+def _best_offset(profile, image_length, crop_length):
+    """Start (in image pixels) of the `crop_length` window whose saliency in `profile` is highest."""
+    if crop_length >= image_length:
+        return 0
+    scale = len(profile) / image_length
+    length = max(1, min(len(profile), round(crop_length * scale)))
+    prefix = [0]
+    for value in profile:
+        prefix.append(prefix[-1] + value)
+    middle = (len(profile) - length) / 2
+    # Highest saliency, ties broken towards the center
+    best = max(range(len(profile) - length + 1), key=lambda start: (prefix[start + length] - prefix[start], -abs(start - middle)))
+    center = (best + length / 2) / scale
+    return int(min(max(round(center - crop_length / 2), 0), image_length - crop_length))
+
+
+def crop_box(size, ratio, saliency):
+    """[left, top, width, height] of the salient `ratio` (width / height) crop of an image of `size`."""
+    image_width, image_height = size
+    map_width, map_height, values = saliency
+    if image_width / image_height > ratio:
+        crop_width, crop_height = max(1, round(image_height * ratio)), image_height
+        columns = [sum(values[y * map_width + x] for y in range(map_height)) for x in range(map_width)]
+        return [_best_offset(columns, image_width, crop_width), 0, crop_width, crop_height]
+    crop_width, crop_height = image_width, max(1, min(image_height, round(image_width / ratio)))
+    rows = [sum(values[y * map_width:(y + 1) * map_width]) for y in range(map_height)]
+    return [0, _best_offset(rows, image_height, crop_height), crop_width, crop_height]
+
+
+def compute_crops(image_path, ratios=DEFAULT_RATIOS, variant_paths=None, quality=90):
+    """
+    Returns {'focus': [x, y], 'crops': {ratio: [left, top, width, height]}} for an image file.
+    `variant_paths` ({ratio: path}) additionally saves the cropped images there.
+    """
+    with Image.open(image_path) as img:
+        size = img.size
+        if variant_paths:
+            img.load()
+            full = img.copy()
+        else:
+            full = None
+            # The JPEG decoder can skip most of the work for a small saliency map
+            img.draft('RGB', (_ANALYSIS_SIZE * 2, _ANALYSIS_SIZE * 2))
+        saliency = saliency_map(img)
+
+    crops = {ratio: crop_box(size, parse_ratio(ratio), saliency) for ratio in ratios}
+    for ratio, path in (variant_paths or {}).items():
+        left, top, width, height = crops[ratio]
+        variant = full.crop((left, top, left + width, top + height))
+        if variant.mode not in ('RGB', 'L'):
+            variant = variant.convert('RGB')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        variant.save(path, 'JPEG', quality=quality, optimize=True)
+    focus_x, focus_y = focus_point(saliency)
+    return {'focus': [round(focus_x, 4), round(focus_y, 4)], 'crops': crops}
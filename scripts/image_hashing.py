@@ -0,0 +1,192 @@
+"""
+Perceptual hashing helpers shared by manage_tv_shows.py and create_and_fetch_tvshows.py.
+
+Hashes are 64-bit integers (8x8 bits), so the distance between two images is
+simply the number of differing bits (Hamming distance).
+"""
+import math
+from lazy_modules import lazy_import
+
+Image = lazy_import('PIL.Image')
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+DEFAULT_HASH = 'phash'
+# Distance (in bits, out of 64) below which two stills are treated as near-duplicates.
+DEFAULT_MAX_DISTANCE = 10
+
+_DCT_SIZE = 32
+# cos((2x + 1) * u * pi / 2N) for the low-frequency rows we keep
+_DCT_COS = [
+    [math.cos((2 * x + 1) * u * math.pi / (2 * _DCT_SIZE)) for x in range(_DCT_SIZE)]
+    for u in range(HASH_SIZE)
+]
+
+
+def _grayscale_pixels(img, size):
+    """Returns the pixels of `img` as a flat list after grayscale + resize to `size`."""
+    if img.format == 'JPEG':
+        # Let the JPEG decoder do most of the downscaling (much faster on large originals)
+        img.draft('L', (size[0] * 4, size[1] * 4))
+    small = img.convert('L').resize(size, Image.Resampling.LANCZOS)
+    return list(small.getdata())
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def average_hash(img):
+    """aHash: each bit says whether a pixel is brighter than the mean."""
+    pixels = _grayscale_pixels(img, (HASH_SIZE, HASH_SIZE))
+    mean = sum(pixels) / len(pixels)
+    return _bits_to_int(p > mean for p in pixels)
+
+
+def difference_hash(img):
+    """dHash: each bit says whether a pixel is brighter than its right neighbour."""
+    pixels = _grayscale_pixels(img, (HASH_SIZE + 1, HASH_SIZE))
+    bits = []
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits.append(pixels[offset + col] > pixels[offset + col + 1])
+    return _bits_to_int(bits)
+
+
+def perceptual_hash(img):
+    """pHash: compares the low-frequency DCT coefficients against their median."""
+    pixels = _grayscale_pixels(img, (_DCT_SIZE, _DCT_SIZE))
+    rows = [pixels[i * _DCT_SIZE:(i + 1) * _DCT_SIZE] for i in range(_DCT_SIZE)]
+
+    # Separable 2D DCT, only computing the top-left HASH_SIZE x HASH_SIZE block
+    row_dct = [[sum(c * p for c, p in zip(cos_u, row)) for cos_u in _DCT_COS] for row in rows]
+    coefficients = []
+    for v in range(HASH_SIZE):
+        cos_v = _DCT_COS[v]
+        for u in range(HASH_SIZE):
+            coefficients.append(sum(cos_v[y] * row_dct[y][u] for y in range(_DCT_SIZE)))
+
+    # The DC term only encodes overall brightness, keep it out of the median
+    median = sorted(coefficients[1:])[(len(coefficients) - 1) // 2]
+    return _bits_to_int(c > median for c in coefficients)
+
+
+HASH_FUNCTIONS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+    'phash': perceptual_hash,
+}
+
+
+def compute_hash(image_source, method=DEFAULT_HASH):
+    """Computes the `method` hash of a path or file-like object."""
+    with Image.open(image_source) as img:
+        return HASH_FUNCTIONS[method](img)
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count('1')
+
+
+class HammingIndex:
+    """
+    Multi-index hash table for Hamming-distance range queries.
+
+    A 64-bit hash is split into `max_distance + 1` chunks. By the pigeonhole
+    principle two hashes within `max_distance` bits share at least one chunk
+    exactly, so a query only has to verify the entries in its own buckets
+    instead of scanning the whole catalog.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        chunk_count = min(max_distance + 1, HASH_BITS)
+        base, extra = divmod(HASH_BITS, chunk_count)
+        self._chunks = []  # (shift, mask) per chunk
+        shift = 0
+        for i in range(chunk_count):
+            width = base + (1 if i < extra else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [{} for _ in self._chunks]
+        self._hashes = {}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, key, hash_value):
+        self._hashes[key] = hash_value
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((hash_value >> shift) & mask, []).append(key)
+
+    def query(self, hash_value, max_distance=None):
+        """Returns [(key, distance)] for every indexed hash within `max_distance`, closest first."""
+        if max_distance is None:
+            max_distance = self.max_distance
+        elif max_distance > self.max_distance:
+            raise ValueError(f"Index was built for distances up to {self.max_distance}, got {max_distance}")
+
+        seen = set()
+        matches = []
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for key in table.get((hash_value >> shift) & mask, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = hamming_distance(hash_value, self._hashes[key])
+                if distance <= max_distance:
+                    matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+def find_clusters(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Groups keys whose hashes are within `max_distance` of each other (transitively).
+    `hashes` maps key -> hash. Returns a list of clusters with at least two keys.
+    """
+    index = HammingIndex(max_distance)
+    for key, hash_value in hashes.items():
+        index.add(key, hash_value)
+
+    parent = {key: key for key in hashes}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for key, hash_value in hashes.items():
+        for other, _ in index.query(hash_value):
+            root_a, root_b = find(key), find(other)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    groups = {}
+    for key in hashes:
+        groups.setdefault(find(key), []).append(key)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def select_diverse(candidates, count, min_distance=DEFAULT_MAX_DISTANCE):
+    """
+    Greedily picks up to `count` keys from `candidates` ([(key, hash)], in order
+    of preference) so that no two picks are within `min_distance` bits.
+    If there are not enough distinct images, the closest duplicates are skipped
+    rather than padding the result.
+    """
+    index = HammingIndex(min_distance)
+    selected = []
+    for key, hash_value in candidates:
+        if len(selected) >= count:
+            break
+        if index.query(hash_value):
+            continue
+        index.add(key, hash_value)
+        selected.append(key)
+    return selected
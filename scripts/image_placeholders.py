@@ -0,0 +1,112 @@
+"""
+Layout/placeholder metadata for stills: dimensions, dominant color and a BlurHash string
+(https://blurha.sh), so the app can size grid tiles and paint a placeholder without
+decoding the image.
+"""
+import math
+from lazy_modules import lazy_import
+
+Image = lazy_import('PIL.Image')
+
+DEFAULT_COMPONENTS = (4, 3)
+# BlurHash only needs a tiny thumbnail, larger inputs just cost time
+_SAMPLE_SIZE = 32
+_BASE83_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _encode_base83(value, length):
+    chars = []
+    for i in range(1, length + 1):
+        digit = (value // (83 ** (length - i))) % 83
+        chars.append(_BASE83_CHARS[digit])
+    return ''.join(chars)
+
+
+def _srgb_to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash_encode(img, components=DEFAULT_COMPONENTS):
+    """Encodes an RGB image (ideally already small) as a BlurHash string."""
+    components_x, components_y = components
+    width, height = img.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in img.getdata()]
+
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(components_x)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(components_y)]
+
+    factors = []
+    for j in range(components_y):
+        for i in range(components_x):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                basis_y = cos_y[j][y]
+                row = y * width
+                for x in range(width):
+                    basis = basis_y * cos_x[i][x]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode_base83((components_x - 1) + (components_y - 1) * 9, 1)
+
+    if ac:
+        actual_max = max(abs(channel) for factor in ac for channel in factor)
+        quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        result += _encode_base83(quantised_max, 1)
+    else:
+        max_value = 1
+        result += _encode_base83(0, 1)
+
+    dc_value = (_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2])
+    result += _encode_base83(dc_value, 4)
+
+    for factor in ac:
+        quantised = [max(0, min(18, int(_sign_pow(channel / max_value, 0.5) * 9 + 9.5))) for channel in factor]
+        result += _encode_base83(quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2)
+    return result
+
+
+def dominant_color(img, palette_size=5):
+    """Most frequent color of a small median-cut palette, as '#rrggbb'."""
+    quantized = img.quantize(colors=palette_size, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def compute_image_metadata(image_path, components=DEFAULT_COMPONENTS):
+    """Returns width, height, aspect ratio, dominant color and BlurHash of an image file."""
+    with Image.open(image_path) as img:
+        width, height = img.size
+        # The JPEG decoder can skip most of the work for a tiny sample
+        img.draft('RGB', (_SAMPLE_SIZE * 2, _SAMPLE_SIZE * 2))
+        sample = img.convert('RGB')
+        sample.thumbnail((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.Resampling.BILINEAR)
+
+    return {
+        'width': width,
+        'height': height,
+        'aspect_ratio': round(width / height, 4) if height else 0,
+        'color': dominant_color(sample),
+        'blurhash': blurhash_encode(sample, components),
+    }
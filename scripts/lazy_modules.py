@@ -0,0 +1,38 @@
+"""
+Deferred imports for heavy dependencies (requests, Pillow).
+
+`requests = lazy_import('requests')` binds a module object whose code only runs on first
+attribute access, so importing a pipeline module (or printing `--help`) doesn't pay for
+dependencies the command never touches.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Returns module `name`, executed on first attribute access (importlib.util.LazyLoader)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    parent_name, _, child_name = name.rpartition('.')
+    parent = importlib.import_module(parent_name) if parent_name else None
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    if parent is not None:
+        setattr(parent, child_name, module)
+    return module
+
+
+def load(*modules):
+    """
+    Executes lazily imported modules now. Call it before several threads may touch them:
+    LazyLoader only became thread-safe in Python 3.12.
+    """
+    for module in modules:
+        # Any attribute access runs the module and turns it into a plain module
+        module.__name__
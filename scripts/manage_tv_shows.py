@@ -6,30 +6,83 @@
 # ///
 from datetime import datetime
 import os
+import io
 import json
 import argparse
 import logging
+import re
+import shutil
 import sys
+import time
+import hashlib
+import collections
+import functools
+import math
+import threading
+import concurrent.futures
+from concurrent.futures import as_completed
 from pathlib import Path
-from PIL import Image
+from PIL import UnidentifiedImageError
+from lazy_modules import lazy_import
+try:
+    import resource # Unix only, used to report peak memory
+except ImportError:
+    resource = None
+import catalog_codec
+import image_crops
+import image_hashing
+import image_placeholders
+import mp3_frames
+import quote_cards
+import pipeline_logging
+import pipeline_metrics
+import pipeline_profiling
+
+# Pillow is only loaded once an image is actually touched, so --help and 'json' start fast
+Image = lazy_import('PIL.Image')
+features = lazy_import('PIL.features')
 
 # --- Constants ---
 # Assuming this script is in the 'scripts' directory
 # Adjust the path if necessary to point to the parent of 'assets/tv_shows'
 PROJECT_ROOT = Path(__file__).parent.parent
 TV_SHOWS_BASE_PATH = PROJECT_ROOT / "assets" / "tv_shows"
+# Catalog-wide metadata (image dimensions, placeholders, ...) shipped next to the show folders
+CATALOG_INDEX_FILE = TV_SHOWS_BASE_PATH / "catalog.json"
+CATALOG_INDEX_VERSION = 1
 LOG_FILE = 'manage_tv_shows.log'
-SUPPORTED_IMAGE_EXTENSIONS = ['.png', '.webp', '.jpeg', '.bmp', '.gif', '.tiff'] # Add more if needed
-
-# --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Per-stage timings of the last run (.cache/metrics/manage_tv_shows.metrics.json)
+METRICS_FILE = pipeline_metrics.metrics_path_for(LOG_FILE)
+# Local caches (hashes etc.), kept outside assets/ so they never end up in the archive
+CACHE_DIR = PROJECT_ROOT / ".cache"
+HASH_CACHE_FILE = CACHE_DIR / "image_hashes.json"
+OPTIMIZE_STATE_FILE = CACHE_DIR / "optimized_images.json"
+CARDS_STATE_FILE = CACHE_DIR / "rendered_cards.json"
+BUDGET_STATE_FILE = CACHE_DIR / "budget_steps.json"
+THEME_SONG_NAME = "themesong.mp3"
+PREVIEW_SONG_NAME = "themesong.preview.mp3"
+CROPS_DIR_NAME = "crops"
+JPEG_EXTENSIONS = ['.jpg', '.jpeg']
+# Conversions never materialize more than this many output pixels (4K UHD); 0 disables the cap
+DEFAULT_MAX_PIXELS = 3840 * 2160
+# Estimated image memory allowed across all conversion workers at once
+DEFAULT_MEMORY_BUDGET_MB = 1024
+# Size budgets: what a single show folder and the whole catalog (= the archive) may take up
+DEFAULT_SHOW_BUDGET = '20MB'
+DEFAULT_TOTAL_BUDGET = '500MB'
+# Steps 'budget --enforce' goes through until a show fits: (max side in pixels, quality)
+BUDGET_STEPS = [(3840, 90), (2560, 85), (1920, 82), (1600, 78), (1280, 72)]
+BUDGET_LOSSY_FORMATS = ['JPEG', 'WEBP', 'AVIF']
+SUPPORTED_IMAGE_EXTENSIONS = ['.png', '.webp', '.jpeg', '.bmp', '.gif', '.tiff', '.avif'] # Add more if needed
+# Output formats for stills. The first extension is used for new files; quality is the default per format.
+OUTPUT_FORMATS = {
+    'jpeg': {'pil_format': 'JPEG', 'pil_feature': 'jpg', 'extensions': ['.jpg', '.jpeg'], 'quality': 90, 'options': {'optimize': True}},
+    'webp': {'pil_format': 'WEBP', 'pil_feature': 'webp', 'extensions': ['.webp'], 'quality': 80, 'options': {'method': 6}},
+    'avif': {'pil_format': 'AVIF', 'pil_feature': 'avif', 'extensions': ['.avif'], 'quality': 60, 'options': {'speed': 6}},
+}
+# Formats rename-images (and build / watch) may write: DataService.getImagePathsForShow only lists
+# .jpg/.jpeg/.png/.webp stills, so AVIF is benchmark-only until the app decodes and lists it
+STILL_FORMATS = ['jpeg', 'webp']
 
 # --- Helper Functions ---
 
@@ -100,6 +153,72 @@ def sanitize_filename(name):
 
     return sanitized
 
+def natural_sort_key(path):
+    """Sort key that orders 'show-2.jpg' before 'show-10.jpg'."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', path.name)]
+
+def list_still_images(show_dir_path):
+    """Returns the still images of a show (every supported image except cover.jpg), naturally sorted by name."""
+    stills = []
+    for item in show_dir_path.iterdir():
+        if item.is_file() and item.name.lower() != 'cover.jpg':
+            ext = item.suffix.lower()
+            if ext == '.jpg' or ext in SUPPORTED_IMAGE_EXTENSIONS:
+                stills.append(item)
+    stills.sort(key=natural_sort_key)
+    return stills
+
+def load_show_json(show_dir_path):
+    """Reads a show's init.json, returning an empty dict if it is missing or invalid."""
+    json_path = show_dir_path / "init.json"
+    if not json_path.is_file():
+        return {}
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logging.warning(f"Could not read {json_path}: {e}")
+        return {}
+
+def load_cache(cache_path):
+    """Loads a JSON cache file from CACHE_DIR, returning an empty dict if it doesn't exist yet."""
+    if not cache_path.is_file():
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logging.warning(f"Ignoring unreadable cache {cache_path}: {e}")
+        return {}
+
+def save_cache(cache_path, data):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with pipeline_metrics.stage('json.dump', cache_path.name):
+            catalog_codec.write_file(cache_path, data, 'json-min')
+    except IOError as e:
+        logging.warning(f"Could not write cache {cache_path}: {e}")
+
+def load_catalog_index():
+    """Loads the catalog index, returning an empty index if it doesn't exist yet."""
+    index = load_cache(CATALOG_INDEX_FILE)
+    if index.get('version') != CATALOG_INDEX_VERSION:
+        index = {'version': CATALOG_INDEX_VERSION, 'shows': {}}
+    index.setdefault('shows', {})
+    return index
+
+def save_catalog_index(index):
+    """Writes the catalog index with shows in a stable order."""
+    index['shows'] = dict(sorted(index['shows'].items()))
+    try:
+        with pipeline_metrics.stage('json.dump', CATALOG_INDEX_FILE.name):
+            catalog_codec.write_file(CATALOG_INDEX_FILE, index)
+        logging.info(f"Catalog index written to {CATALOG_INDEX_FILE}")
+        return True
+    except IOError as e:
+        logging.error(f"Failed to write catalog index {CATALOG_INDEX_FILE}: {e}", exc_info=True)
+        return False
+
 
 # --- Core Functions ---
 
@@ -138,9 +257,9 @@ def modify_json_field(show_dir_path, action, key, value=None):
 
     if modified:
         try:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            logging.info(f"Successfully updated {json_path}")
+            with pipeline_metrics.stage('json.dump', json_path):
+                catalog_codec.write_file(json_path, data)
+            logging.debug(f"Successfully updated {json_path}")
             return True
         except IOError as e:
             logging.error(f"Failed to write updated {json_path}: {e}", exc_info=True)
@@ -148,11 +267,222 @@ def modify_json_field(show_dir_path, action, key, value=None):
     else:
         return True # No changes needed is considered success
 
-def rename_and_convert_images(show_dir_path):
-    """Renames images to a standard format and converts non-JPGs."""
-    logging.info(f"--- Processing images in: {show_dir_path} ---")
+def save_still_image(img, save_path, output_format='jpeg', quality=None):
+    """Flattens `img` to RGB (white background for transparency) and saves it in `output_format`."""
+    format_info = OUTPUT_FORMATS[output_format]
+    # Convert to RGB if it has alpha channel (e.g., PNG) or is palette-based (e.g., GIF)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        logging.debug(f"Converting image mode from {img.mode} to RGB.")
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        # Create a white background image
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        # Paste the image onto the background using the alpha channel as mask
+        try:
+            bg.paste(img, (0, 0), img.split()[-1])
+            img_to_save = bg
+        except Exception as paste_err:
+            logging.warning(f"Error during alpha compositing, saving as plain RGB. Error: {paste_err}")
+            img_to_save = img.convert('RGB')
+    elif img.mode != 'RGB':
+        logging.debug(f"Converting image mode from {img.mode} to RGB.")
+        img_to_save = img.convert('RGB')
+    else:
+        img_to_save = img
+
+    save_kwargs = dict(format_info['options'])
+    save_kwargs['quality'] = quality if quality is not None else format_info['quality']
+    img_to_save.save(save_path, format_info['pil_format'], **save_kwargs)
+
+def current_peak_rss_kb():
+    """Peak resident set size of this process in KiB, or None where unsupported (e.g. Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak # macOS reports bytes
+
+def _bounded_size(width, height, max_pixels):
+    """Largest size with the same aspect ratio as width x height that fits in max_pixels."""
+    if not max_pixels or width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def load_bounded_image(image_path, max_pixels=None):
+    """
+    Opens an image and shrinks it to at most `max_pixels` before any compositing happens.
+    JPEGs are scaled by the decoder itself (draft()), JPEG 2000 uses reduce-on-load, and other
+    formats are shrunk with reduce() + resample right after decoding. The caller must close the result.
+    """
+    img = Image.open(image_path)
+    target_size = _bounded_size(img.width, img.height, max_pixels)
+
+    if target_size != img.size and img.format == 'JPEG2000':
+        img.reduce = max(0, min(5, int(math.log2(img.width / target_size[0]))))
+    if img.mode == 'P':
+        # Palette images can't be resampled smoothly, expand them first
+        converted = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        img.close()
+        img = converted
+    if target_size != img.size:
+        # thumbnail() applies draft() and reduce() before the final LANCZOS pass
+        img.thumbnail(target_size, Image.Resampling.LANCZOS)
+    return img
+
+def estimate_conversion_memory(image_path, max_pixels=None):
+    """Rough upper bound (bytes) of the memory needed by convert_image_file for this image."""
+    try:
+        with Image.open(image_path) as img:
+            width, height, mode, image_format = img.width, img.height, img.mode, img.format
+    except (UnidentifiedImageError, OSError):
+        return 0
+    source_pixels = width * height
+    target_width, target_height = _bounded_size(width, height, max_pixels)
+    target_pixels = target_width * target_height
+
+    # Pillow stores every multi-band mode with 4 bytes per pixel
+    decoded = source_pixels * (1 if mode in ('1', 'L', 'P') else 4)
+    if mode == 'P':
+        decoded += source_pixels * 4
+    if image_format == 'JPEG' and target_pixels < source_pixels:
+        # draft() decodes at 1/2, 1/4 or 1/8 scale, keeping at least twice the target size
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= target_width * 2 and height // (scale * 2) >= target_height * 2:
+            scale *= 2
+        decoded //= scale * scale
+    elif target_pixels < source_pixels:
+        # reduce() keeps an intermediate copy of at most a quarter of the decoded image
+        decoded += decoded // 4
+    # Background + alpha mask + converted copy at the output size
+    return decoded + target_pixels * 4 * 3
+
+def convert_image_file(source_path, target_path, output_format='jpeg', quality=None, max_pixels=None):
+    """
+    Converts one image with bounded memory (see load_bounded_image) and saves it as `output_format`.
+    Runs in a worker process, so it returns a plain dict instead of raising.
+    """
+    result = {'source': source_path, 'target': target_path, 'ok': False, 'error': None,
+              'size': None, 'downscaled': False, 'peak_rss_kb': None}
+    try:
+        with pipeline_metrics.stage('image.open', source_path) as timer:
+            timer.bytes = os.path.getsize(source_path)
+            with Image.open(source_path) as probe:
+                source_size = probe.size
+            img = load_bounded_image(source_path, max_pixels)
+        try:
+            with pipeline_metrics.stage('image.save', target_path) as timer:
+                save_still_image(img, target_path, output_format, quality)
+                timer.bytes = os.path.getsize(target_path)
+            result['size'] = img.size
+            result['downscaled'] = img.size != source_size
+        finally:
+            img.close()
+        result['ok'] = True
+    except UnidentifiedImageError:
+        result['error'] = "Cannot identify image file (possibly corrupt or unsupported format)"
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['peak_rss_kb'] = current_peak_rss_kb()
+    result['metrics'] = pipeline_metrics.drain()
+    return result
+
+class BoundedImageConverter:
+    """
+    Runs convert_image_file jobs in a process pool while keeping the estimated memory of all
+    in-flight conversions under `memory_budget_mb`. Large images therefore lower the effective
+    concurrency instead of running the machine out of memory; an image larger than the whole
+    budget still runs, but alone. convert() may be called from several threads at once: their
+    jobs join one admission queue (first come, first served) and share one in-flight memory
+    counter, so the budget holds across callers while their conversions overlap.
+    """
+
+    def __init__(self, workers=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, max_pixels=DEFAULT_MAX_PIXELS):
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.max_pixels = max_pixels or None
+        self.peak_worker_rss_kb = None
+        self.peak_in_flight_estimate = 0
+        self.converted_count = 0
+        self._executor = None
+        # Reentrant: a future that is already done runs its callback inside add_done_callback
+        self._condition = threading.Condition(threading.RLock())
+        self._queue = collections.deque()  # (results, index, job, estimate) waiting for admission
+        self._in_flight = 0
+        self._in_flight_memory = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def convert(self, jobs):
+        """Converts [(source, target, output_format, quality)] and returns the results in the same order."""
+        results = [None] * len(jobs)
+        # Image headers are read before taking the lock, so other callers keep admitting meanwhile
+        queued = [(results, index, job, estimate_conversion_memory(job[0], self.max_pixels)) for index, job in enumerate(jobs)]
+        with self._condition:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, **pipeline_logging.pool_options())
+            self._queue.extend(queued)
+            # Whichever caller wakes up admits for everybody, so freed budget never sits idle
+            while any(result is None for result in results):
+                self._admit()
+                self._condition.wait()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            pipeline_metrics.merge(result.pop('metrics', None))
+        return results
+
+    def _admit(self):
+        """Submits queued jobs in order while they fit in the budget (always one if nothing runs). Holds the lock."""
+        while self._queue and self._in_flight < self.workers:
+            results, index, job, estimate = self._queue[0]
+            if self._in_flight and self._in_flight_memory + estimate > self.memory_budget:
+                break
+            self._queue.popleft()
+            self._in_flight += 1
+            self._in_flight_memory += estimate
+            self.peak_in_flight_estimate = max(self.peak_in_flight_estimate, self._in_flight_memory)
+            future = self._executor.submit(convert_image_file, *job, self.max_pixels)
+            future.add_done_callback(functools.partial(self._finished, results, index, estimate))
+
+    def _finished(self, results, index, estimate, future):
+        """Done callback (executor thread): frees the job's share of the budget and wakes the callers."""
+        try:
+            result = future.result()
+        except BaseException as e:  # a broken pool; re-raised in the caller
+            result = e
+        with self._condition:
+            self._in_flight -= 1
+            self._in_flight_memory -= estimate
+            results[index] = result
+            if isinstance(result, dict):
+                self.converted_count += 1
+                if result['peak_rss_kb'] is not None:
+                    self.peak_worker_rss_kb = max(self.peak_worker_rss_kb or 0, result['peak_rss_kb'])
+            self._condition.notify_all()
+
+    def summary(self):
+        def mb(kb):
+            return f"{kb / 1024:.1f} MB" if kb is not None else "n/a"
+        return (f"{self.converted_count} conversions, peak worker RSS {mb(self.peak_worker_rss_kb)}, "
+                f"peak estimated in-flight image memory {self.peak_in_flight_estimate / 1024 / 1024:.1f} MB "
+                f"(budget {self.memory_budget / 1024 / 1024:.0f} MB), main process peak RSS {mb(current_peak_rss_kb())}")
+
+def rename_and_convert_images(show_dir_path, output_format='jpeg', quality=None, converter=None):
+    """
+    Renames stills to '<show>-<n><ext>' and converts those not already in `output_format`.
+    Conversions run through `converter` (a BoundedImageConverter, one is created if omitted).
+    Keys of init.json's inline_lines are updated to follow the renamed files.
+    """
+    logging.debug(f"--- Processing images in: {show_dir_path} ---")
     json_path = show_dir_path / "init.json"
     show_name_from_json = show_dir_path.name # Default to folder name
+    data = None
 
     if json_path.is_file():
         try:
@@ -169,103 +499,930 @@ def rename_and_convert_images(show_dir_path):
         logging.error(f"Could not generate a safe filename base for '{show_name_from_json}', skipping image processing for {show_dir_path}")
         return False
 
-    image_files = []
-    for item in show_dir_path.iterdir():
-        # Check if it's a file, not cover.jpg, and has a supported image extension (case-insensitive)
-        if item.is_file() and item.name.lower() != 'cover.jpg':
-            ext = item.suffix.lower()
-            if ext == '.jpg' or ext in SUPPORTED_IMAGE_EXTENSIONS:
-                image_files.append(item)
+    # Naturally sorted by name to ensure consistent numbering
+    image_files = list_still_images(show_dir_path)
 
     if not image_files:
-        logging.info(f"No images (excluding cover.jpg) found to process in {show_dir_path}.")
+        logging.debug(f"No images (excluding cover.jpg) found to process in {show_dir_path}.")
         return True
 
-    # Sort files to ensure consistent numbering (e.g., by name)
-    image_files.sort()
-
-    logging.info(f"Found {len(image_files)} images to potentially rename/convert.")
+    if output_format not in STILL_FORMATS:
+        raise ValueError(f"The app cannot show {output_format} stills, expected one of {STILL_FORMATS}")
+    format_info = OUTPUT_FORMATS[output_format]
+    target_ext = format_info['extensions'][0]
+    logging.debug(f"Found {len(image_files)} images to potentially rename/convert to {output_format.upper()}.")
     success_count = 0
     fail_count = 0
     skipped_count = 0
+    renamed = {} # old filename -> new filename, used to update inline_lines
 
+    plan = []
     for index, old_path in enumerate(image_files):
-        new_filename = f"{safe_show_name}-{index + 1}.jpg"
-        new_path = show_dir_path / new_filename
-        old_ext = old_path.suffix.lower()
-
+        new_path = show_dir_path / f"{safe_show_name}-{index + 1}{target_ext}"
         if old_path == new_path:
             logging.debug(f"Skipping '{old_path.name}', already correctly named and formatted.")
             skipped_count += 1
             success_count += 1 # Already correct counts as success
-            continue
-
-        logging.info(f"Processing '{old_path.name}' -> '{new_filename}'")
+        else:
+            plan.append((old_path, new_path))
 
+    # Move every file that needs work out of the way first, so renumbering
+    # (e.g. '-10.jpg' -> '-2.jpg') never overwrites a file that hasn't been processed yet.
+    staged = []
+    for old_path, new_path in plan:
+        staged_path = old_path.with_name(f".{old_path.name}.renaming")
         try:
-            if old_ext == '.jpg':
-                # Just rename
-                logging.debug(f"Renaming '{old_path.name}' to '{new_filename}'")
-                old_path.rename(new_path)
+            old_path.rename(staged_path)
+            staged.append((old_path, staged_path, new_path))
+        except OSError as e:
+            logging.error(f"Could not stage '{old_path.name}' for renaming: {e}")
+            fail_count += 1
+
+    conversions = []
+    for old_path, staged_path, new_path in staged:
+        new_filename = new_path.name
+        old_ext = old_path.suffix.lower()
+        logging.debug(f"Processing '{old_path.name}' -> '{new_filename}'")
+
+        if old_ext in format_info['extensions']:
+            # Just rename
+            logging.debug(f"Renaming '{old_path.name}' to '{new_filename}'")
+            try:
+                staged_path.rename(new_path)
+                renamed[old_path.name] = new_filename
                 success_count += 1
-            else:
-                # Convert and save, then delete old
-                logging.debug(f"Converting '{old_path.name}' ({old_ext}) to JPG: '{new_filename}'")
-                with Image.open(old_path) as img:
-                    # Convert to RGB if it has alpha channel (e.g., PNG) or is palette-based (e.g., GIF)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        logging.debug(f"Converting image mode from {img.mode} to RGB.")
-                        # Create a white background image
-                        bg = Image.new("RGB", img.size, (255, 255, 255))
-                        # Paste the image onto the background using the alpha channel as mask
-                        try:
-                           bg.paste(img, (0, 0), img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                           img_to_save = bg
-                        except Exception as paste_err:
-                           logging.warning(f"Error during alpha compositing for {old_path.name}, saving as plain RGB. Error: {paste_err}")
-                           img_to_save = img.convert('RGB')
-
-                    elif img.mode != 'RGB':
-                         logging.debug(f"Converting image mode from {img.mode} to RGB.")
-                         img_to_save = img.convert('RGB')
-                    else:
-                         img_to_save = img
-
-                    img_to_save.save(new_path, "JPEG", quality=90) # Save as JPG with decent quality
-                logging.info(f"Successfully converted and saved '{new_filename}'")
+            except OSError as e:
+                logging.error(f"Failed to rename image {old_path.name}: {e}", exc_info=True)
+                fail_count += 1
+        else:
+            logging.debug(f"Converting '{old_path.name}' ({old_ext}) to {output_format.upper()}: '{new_filename}'")
+            conversions.append((old_path, staged_path, new_path))
+
+    if conversions:
+        # Convert in worker processes (bounded by the converter's memory budget), then delete the originals
+        jobs = [(str(staged_path), str(new_path), output_format, quality) for _, staged_path, new_path in conversions]
+        if converter is None:
+            with BoundedImageConverter() as local_converter:
+                results = local_converter.convert(jobs)
+        else:
+            results = converter.convert(jobs)
+
+        for (old_path, staged_path, new_path), result in zip(conversions, results):
+            if result['ok']:
+                resized = f" (downscaled to {result['size'][0]}x{result['size'][1]})" if result['downscaled'] else ""
+                logging.debug(f"Converted '{old_path.name}' -> '{new_path.name}'{resized}")
                 # Delete original file after successful conversion
                 try:
-                    old_path.unlink()
+                    staged_path.unlink()
                     logging.debug(f"Deleted original file: '{old_path.name}'")
                 except OSError as del_err:
                     logging.warning(f"Could not delete original file '{old_path.name}' after conversion: {del_err}")
+                renamed[old_path.name] = new_path.name
                 success_count += 1
+            else:
+                logging.error(f"Failed to process image {old_path.name}: {result['error']}")
+                fail_count += 1
+                # Attempt to clean up partially created new file if the save failed
+                if new_path.exists():
+                    try:
+                        new_path.unlink()
+                    except OSError:
+                        pass # Ignore cleanup error
 
-        except FileNotFoundError:
-             logging.error(f"File not found during processing: {old_path}")
-             fail_count += 1
-        except UnidentifiedImageError:
-             logging.error(f"Cannot identify image file (possibly corrupt or unsupported format): {old_path}")
-             fail_count += 1
-        except (IOError, OSError, Exception) as e:
-            logging.error(f"Failed to process image {old_path.name}: {e}", exc_info=True)
+    # Put back anything that could not be processed under its original name
+    for old_path, staged_path, _ in staged:
+        if staged_path.exists():
+            try:
+                staged_path.rename(old_path)
+            except OSError as e:
+                logging.error(f"Could not restore '{old_path.name}' (left as '{staged_path.name}'): {e}")
+
+    inline_lines = data.get('inline_lines') if data else None
+    if isinstance(inline_lines, dict) and any(key in renamed for key in inline_lines):
+        data['inline_lines'] = {renamed.get(key, key): line for key, line in inline_lines.items()}
+        try:
+            with pipeline_metrics.stage('json.dump', json_path):
+                catalog_codec.write_file(json_path, data)
+            logging.info(f"Updated inline_lines keys in {json_path} to follow renamed images.")
+        except IOError as e:
+            logging.error(f"Failed to update inline_lines in {json_path}: {e}", exc_info=True)
             fail_count += 1
-            # Attempt to clean up partially created new file if rename/save failed
-            if new_path.exists() and old_path != new_path:
+
+    logging.log(logging.WARNING if fail_count else logging.DEBUG,
+                f"Image processing summary for {show_dir_path.name}: "
+                f"Success={success_count}, Failed={fail_count}, Skipped/Already OK={skipped_count}")
+    return fail_count == 0
+
+
+def compute_catalog_hashes(target_shows, method):
+    """
+    Computes the `method` perceptual hash of every still in `target_shows`.
+    Hashes are cached in HASH_CACHE_FILE keyed by path, size and mtime, so only new
+    or modified images are decoded. Returns a dict of Path -> int hash.
+    """
+    cache = load_cache(HASH_CACHE_FILE)
+    hashes = {}
+    computed_count = 0
+
+    for show_dir in target_shows:
+        for image_path in list_still_images(show_dir):
+            stat = image_path.stat()
+            cache_key = f"{method}:{image_path.relative_to(TV_SHOWS_BASE_PATH).as_posix()}"
+            entry = cache.get(cache_key)
+            hit = bool(entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns)
+            pipeline_metrics.cache('image_hashes', hit)
+            if hit:
+                hashes[image_path] = int(entry['hash'], 16)
+                continue
+            try:
+                with pipeline_metrics.stage('image.hash', image_path) as timer:
+                    timer.bytes = stat.st_size
+                    hash_value = image_hashing.compute_hash(image_path, method)
+            except (UnidentifiedImageError, OSError) as e:
+                logging.warning(f"Cannot hash '{image_path}': {e}")
+                continue
+            cache[cache_key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': f"{hash_value:016x}"}
+            hashes[image_path] = hash_value
+            computed_count += 1
+
+    logging.info(f"Hashed {len(hashes)} images ({computed_count} computed, {len(hashes) - computed_count} from cache).")
+    if computed_count:
+        save_cache(HASH_CACHE_FILE, cache)
+    return hashes
+
+def _pixel_count(image_path):
+    try:
+        with Image.open(image_path) as img:
+            return img.width * img.height
+    except (UnidentifiedImageError, OSError):
+        return 0
+
+def find_similar_images(target_shows, method=image_hashing.DEFAULT_HASH,
+                        max_distance=image_hashing.DEFAULT_MAX_DISTANCE, prune=False):
+    """
+    Reports clusters of near-duplicate stills across the target shows.
+    With `prune`, keeps one image per show in each cluster (an image referenced by
+    inline_lines if any, otherwise the largest) and deletes the rest.
+    Returns the list of clusters (lists of Paths).
+    """
+    hashes = compute_catalog_hashes(target_shows, method)
+    clusters = image_hashing.find_clusters(hashes, max_distance)
+
+    if not clusters:
+        logging.info(f"No near-duplicate stills found ({method}, distance <= {max_distance}).")
+        return clusters
+
+    logging.info(f"Found {len(clusters)} clusters of near-duplicate stills ({method}, distance <= {max_distance}):")
+    removed_count = 0
+    for cluster_index, cluster in enumerate(clusters, start=1):
+        anchor = hashes[cluster[0]]
+        logging.info(f"Cluster {cluster_index}:")
+        for image_path in cluster:
+            distance = image_hashing.hamming_distance(anchor, hashes[image_path])
+            logging.info(f"  {image_path.parent.name}/{image_path.name} (distance {distance})")
+
+        if not prune:
+            continue
+
+        by_show = {}
+        for image_path in cluster:
+            by_show.setdefault(image_path.parent, []).append(image_path)
+        for show_dir, images in by_show.items():
+            if len(images) < 2:
+                continue
+            inline_keys = set(load_show_json(show_dir).get('inline_lines', {}))
+            images.sort(key=lambda p: (p.name in inline_keys, _pixel_count(p)), reverse=True)
+            keep, duplicates = images[0], images[1:]
+            for duplicate in duplicates:
+                if duplicate.name in inline_keys:
+                    logging.warning(f"  Keeping '{duplicate.name}', it is referenced by inline_lines.")
+                    continue
                 try:
-                    new_path.unlink()
-                except OSError:
-                    pass # Ignore cleanup error
+                    duplicate.unlink()
+                    removed_count += 1
+                    logging.info(f"  Deleted '{show_dir.name}/{duplicate.name}' (duplicate of '{keep.name}')")
+                except OSError as e:
+                    logging.error(f"  Could not delete '{duplicate}': {e}")
+
+    if prune:
+        logging.info(f"Pruned {removed_count} near-duplicate stills. Run 'rename-images' to renumber the remaining files.")
+    return clusters
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _reencode_image(image_path, stage, status, prepare, keep_metadata=True):
+    """
+    Re-encodes an image in place, shared by optimize_jpeg and shrink_image. `prepare(img,
+    save_kwargs)` returns the image to save (or None to leave the file alone) and fills in the
+    encoder options; save_kwargs start with the file's format and, with `keep_metadata`, its
+    EXIF (Orientation included, the pixels are never rotated) and ICC profile. The file is only
+    replaced if the result is smaller. Runs in a worker process, so it returns a plain dict.
+    """
+    image_path = Path(image_path)
+    result = {'path': str(image_path), 'before': image_path.stat().st_size, 'status': 'kept', 'error': None}
+    result['after'] = result['before']
+    tmp_path = image_path.with_name(image_path.name + '.reencoding')
+
+    try:
+        with pipeline_metrics.stage(stage, image_path) as timer, Image.open(image_path) as img:
+            timer.bytes = result['before']
+            save_kwargs = {'format': img.format}
+            if keep_metadata:
+                for key in ('exif', 'icc_profile'):
+                    if img.info.get(key):
+                        save_kwargs[key] = img.info[key]
+            img_to_save = prepare(img, save_kwargs)
+            if img_to_save is not None:
+                img_to_save.save(tmp_path, **save_kwargs)
+
+        if tmp_path.exists():
+            new_size = tmp_path.stat().st_size
+            if new_size < result['before']:
+                os.replace(tmp_path, image_path)
+                result['after'] = new_size
+                result['status'] = status
+            else:
+                tmp_path.unlink()
+        result['sha1'] = file_sha1(image_path)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+        if tmp_path.exists():
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+    result['metrics'] = pipeline_metrics.drain()
+    return result
+
+def optimize_jpeg(image_path, max_side=None, strip_metadata=False, quality=90):
+    """
+    Re-encodes a JPEG with optimized Huffman tables and progressive scans.
+    Without `max_side` the original quantization tables and subsampling are kept,
+    so the pixels are (near-)unchanged. The file is only replaced if the result is smaller.
+    """
+    def prepare(img, save_kwargs):
+        save_kwargs.update(format='JPEG', optimize=True, progressive=True)
+        if max_side and max(img.size) > max_side:
+            img.draft('RGB', (max_side, max_side))
+            img_to_save = img.convert('RGB') if img.mode not in ('RGB', 'L') else img
+            img_to_save.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            save_kwargs['quality'] = quality
+            return img_to_save
+        if img.format == 'JPEG':
+            save_kwargs.update(quality='keep', subsampling='keep')
+            return img
+        raise ValueError(f"not a JPEG file (format: {img.format})")
+
+    return _reencode_image(image_path, 'image.optimize', 'optimized', prepare, keep_metadata=not strip_metadata)
+
+def optimize_images(target_shows, workers=None, max_side=None, strip_metadata=False, quality=90):
+    """
+    Runs optimize_jpeg over every JPEG (covers included) of the target shows in parallel.
+    Files whose content hash matches the last optimization with the same options are skipped.
+    Logs the bytes saved per show and returns True if no file failed.
+    """
+    state = load_cache(OPTIMIZE_STATE_FILE)
+    options_key = f"max_side={max_side},strip={strip_metadata},quality={quality if max_side else 'keep'}"
+
+    jobs = []
+    skipped_count = 0
+    for show_dir in target_shows:
+        for item in sorted(show_dir.iterdir()):
+            if not item.is_file() or item.suffix.lower() not in JPEG_EXTENSIONS:
+                continue
+            rel_path = item.relative_to(TV_SHOWS_BASE_PATH).as_posix()
+            entry = state.get(rel_path)
+            hit = bool(entry and entry.get('options') == options_key and entry.get('sha1') == file_sha1(item))
+            pipeline_metrics.cache('optimized_images', hit)
+            if hit:
+                skipped_count += 1
+                continue
+            jobs.append(item)
+
+    logging.info(f"Optimizing {len(jobs)} JPEG files ({skipped_count} already optimized, skipped).")
+    per_show = {}
+    fail_count = 0
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+            futures = [executor.submit(optimize_jpeg, str(path), max_side, strip_metadata, quality) for path in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                pipeline_metrics.merge(result.pop('metrics', None))
+                image_path = Path(result['path'])
+                show_totals = per_show.setdefault(image_path.parent.name, {'files': 0, 'before': 0, 'after': 0})
+                if result['status'] == 'error':
+                    logging.error(f"Failed to optimize '{image_path.parent.name}/{image_path.name}': {result['error']}")
+                    fail_count += 1
+                    continue
+                show_totals['files'] += 1
+                show_totals['before'] += result['before']
+                show_totals['after'] += result['after']
+                state[image_path.relative_to(TV_SHOWS_BASE_PATH).as_posix()] = {'sha1': result['sha1'], 'options': options_key}
+                logging.debug(f"{result['status']}: '{image_path.name}' {result['before']} -> {result['after']} bytes")
+        save_cache(OPTIMIZE_STATE_FILE, state)
+
+    total_before = total_after = 0
+    logging.info("--- Optimization savings per show ---")
+    for show_name, totals in sorted(per_show.items(), key=lambda item: item[1]['before'] - item[1]['after'], reverse=True):
+        saved = totals['before'] - totals['after']
+        total_before += totals['before']
+        total_after += totals['after']
+        percent = saved * 100 / totals['before'] if totals['before'] else 0
+        logging.info(f"{show_name}: {totals['files']} files, {totals['before']} -> {totals['after']} bytes, saved {saved} ({percent:.1f}%)")
+    total_saved = total_before - total_after
+    total_percent = total_saved * 100 / total_before if total_before else 0
+    logging.info(f"Total: saved {total_saved} bytes ({total_percent:.1f}%), failed {fail_count}, skipped {skipped_count}.")
+    return fail_count == 0
+
+def parse_size(text):
+    """'25MB' / '1.5G' / '800k' / '1048576' -> bytes (binary units)."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*', text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{text}', expected a number with an optional K/M/G suffix like 20MB")
+    value, unit = match.groups()
+    return int(float(value) * 1024 ** ' kmg'.index(unit.lower() or ' '))
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+def packed_files(path):
+    """
+    (size, path) of the files below `path` that go into the archive: cards, crop variants and
+    theme song previews are skipped, see create_tvshows_archive.is_packed.
+    """
+    import create_tvshows_archive # imports this module, so not at the top
+    return [(entry.stat().st_size, entry) for entry in Path(path).rglob('*')
+            if entry.is_file() and create_tvshows_archive.is_packed(entry.relative_to(TV_SHOWS_BASE_PATH).as_posix())]
+
+def packed_size(path):
+    """Total size of packed_files(path), which is about what they add to the archive (stills barely compress)."""
+    return sum(size for size, _ in packed_files(path))
+
+def shrink_image(image_path, max_side, quality):
+    """
+    One budget step for an image: downscales it to `max_side` and re-encodes lossy formats
+    (JPEG, WebP, AVIF) at `quality`; lossless formats are only downscaled. EXIF and ICC
+    profile are kept. The file is only replaced if the result is smaller.
+    """
+    def prepare(img, save_kwargs):
+        pil_format = img.format
+        lossy = pil_format in BUDGET_LOSSY_FORMATS
+        downscale = max(img.size) > max_side
+        if not (downscale or lossy):
+            return None
+        if pil_format == 'JPEG':
+            img.draft('RGB', (max_side, max_side))
+            save_kwargs.update(quality=quality, optimize=True, progressive=True)
+        elif lossy:
+            save_kwargs['quality'] = quality
+        else:
+            save_kwargs['optimize'] = True
+        img_to_save = img
+        if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img_to_save = img.convert('RGB')
+        if downscale:
+            img_to_save = img_to_save.copy() if img_to_save is img else img_to_save
+            img_to_save.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        return img_to_save
+
+    return _reencode_image(image_path, 'image.shrink', 'shrunk', prepare)
+
+def _budget_images(show_dir):
+    """Images of a show that enforce_budget may shrink: the stills and the cover."""
+    images = list_still_images(show_dir)
+    cover = show_dir / 'cover.jpg'
+    if cover.is_file():
+        images.append(cover)
+    return images
+
+def report_budget(target_shows, show_limit, total_limit, top=10):
+    """
+    Logs the largest shows and files and how far they are over budget.
+    Returns (show sizes {name: bytes}, catalog size): the total covers every show, not only the targets.
+    Only files that go into the archive are counted (packed_files).
+    """
+    sizes = {show_dir.name: packed_size(show_dir) for show_dir in target_shows}
+    total = packed_size(TV_SHOWS_BASE_PATH)
+    over = {name: size for name, size in sizes.items() if size > show_limit}
+    logging.info(f"--- Size budget: {format_size(show_limit)} per show, {format_size(total_limit)} in total ---")
+    logging.info(f"Catalog: {format_size(total)} ({total * 100 / total_limit:.0f}% of the budget), "
+                 f"{len(over)} of {len(sizes)} shows over their budget.")
+    for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True)[:top]:
+        marker = f"  OVER by {format_size(size - show_limit)}" if name in over else ""
+        logging.info(f"  {format_size(size):>9}  {name}{marker}")
+    largest_files = sorted((item for show_dir in target_shows for item in packed_files(show_dir)),
+                           key=lambda item: item[0], reverse=True)[:top]
+    if largest_files:
+        logging.info("Largest files:")
+        for size, path in largest_files:
+            logging.info(f"  {format_size(size):>9}  {path.relative_to(TV_SHOWS_BASE_PATH).as_posix()}")
+    return sizes, total
+
+def enforce_budget(target_shows, show_limit, total_limit, workers=None):
+    """
+    Shrinks images of the target shows until every show fits `show_limit` and then the catalog
+    fits `total_limit`, going through BUDGET_STEPS (ever smaller max side and quality) one step
+    at a time: first only in the shows over their own budget, then, if the catalog is still too
+    large, in all target shows. Within a step the largest files go first and the queued files of
+    shows that fit by then are cancelled, so a show is degraded only as far as needed. The step
+    each file reached is remembered, so later runs never re-encode a file at the same step again.
+    Returns True if no file failed.
+    """
+    state = load_cache(BUDGET_STATE_FILE)
+    show_over = {show_dir.name: packed_size(show_dir) - show_limit for show_dir in target_shows}
+    total_over = packed_size(TV_SHOWS_BASE_PATH) - total_limit
+    saved_per_show = {}
+    fail_count = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+        for catalog_pass in (False, True):
+            def needed(show_name):
+                return total_over > 0 if catalog_pass else show_over[show_name] > 0
+
+            for step_index, (max_side, quality) in enumerate(BUDGET_STEPS):
+                jobs = []
+                for show_dir in target_shows:
+                    if not needed(show_dir.name):
+                        continue
+                    for image_path in _budget_images(show_dir):
+                        entry = state.get(image_path.relative_to(TV_SHOWS_BASE_PATH).as_posix())
+                        done = bool(entry and entry['step'] >= step_index and entry['sha1'] == file_sha1(image_path))
+                        pipeline_metrics.cache('budget_steps', done)
+                        if not done:
+                            jobs.append((image_path.stat().st_size, image_path))
+                if not jobs:
+                    continue
+                jobs.sort(key=lambda job: job[0], reverse=True)
+                if catalog_pass:
+                    logging.info(f"Budget step {step_index + 1}/{len(BUDGET_STEPS)} (max side {max_side}, quality {quality}): "
+                                 f"up to {len(jobs)} images, catalog over by {format_size(total_over)}.")
+                else:
+                    logging.info(f"Budget step {step_index + 1}/{len(BUDGET_STEPS)} (max side {max_side}, quality {quality}): "
+                                 f"up to {len(jobs)} images in {sum(over > 0 for over in show_over.values())} shows over budget.")
+
+                futures = {executor.submit(shrink_image, str(path), max_side, quality): path for _, path in jobs}
+                queued = {}
+                for future, path in futures.items():
+                    queued.setdefault(path.parent.name, []).append(future)
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    result = future.result()
+                    pipeline_metrics.merge(result.pop('metrics', None))
+                    image_path = futures[future]
+                    show_name = image_path.parent.name
+                    if result['status'] == 'error':
+                        logging.error(f"Failed to shrink '{show_name}/{image_path.name}': {result['error']}")
+                        fail_count += 1
+                        continue
+                    saved = result['before'] - result['after']
+                    show_over[show_name] -= saved
+                    total_over -= saved
+                    saved_per_show[show_name] = saved_per_show.get(show_name, 0) + saved
+                    state[image_path.relative_to(TV_SHOWS_BASE_PATH).as_posix()] = {'sha1': result['sha1'], 'step': step_index}
+                    logging.debug(f"{result['status']}: '{show_name}/{image_path.name}' {result['before']} -> {result['after']} bytes")
+                    # Drop the queued files of shows that fit now
+                    for name in [name for name in queued if not needed(name)]:
+                        for other in queued.pop(name):
+                            other.cancel()
+                if not any(needed(show_dir.name) for show_dir in target_shows):
+                    break
+    save_cache(BUDGET_STATE_FILE, state)
+
+    for show_name, saved in sorted(saved_per_show.items(), key=lambda item: item[1], reverse=True):
+        if saved > 0:
+            logging.info(f"{show_name}: saved {format_size(saved)}")
+    logging.info(f"Total: saved {format_size(sum(saved_per_show.values()))}, failed {fail_count}.")
+    for show_name, over in show_over.items():
+        if over > 0:
+            logging.warning(f"'{show_name}' is still {format_size(over)} over budget at the last step (audio and other files are not shrunk).")
+    if total_over > 0:
+        logging.warning(f"The catalog is still {format_size(total_over)} over budget.")
+    return fail_count == 0
+
+def available_output_formats():
+    """Output formats the installed Pillow can actually encode."""
+    return [name for name, info in OUTPUT_FORMATS.items() if features.check(info['pil_feature'])]
+
+def benchmark_output_formats(target_shows, sample_size=20, quality_overrides=None, output_path=None):
+    """
+    Encodes a sample of covers and stills in every available output format and reports
+    size and encode time side by side, per asset role. Nothing in the catalog is modified.
+    Returns the results as a dict (also written to `output_path` as JSON if given).
+    """
+    quality_overrides = quality_overrides or {}
+    formats = available_output_formats()
+    roles = {'cover': [], 'still': []}
+    for show_dir in target_shows:
+        cover_path = show_dir / 'cover.jpg'
+        if cover_path.is_file():
+            roles['cover'].append(cover_path)
+        roles['still'].extend(list_still_images(show_dir))
+
+    results = {'formats': {}, 'roles': {}}
+    for name in formats:
+        results['formats'][name] = {'quality': quality_overrides.get(name, OUTPUT_FORMATS[name]['quality'])}
+
+    for role, paths in roles.items():
+        paths = paths[:sample_size]
+        role_results = {name: {'images': 0, 'bytes': 0, 'encode_seconds': 0.0} for name in formats}
+        source_bytes = 0
+        for image_path in paths:
+            try:
+                with Image.open(image_path) as img:
+                    img.load()
+                    source_bytes += image_path.stat().st_size
+                    for name in formats:
+                        buffer = io.BytesIO()
+                        start = time.perf_counter()
+                        save_still_image(img, buffer, name, results['formats'][name]['quality'])
+                        elapsed = time.perf_counter() - start
+                        role_results[name]['images'] += 1
+                        role_results[name]['bytes'] += buffer.tell()
+                        role_results[name]['encode_seconds'] += elapsed
+            except (UnidentifiedImageError, OSError) as e:
+                logging.warning(f"Skipping '{image_path}' in benchmark: {e}")
+
+        results['roles'][role] = {'source_bytes': source_bytes, 'formats': role_results}
+        baseline = role_results.get('jpeg', {}).get('bytes') or 0
+        logging.info(f"--- {role}: {len(paths)} images sampled, {source_bytes} source bytes ---")
+        for name, totals in role_results.items():
+            if not totals['images']:
+                continue
+            relative = f"{totals['bytes'] * 100 / baseline:.1f}% of JPEG" if baseline else "n/a"
+            logging.info(f"{name:>5} q={results['formats'][name]['quality']:<3} "
+                         f"{totals['bytes']:>10} bytes ({relative}), "
+                         f"{totals['encode_seconds'] * 1000 / totals['images']:.1f} ms/image encode")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        logging.info(f"Benchmark results written to {output_path}")
+    return results
+
+def _image_metadata_job(image_path):
+    """Worker wrapper around image_placeholders.compute_image_metadata."""
+    try:
+        with pipeline_metrics.stage('image.placeholder', image_path):
+            metadata = image_placeholders.compute_image_metadata(image_path)
+        return image_path, metadata, None, pipeline_metrics.drain()
+    except Exception as e:
+        return image_path, None, f"{type(e).__name__}: {e}", pipeline_metrics.drain()
+
+def update_image_metadata(target_shows, workers=None, force=False):
+    """
+    Stores width, height, aspect ratio, dominant color and BlurHash of every cover and still
+    in the catalog index. Entries are keyed by file name and only recomputed when the file's
+    SHA-1 changed (or with `force`); entries of deleted files are dropped.
+    Returns True if every image could be processed.
+    """
+    index = load_catalog_index()
+    jobs = []
+    show_hashes = {}
+    changed = False
+
+    for show_dir in target_shows:
+        show_entry = index['shows'].setdefault(show_dir.name, {})
+        images = show_entry.setdefault('images', {})
+        files = list_still_images(show_dir)
+        cover_path = show_dir / 'cover.jpg'
+        if cover_path.is_file():
+            files.insert(0, cover_path)
+
+        current = {}
+        for image_path in files:
+            sha1 = file_sha1(image_path)
+            current[image_path.name] = sha1
+            entry = images.get(image_path.name)
+            stale = force or not entry or entry.get('sha1') != sha1 or 'blurhash' not in entry
+            pipeline_metrics.cache('image_metadata', not stale)
+            if stale:
+                jobs.append(image_path)
+        show_hashes[show_dir.name] = current
+
+        for stale_name in [name for name in images if name not in current]:
+            logging.debug(f"[{show_dir.name}] Dropping metadata of removed image '{stale_name}'")
+            del images[stale_name]
+            changed = True
+        # Keep the entries in the same order as the files on disk
+        ordered = {name: images[name] for name in current if name in images}
+        if list(ordered) != list(images):
+            changed = True
+        show_entry['images'] = ordered
+
+    for show_name in [name for name in index['shows'] if not (TV_SHOWS_BASE_PATH / name).is_dir()]:
+        logging.info(f"Dropping catalog entry of removed show '{show_name}'")
+        del index['shows'][show_name]
+        changed = True
+
+    logging.info(f"Computing image metadata for {len(jobs)} images "
+                 f"({sum(len(h) for h in show_hashes.values()) - len(jobs)} unchanged).")
+    fail_count = 0
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+            for image_path, metadata, error, metrics in executor.map(_image_metadata_job, jobs, chunksize=4):
+                pipeline_metrics.merge(metrics)
+                if error:
+                    logging.error(f"Failed to read '{image_path.parent.name}/{image_path.name}': {error}")
+                    fail_count += 1
+                    continue
+                show_name = image_path.parent.name
+                images = index['shows'][show_name]['images']
+                entry = images.get(image_path.name, {})
+                if entry.get('sha1') != show_hashes[show_name][image_path.name]:
+                    entry = {} # Anything derived from the old file content is stale
+                entry.update(metadata, sha1=show_hashes[show_name][image_path.name])
+                images[image_path.name] = entry
+                changed = True
+        # Re-apply file order for entries added above
+        for show_name, current in show_hashes.items():
+            images = index['shows'][show_name]['images']
+            index['shows'][show_name]['images'] = {name: images[name] for name in current if name in images}
+
+    if changed:
+        save_catalog_index(index)
+    else:
+        logging.info("Catalog index already up to date.")
+    return fail_count == 0
+
+def _image_crops_job(job):
+    """Worker wrapper around image_crops.compute_crops."""
+    image_path, ratios, variant_paths = job
+    try:
+        with pipeline_metrics.stage('image.crops', image_path):
+            result = image_crops.compute_crops(image_path, ratios, variant_paths)
+        return image_path, result, None, pipeline_metrics.drain()
+    except Exception as e:
+        return image_path, None, f"{type(e).__name__}: {e}", pipeline_metrics.drain()
+
+def crop_variant_dir(show_dir, ratio):
+    """<show>/crops/9x16 for ratio '9:16'."""
+    return show_dir / CROPS_DIR_NAME / ratio.replace(':', 'x')
+
+def update_image_crops(target_shows, ratios=image_crops.DEFAULT_RATIOS, write=False, workers=None, force=False):
+    """
+    Stores a focus point and a salient crop box per target aspect ratio for every still in the
+    catalog index ('focus': [x, y] fractions, 'crops': {ratio: [left, top, width, height]}).
+    Stills are only analysed again when their SHA-1 changed, a ratio is missing or (with
+    `write`) a cropped variant under <show>/crops/<W>x<H>/ is missing, or with `force`.
+    With `write`, variant folders of ratios not in `ratios` are removed.
+    Returns True if every still could be processed.
+    """
+    index = load_catalog_index()
+    jobs = []
+    hashes = {}
+    changed = False
+
+    for show_dir in target_shows:
+        images = index['shows'].setdefault(show_dir.name, {}).setdefault('images', {})
+        stills = list_still_images(show_dir)
+        for image_path in stills:
+            sha1 = file_sha1(image_path)
+            hashes[image_path] = sha1
+            entry = images.get(image_path.name, {})
+            variant_paths = {ratio: crop_variant_dir(show_dir, ratio) / f"{image_path.stem}.jpg" for ratio in ratios} if write else {}
+            crops = entry.get('crops', {})
+            stale = (force or entry.get('sha1') != sha1 or any(ratio not in crops for ratio in ratios)
+                     or any(not path.is_file() for path in variant_paths.values()))
+            pipeline_metrics.cache('image_crops', not stale)
+            if stale:
+                jobs.append((image_path, ratios, variant_paths))
+            elif set(crops) != set(ratios):
+                entry['crops'] = {ratio: crops[ratio] for ratio in ratios}
+                changed = True
+
+        for stale_name in [name for name in images if not (show_dir / name).is_file()]:
+            logging.debug(f"[{show_dir.name}] Dropping metadata of removed image '{stale_name}'")
+            del images[stale_name]
+            changed = True
+        # Cropped variants of stills that no longer exist, and (when writing) of ratios no longer asked for
+        stems = {image_path.stem for image_path in stills}
+        crops_dir = show_dir / CROPS_DIR_NAME
+        if crops_dir.is_dir():
+            if write:
+                wanted = {crop_variant_dir(show_dir, ratio) for ratio in ratios}
+                for ratio_dir in crops_dir.iterdir():
+                    if ratio_dir.is_dir() and ratio_dir not in wanted:
+                        logging.info(f"[{show_dir.name}] Removing crops of a ratio no longer requested: {ratio_dir.relative_to(show_dir)}")
+                        shutil.rmtree(ratio_dir)
+            for variant_path in crops_dir.glob('*/*'):
+                if variant_path.stem not in stems:
+                    logging.info(f"[{show_dir.name}] Removing crop of removed still: {variant_path.relative_to(show_dir)}")
+                    variant_path.unlink()
+
+    logging.info(f"Computing crops ({', '.join(ratios)}) for {len(jobs)} stills ({len(hashes) - len(jobs)} unchanged).")
+    fail_count = 0
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+            for image_path, result, error, metrics in executor.map(_image_crops_job, jobs, chunksize=4):
+                pipeline_metrics.merge(metrics)
+                if error:
+                    logging.error(f"Failed to crop '{image_path.parent.name}/{image_path.name}': {error}")
+                    fail_count += 1
+                    continue
+                images = index['shows'][image_path.parent.name]['images']
+                entry = images.get(image_path.name, {})
+                if entry.get('sha1') != hashes[image_path]:
+                    entry = {} # Anything derived from the old file content is stale
+                entry.update(result, sha1=hashes[image_path])
+                images[image_path.name] = entry
+                changed = True
+
+    if changed:
+        save_catalog_index(index)
+    else:
+        logging.info("Catalog index already up to date.")
+    return fail_count == 0
+
+def _theme_song_job(job):
+    """
+    Worker: scans a theme song (after trimming it in place with `replace`, unless `trimmed` says
+    it already is) and cuts its preview clip.
+    """
+    song_path, preview_seconds, preview_start, replace, trimmed = job
+    try:
+        with pipeline_metrics.stage('audio.scan', song_path) as timer:
+            timer.bytes = song_path.stat().st_size
+            metadata = mp3_frames.analyze(song_path)
+        if preview_seconds and replace:
+            # Trimming an already trimmed song again would move the clip later on every run
+            if not trimmed and (metadata['duration'] > preview_seconds or preview_start):
+                with pipeline_metrics.stage('audio.trim', song_path):
+                    mp3_frames.cut_clip(song_path, song_path, preview_seconds, preview_start)
+                    metadata = mp3_frames.analyze(song_path)
+        elif preview_seconds:
+            with pipeline_metrics.stage('audio.preview', song_path):
+                duration, size = mp3_frames.cut_clip(song_path, song_path.with_name(PREVIEW_SONG_NAME), preview_seconds, preview_start)
+            metadata['preview'] = {'file': PREVIEW_SONG_NAME, 'start': preview_start, 'seconds': preview_seconds,
+                                   'duration': duration, 'size': size}
+        metadata.update(size=song_path.stat().st_size, sha1=file_sha1(song_path))
+        return song_path, metadata, None, pipeline_metrics.drain()
+    except Exception as e:
+        return song_path, None, f"{type(e).__name__}: {e}", pipeline_metrics.drain()
+
+def update_theme_songs(target_shows, preview_seconds=None, preview_start=0.0, replace=False, workers=None, force=False):
+    """
+    Stores duration, bitrate and a seek table of every themesong.mp3 in the catalog index
+    ('themesong' of the show), re-scanning only files whose SHA-1 changed (or with `force`).
+    With `preview_seconds`, also cuts a frame-aligned clip to themesong.preview.mp3, or with
+    `replace` trims themesong.mp3 itself. Logs a report of the audio sizes.
+    Returns True if every theme song could be processed.
+    """
+    index = load_catalog_index()
+    jobs = []
+    song_count = 0
+    changed = False
+    for show_dir in target_shows:
+        show_entry = index['shows'].setdefault(show_dir.name, {})
+        song_path = show_dir / THEME_SONG_NAME
+        song_count += song_path.is_file()
+        if not song_path.is_file():
+            if show_entry.pop('themesong', None) is not None:
+                changed = True
+            continue
+        entry = show_entry.get('themesong', {})
+        preview = entry.get('preview')
+        unchanged = entry.get('sha1') == file_sha1(song_path)
+        stale = force or not unchanged
+        # The stored scan is of this very file and it is no longer than the clip: cut already
+        trimmed = bool(replace and preview_seconds and unchanged and entry.get('duration', float('inf')) <= preview_seconds + 0.1)
+        if preview_seconds and not replace:
+            stale = stale or not preview or [preview['start'], preview['seconds']] != [preview_start, preview_seconds] \
+                or not (show_dir / PREVIEW_SONG_NAME).is_file()
+        elif preview_seconds:
+            stale = stale or entry['duration'] > preview_seconds + 0.1
+        pipeline_metrics.cache('theme_song', not stale)
+        if stale:
+            jobs.append((song_path, preview_seconds, preview_start, replace, trimmed))
+
+    logging.info(f"Scanning {len(jobs)} theme songs ({song_count - len(jobs)} unchanged).")
+    fail_count = 0
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+            for song_path, metadata, error, metrics in executor.map(_theme_song_job, jobs):
+                pipeline_metrics.merge(metrics)
+                if error:
+                    logging.error(f"Failed to process '{song_path.parent.name}/{song_path.name}': {error}")
+                    fail_count += 1
+                    continue
+                show_entry = index['shows'][song_path.parent.name]
+                old_preview = show_entry.get('themesong', {}).get('preview')
+                if 'preview' not in metadata and old_preview:
+                    # A preview of an older version of the song
+                    (song_path.parent / PREVIEW_SONG_NAME).unlink(missing_ok=True)
+                show_entry['themesong'] = metadata
+                changed = True
+
+    songs = [(name, show['themesong']) for name, show in index['shows'].items() if 'themesong' in show]
+    if songs:
+        total_size = sum(song['size'] for _, song in songs)
+        total_duration = sum(song['duration'] for _, song in songs)
+        catalog_size = sum(entry.stat().st_size for entry in TV_SHOWS_BASE_PATH.rglob('*') if entry.is_file())
+        logging.info(f"Theme songs: {len(songs)} files, {total_size / 1024 / 1024:.1f} MB "
+                     f"({total_size / catalog_size:.0%} of assets/tv_shows), {total_duration / 60:.1f} min, "
+                     f"average {total_size * 8 / total_duration / 1000:.0f} kbit/s.")
+        for name, song in sorted(songs, key=lambda item: item[1]['size'], reverse=True)[:5]:
+            logging.info(f"  {song['size'] / 1024 / 1024:6.2f} MB  {song['duration']:6.1f} s  {song['bitrate']:>3} kbit/s{' VBR' if song['vbr'] else ''}  {name}")
+        previews = [song['preview'] for _, song in songs if 'preview' in song]
+        if previews:
+            preview_size = sum(preview['size'] for preview in previews)
+            logging.info(f"Previews: {len(previews)} files, {preview_size / 1024 / 1024:.1f} MB; shipping them instead of the "
+                         f"full songs would save {(total_size - preview_size) / 1024 / 1024:.1f} MB.")
+
+    if changed:
+        save_catalog_index(index)
+    else:
+        logging.info("Catalog index already up to date.")
+    return fail_count == 0
+
+def _quote_card_job(job):
+    """Worker wrapper around quote_cards.render_card (fonts stay cached in the worker between jobs)."""
+    image_path, quote, card_path, font_path, width, state_key, render_key = job
+    try:
+        with pipeline_metrics.stage('image.card', image_path):
+            quote_cards.render_card(image_path, quote, card_path, font_path, width)
+        return state_key, render_key, None, pipeline_metrics.drain()
+    except Exception as e:
+        return state_key, render_key, f"{type(e).__name__}: {e}", pipeline_metrics.drain()
+
+def render_quote_cards(target_shows, font_path=None, width=quote_cards.DEFAULT_CARD_WIDTH, workers=None, force=False):
+    """
+    Renders every inline_lines quote onto its still as <show>/cards/<still name>.jpg. A card is
+    only rendered again when the still's SHA-1, the quote or the render options changed (or with
+    `force`); cards of removed stills or quotes are deleted. Returns True if every card could be
+    rendered.
+    """
+    font_path = quote_cards.find_font(font_path)
+    if not font_path or not os.path.isfile(font_path):
+        logging.error(f"No usable font found (tried {font_path or ', '.join(quote_cards.FONT_CANDIDATES)}); pass --font with a CJK TrueType/OpenType font.")
+        return False
+
+    state = load_cache(CARDS_STATE_FILE)
+    jobs = []
+    card_count = 0
+    for show_dir in target_shows:
+        inline_lines = load_show_json(show_dir).get('inline_lines') or {}
+        cards_dir = show_dir / quote_cards.CARDS_DIR_NAME
+        expected = set()
+        for still_name, quote in inline_lines.items():
+            still_path = show_dir / still_name
+            if not isinstance(quote, str) or not quote.strip():
+                continue
+            if not still_path.is_file():
+                logging.warning(f"[{show_dir.name}] inline_lines refers to missing still '{still_name}', no card rendered.")
+                continue
+            card_path = cards_dir / f"{still_path.stem}.jpg"
+            expected.add(card_path.name)
+            card_count += 1
+            state_key = f"{show_dir.name}/{card_path.name}"
+            render_key = hashlib.sha1(f"{quote_cards.CARD_RENDER_VERSION}\0{width}\0{font_path}\0{quote}\0{file_sha1(still_path)}".encode('utf-8')).hexdigest()
+            fresh = not force and state.get(state_key) == render_key and card_path.is_file()
+            pipeline_metrics.cache('quote_card', fresh)
+            if not fresh:
+                jobs.append((still_path, quote, card_path, font_path, width, state_key, render_key))
 
-    logging.info(f"Image processing summary for {show_dir_path.name}: "
-                 f"Success={success_count}, Failed={fail_count}, Skipped/Already OK={skipped_count}")
+        if cards_dir.is_dir():
+            for card_path in cards_dir.iterdir():
+                if card_path.name not in expected:
+                    logging.info(f"[{show_dir.name}] Removing card without a quote: {card_path.name}")
+                    card_path.unlink()
+                    state.pop(f"{show_dir.name}/{card_path.name}", None)
+            if not any(cards_dir.iterdir()):
+                cards_dir.rmdir()
+
+    logging.info(f"Rendering {len(jobs)} quote cards ({card_count - len(jobs)} unchanged) with font {font_path}.")
+    fail_count = 0
+    if jobs:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, **pipeline_logging.pool_options()) as executor:
+            for state_key, render_key, error, metrics in executor.map(_quote_card_job, jobs, chunksize=4):
+                pipeline_metrics.merge(metrics)
+                if error:
+                    logging.error(f"Failed to render card '{state_key}': {error}")
+                    state.pop(state_key, None)
+                    fail_count += 1
+                else:
+                    state[state_key] = render_key
+        save_cache(CARDS_STATE_FILE, state)
     return fail_count == 0
 
 
 # --- Main Execution ---
 
-def main():
-    parser = argparse.ArgumentParser(description="Manage TV show data (JSON fields and images).")
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Manage TV show data (JSON fields and images).")
+
+    def add_run_arguments(parser, sub_command=False):
+        pipeline_logging.add_logging_arguments(parser, sub_command)
+        parser.add_argument('--metrics-top', type=int, default=argparse.SUPPRESS if sub_command else 0, metavar='N', help=f'Also print the N slowest timed items (per-stage metrics are always written to .cache/metrics/{os.path.basename(METRICS_FILE)}).')
+        pipeline_profiling.add_profile_argument(parser, sub_command)
+
+    add_run_arguments(parser)
     subparsers = parser.add_subparsers(dest='command', required=True, help='Sub-command help')
 
     # --- JSON Sub-command ---
@@ -278,17 +1435,128 @@ def main():
 
     # --- Rename Images Sub-command ---
     parser_rename = subparsers.add_parser('rename-images', help='Rename and convert images in show folders.')
+    parser_rename.add_argument('--format', dest='output_format', choices=STILL_FORMATS, default='jpeg', help='Output format for stills (default: %(default)s). cover.jpg is left untouched.')
+    parser_rename.add_argument('--quality', type=int, help='Encoder quality (default per format: ' + ', '.join(f"{name}={OUTPUT_FORMATS[name]['quality']}" for name in STILL_FORMATS) + ').')
+    parser_rename.add_argument('--max-pixels', type=int, default=DEFAULT_MAX_PIXELS, help='Downscale converted images larger than this many pixels, 0 to disable (default: %(default)s).')
+    parser_rename.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET_MB, help='Memory (MB) that concurrent conversions may use in total; limits parallelism for large images (default: %(default)s).')
+    parser_rename.add_argument('--workers', type=int, help='Maximum number of conversion worker processes (default: CPU count).')
     parser_rename.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
     parser_rename.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
 
-    args = parser.parse_args()
+    # --- Similar Images Sub-command ---
+    parser_similar = subparsers.add_parser('similar', help='Find (and optionally prune) near-duplicate stills using perceptual hashes.')
+    parser_similar.add_argument('--hash', choices=sorted(image_hashing.HASH_FUNCTIONS), default=image_hashing.DEFAULT_HASH, help='Perceptual hash to compare (default: %(default)s).')
+    parser_similar.add_argument('--threshold', type=int, default=image_hashing.DEFAULT_MAX_DISTANCE, help='Maximum Hamming distance (out of 64 bits) for two stills to count as near-duplicates (default: %(default)s).')
+    parser_similar.add_argument('--prune', action='store_true', help='Delete duplicates within each show, keeping one image per cluster.')
+    parser_similar.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_similar.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Optimize Sub-command ---
+    parser_optimize = subparsers.add_parser('optimize', help='Losslessly re-encode JPEG files (optimized Huffman tables, progressive) and report bytes saved.')
+    parser_optimize.add_argument('--max-side', type=int, help='Downscale images whose longest side exceeds this many pixels (re-encodes with --quality).')
+    parser_optimize.add_argument('--quality', type=int, default=90, help='JPEG quality used when --max-side downscales an image (default: %(default)s).')
+    parser_optimize.add_argument('--strip-metadata', action='store_true', help='Drop EXIF and ICC profile data.')
+    parser_optimize.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_optimize.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_optimize.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Budget Sub-command ---
+    parser_budget = subparsers.add_parser('budget', help='Report shows over the per-show / catalog size budget and optionally shrink their images to fit.')
+    parser_budget.add_argument('--show-limit', default=DEFAULT_SHOW_BUDGET, help='Size budget per show folder, e.g. 20MB (default: %(default)s).')
+    parser_budget.add_argument('--total-limit', default=DEFAULT_TOTAL_BUDGET, help='Size budget of the whole catalog, e.g. 500MB (default: %(default)s).')
+    parser_budget.add_argument('--enforce', action='store_true', help='Progressively downscale and recompress images (largest first) until the budgets are met.')
+    parser_budget.add_argument('--check', action='store_true', help='Exit with status 1 if a budget is exceeded (for CI); combined with --enforce, checked afterwards.')
+    parser_budget.add_argument('--top', type=int, default=10, help='Number of largest shows and files to list (default: %(default)s).')
+    parser_budget.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_budget.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_budget.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Benchmark Formats Sub-command ---
+    parser_bench_formats = subparsers.add_parser('benchmark-formats', help='Compare size and encode time of the output formats on a sample of the catalog.')
+    parser_bench_formats.add_argument('--sample', type=int, default=20, help='Number of covers and of stills to sample (default: %(default)s).')
+    parser_bench_formats.add_argument('--quality', action='append', default=[], metavar='FORMAT=Q', help='Override the quality of a format, e.g. --quality webp=75 (repeatable).')
+    parser_bench_formats.add_argument('--output', help='Write the results as JSON to this file.')
+    parser_bench_formats.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_bench_formats.add_argument('show_names', nargs='*', help='Specific show names (folder names) to sample. If empty, sample all.')
+
+    # --- Placeholders Sub-command ---
+    parser_placeholders = subparsers.add_parser('placeholders', help='Store image dimensions, dominant color and BlurHash placeholders in the catalog index.')
+    parser_placeholders.add_argument('--force', action='store_true', help='Recompute every image, not only new or changed ones.')
+    parser_placeholders.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_placeholders.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_placeholders.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Crops Sub-command ---
+    parser_crops = subparsers.add_parser('crops', help='Store salient crop boxes for phone aspect ratios in the catalog index.')
+    parser_crops.add_argument('--ratio', action='append', dest='ratios', metavar='W:H', help='Target aspect ratio, repeatable (default: ' + ', '.join(image_crops.DEFAULT_RATIOS) + ').')
+    parser_crops.add_argument('--write', action='store_true', help='Also save the cropped stills to <show>/crops/<W>x<H>/ (folders of other ratios are removed).')
+    parser_crops.add_argument('--force', action='store_true', help='Recompute every still, not only new or changed ones.')
+    parser_crops.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_crops.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_crops.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Theme Songs Sub-command ---
+    parser_audio = subparsers.add_parser('themesongs', help='Store duration, bitrate and a seek table of every themesong.mp3 in the catalog index and report audio sizes.')
+    parser_audio.add_argument('--preview', type=float, metavar='SECONDS', help='Also cut a frame-aligned clip of this many seconds to themesong.preview.mp3 (no re-encoding).')
+    parser_audio.add_argument('--preview-start', type=float, default=0.0, metavar='SECONDS', help='Where the clip starts (default: %(default)s).')
+    parser_audio.add_argument('--replace', action='store_true', help='Trim themesong.mp3 itself to the clip instead of writing a separate preview.')
+    parser_audio.add_argument('--force', action='store_true', help='Re-scan every theme song, not only new or changed ones.')
+    parser_audio.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_audio.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_audio.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    # --- Render Cards Sub-command ---
+    parser_cards = subparsers.add_parser('render-cards', help='Pre-render inline_lines quotes onto their stills as <show>/cards/*.jpg.')
+    parser_cards.add_argument('--font', help='TrueType/OpenType font with CJK glyphs (default: first installed of ' + ', '.join(quote_cards.FONT_CANDIDATES) + ').')
+    parser_cards.add_argument('--width', type=int, default=quote_cards.DEFAULT_CARD_WIDTH, help='Maximum card width in pixels; larger stills are downscaled (default: %(default)s).')
+    parser_cards.add_argument('--force', action='store_true', help='Render every card, not only new or changed ones.')
+    parser_cards.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count).')
+    parser_cards.add_argument('--exclude', action='store_true', help='Process all shows EXCEPT the ones specified.')
+    parser_cards.add_argument('show_names', nargs='*', help='Specific show names (folder names) to process. If empty, process all.')
+
+    pipeline_logging.add_to_sub_commands(subparsers, add_run_arguments)
+    args = parser.parse_args(argv)
+    pipeline_logging.setup_logging(LOG_FILE, args.log_level, args.quiet)
 
     logging.info(f"Script started with command: {args.command}")
 
     # Validate arguments
     if args.command == 'json' and args.action == 'add' and args.value is None:
         parser.error("--value is required when action is 'add'")
+    if args.command == 'rename-images' and args.output_format not in available_output_formats():
+        parser.error(f"The installed Pillow cannot encode {args.output_format.upper()}")
+    quality_overrides = {}
+    if args.command == 'benchmark-formats':
+        for item in args.quality:
+            name, _, value = item.partition('=')
+            if name not in OUTPUT_FORMATS or not value.isdigit():
+                parser.error(f"Invalid --quality '{item}', expected FORMAT=NUMBER with FORMAT in {sorted(OUTPUT_FORMATS)}")
+            quality_overrides[name] = int(value)
+    if args.command == 'budget':
+        try:
+            args.show_limit = parse_size(args.show_limit)
+            args.total_limit = parse_size(args.total_limit)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.command == 'themesongs':
+        if args.replace and not args.preview:
+            parser.error("--replace requires --preview")
+        if (args.preview is not None and args.preview <= 0) or args.preview_start < 0:
+            parser.error("--preview must be positive and --preview-start not negative")
+    if args.command == 'crops':
+        args.ratios = args.ratios or image_crops.DEFAULT_RATIOS
+        for ratio in args.ratios:
+            try:
+                image_crops.parse_ratio(ratio)
+            except ValueError as e:
+                parser.error(str(e))
+    if args.command == 'similar' and not 0 <= args.threshold < image_hashing.HASH_BITS:
+        parser.error(f"--threshold must be between 0 and {image_hashing.HASH_BITS - 1}")
 
+    pipeline_profiling.run(args.profile, LOG_FILE, run_command, args, quality_overrides)
+
+def run_command(args, quality_overrides):
+    """Runs the parsed sub-command (separate from main() so it can be profiled as a whole)."""
     # Determine target shows
     target_shows = get_target_shows(TV_SHOWS_BASE_PATH, args.show_names, args.exclude)
 
@@ -304,11 +1572,15 @@ def main():
     # Execute command
     if args.command == 'json':
         logging.info(f"Executing JSON command: action='{args.action}', key='{args.key}'" + (f", value='{args.value}'" if args.action == 'add' else ""))
+        progress = pipeline_logging.ProgressLogger("Shows", len(target_shows))
         for show_dir in target_shows:
             if modify_json_field(show_dir, args.action, args.key, args.value):
                 processed_count += 1
+                progress.update()
             else:
                 overall_success = False
+                progress.update(failed=1)
+        progress.finish()
         logging.info(f"JSON modification attempted on {len(target_shows)} directories.")
 
     elif args.command == 'rename-images':
@@ -319,17 +1591,97 @@ def main():
 
         if confirm == 'y':
             logging.info("User confirmed image processing.")
-            for show_dir in target_shows:
-                 if rename_and_convert_images(show_dir):
-                     processed_count += 1
-                 else:
-                     overall_success = False # Mark overall as failed if any show had image errors
+            progress = pipeline_logging.ProgressLogger("Shows", len(target_shows))
+            with BoundedImageConverter(args.workers, args.memory_budget, args.max_pixels) as converter:
+                for show_dir in target_shows:
+                     if rename_and_convert_images(show_dir, args.output_format, args.quality, converter):
+                         processed_count += 1
+                         progress.update()
+                     else:
+                         overall_success = False # Mark overall as failed if any show had image errors
+                         progress.update(failed=1)
+            progress.finish()
             logging.info(f"Image renaming/conversion attempted on {len(target_shows)} directories.")
+            logging.info(f"Conversion memory: {converter.summary()}")
         else:
             logging.info("User cancelled image processing.")
             print("Operation cancelled.")
             sys.exit(0)
 
+    elif args.command == 'similar':
+        logging.info(f"Executing Similar command: hash='{args.hash}', threshold={args.threshold}, prune={args.prune}")
+        if args.prune:
+            print("\nWARNING: This operation will delete near-duplicate stills.")
+            confirm = input("Do you want to continue? (y/n): ").lower()
+            if confirm != 'y':
+                logging.info("User cancelled pruning.")
+                print("Operation cancelled.")
+                sys.exit(0)
+        find_similar_images(target_shows, args.hash, args.threshold, args.prune)
+        processed_count = len(target_shows)
+
+    elif args.command == 'benchmark-formats':
+        logging.info("Executing Benchmark Formats command...")
+        benchmark_output_formats(target_shows, args.sample, quality_overrides, args.output)
+        processed_count = len(target_shows)
+
+    elif args.command == 'placeholders':
+        logging.info("Executing Placeholders command...")
+        overall_success = update_image_metadata(target_shows, args.workers, args.force)
+        processed_count = len(target_shows)
+
+    elif args.command == 'crops':
+        logging.info("Executing Crops command...")
+        overall_success = update_image_crops(target_shows, args.ratios, args.write, args.workers, args.force)
+        processed_count = len(target_shows)
+
+    elif args.command == 'themesongs':
+        logging.info("Executing Theme Songs command...")
+        if args.replace:
+            print(f"\nWARNING: This operation will cut every themesong.mp3 down to {args.preview:g} seconds in place.")
+            confirm = input("Do you want to continue? (y/n): ").lower()
+            if confirm != 'y':
+                logging.info("User cancelled trimming.")
+                print("Operation cancelled.")
+                sys.exit(0)
+        overall_success = update_theme_songs(target_shows, args.preview, args.preview_start, args.replace, args.workers, args.force)
+        processed_count = len(target_shows)
+
+    elif args.command == 'render-cards':
+        logging.info("Executing Render Cards command...")
+        overall_success = render_quote_cards(target_shows, args.font, args.width, args.workers, args.force)
+        processed_count = len(target_shows)
+
+    elif args.command == 'budget':
+        logging.info("Executing Budget command...")
+        overall_success = True
+        sizes, total = report_budget(target_shows, args.show_limit, args.total_limit, args.top)
+        over_budget = total > args.total_limit or any(size > args.show_limit for size in sizes.values())
+        if args.enforce and over_budget:
+            print("\nWARNING: This operation will downscale and recompress images in place until they fit the budget.")
+            confirm = input("Do you want to continue? (y/n): ").lower()
+            if confirm != 'y':
+                logging.info("User cancelled budget enforcement.")
+                print("Operation cancelled.")
+                sys.exit(0)
+            overall_success = enforce_budget(target_shows, args.show_limit, args.total_limit, args.workers)
+            sizes, total = report_budget(target_shows, args.show_limit, args.total_limit, args.top)
+            over_budget = total > args.total_limit or any(size > args.show_limit for size in sizes.values())
+        if args.check and over_budget:
+            overall_success = False
+        processed_count = len(target_shows)
+
+    elif args.command == 'optimize':
+        logging.info("Executing Optimize command...")
+        print("\nWARNING: This operation will re-encode JPEG files in place (only when the result is smaller).")
+        confirm = input("Do you want to continue? (y/n): ").lower()
+        if confirm != 'y':
+            logging.info("User cancelled optimization.")
+            print("Operation cancelled.")
+            sys.exit(0)
+        overall_success = optimize_images(target_shows, args.workers, args.max_side, args.strip_metadata, args.quality)
+        processed_count = len(target_shows)
+
 
     logging.info("\n--- Script Summary ---")
     logging.info(f"Command executed: {args.command}")
@@ -337,7 +1689,13 @@ def main():
     logging.info(f"Directories processed successfully (may include skips): {processed_count}")
     logging.info(f"Overall success status: {'Success' if overall_success else 'Failed (check logs)'}")
     logging.info(f"Detailed logs available in: {LOG_FILE}")
+    pipeline_metrics.write_report(METRICS_FILE, max(args.metrics_top, 10))
+    logging.info(f"Per-stage metrics written to: {METRICS_FILE}")
+    if args.metrics_top:
+        print(pipeline_metrics.format_slowest(args.metrics_top))
     logging.info("Script finished.")
+    if args.command == 'budget' and args.check and not overall_success:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+Pure-Python MPEG audio (MP3) frame scanner for the theme songs: duration, bitrate and a seek
+table from the frame headers alone, and frame-aligned clips cut without decoding.
+
+An MP3 file is a sequence of self-delimiting frames (optionally wrapped in ID3v2 / ID3v1 /
+APE tags). Each 4-byte header gives the frame's bitrate, sample rate and padding, which fix
+its length in bytes and its duration (samples per frame / sample rate), so walking the headers
+yields exact durations for CBR and VBR files alike. A Xing/Info/VBRI frame at the start
+carries no audio and is not counted.
+
+Layer III frames may borrow bytes from earlier frames (the bit reservoir), so the first frame
+of a clip that does not start at 0 s can decode as a few milliseconds of silence.
+"""
+import os
+import struct
+
+# Bitrates (kbit/s) by (MPEG-1?, layer) and bitrate index; index 0 = free format, 15 = invalid
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5) and index
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+# Seek table resolution: one byte offset per this many seconds
+SEEK_INTERVAL_SECONDS = 2
+# Bytes searched for the next frame when the stream is out of sync before giving up
+_MAX_RESYNC_BYTES = 64 * 1024
+
+
+class FrameHeader:
+    __slots__ = ('mpeg1', 'layer', 'bitrate', 'sample_rate', 'channels', 'length', 'samples')
+
+    def __init__(self, mpeg1, layer, bitrate, sample_rate, channels, length, samples):
+        self.mpeg1, self.layer, self.bitrate, self.sample_rate = mpeg1, layer, bitrate, sample_rate
+        self.channels, self.length, self.samples = channels, length, samples
+
+
+def parse_header(data, offset):
+    """Returns the FrameHeader at `offset` or None if there is no valid (non free-format) header."""
+    if offset + 4 > len(data):
+        return None
+    value = struct.unpack_from('>I', data, offset)[0]
+    if value >> 21 != 0x7FF:
+        return None
+    version = (value >> 19) & 3
+    layer = 4 - ((value >> 17) & 3)
+    bitrate_index = (value >> 12) & 15
+    rate_index = (value >> 10) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (value >> 9) & 1
+    channels = 1 if (value >> 6) & 3 == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or mpeg1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return FrameHeader(mpeg1, layer, bitrate, sample_rate, channels, length, samples)
+
+
+def _id3v2_size(data):
+    """Size of the ID3v2 tag at the start of `data` (0 if there is none)."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _audio_end(data):
+    """End of the audio data, before an ID3v1 and/or APEv2 tag at the end of the file."""
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    if end >= 32 and data[end - 32:end - 24] == b'APETAGEX':
+        tag_size = struct.unpack_from('<I', data, end - 20)[0]
+        flags = struct.unpack_from('<I', data, end - 12)[0]
+        end -= tag_size + (32 if flags & 0x80000000 else 0)
+    return max(end, 0)
+
+
+def _is_info_frame(data, offset, header):
+    """True for a Xing/Info (LAME) or VBRI header frame, which holds metadata instead of audio."""
+    if header.layer != 3:
+        return False
+    if header.mpeg1:
+        side_info = 17 if header.channels == 1 else 32
+    else:
+        side_info = 9 if header.channels == 1 else 17
+    tag = data[offset + 4 + side_info:offset + 8 + side_info]
+    return tag in (b'Xing', b'Info') or data[offset + 36:offset + 40] == b'VBRI'
+
+
+def _find_sync(data, offset, end):
+    """Next offset before `end` where two consecutive valid headers follow each other, or None."""
+    limit = min(end, offset + _MAX_RESYNC_BYTES)
+    while True:
+        offset = data.find(b'\xff', offset, limit)
+        if offset < 0:
+            return None
+        header = parse_header(data, offset)
+        if header and (offset + header.length >= end or parse_header(data, offset + header.length)):
+            return offset
+        offset += 1
+
+
+def scan_frames(data):
+    """
+    Returns (frames, info) for the MP3 bytes `data`: frames is a list of (offset, length,
+    samples, sample rate, bitrate) of every audio frame, info describes the stream.
+    """
+    start = _id3v2_size(data)
+    end = _audio_end(data)
+    frames = []
+    skipped = 0
+    info_frame = None
+    offset = start
+    while offset < end:
+        header = parse_header(data, offset)
+        if header is None or offset + header.length > end:
+            sync = _find_sync(data, offset + 1, end)
+            if sync is None:
+                skipped += end - offset
+                break
+            skipped += sync - offset
+            offset = sync
+            continue
+        if not frames and info_frame is None and _is_info_frame(data, offset, header):
+            info_frame = (offset, header.length)
+        else:
+            frames.append((offset, header.length, header.samples, header.sample_rate, header.bitrate))
+        offset += header.length
+    return frames, {
+        'audio_start': start,
+        'audio_end': end,
+        'info_frame': info_frame,
+        'skipped_bytes': skipped,
+    }
+
+
+def analyze(path, seek_interval=SEEK_INTERVAL_SECONDS):
+    """
+    Returns {'duration', 'bitrate', 'vbr', 'sample_rate', 'channels', 'layer', 'frames',
+    'audio_bytes', 'skipped_bytes', 'seek_interval', 'seek'} for an MP3 file. 'seek' lists the
+    byte offset of the frame playing at 0, seek_interval, 2 * seek_interval, ... seconds;
+    'bitrate' is the average in kbit/s; 'skipped_bytes' were not part of any frame.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    frames, info = scan_frames(data)
+    if not frames:
+        raise ValueError(f"No MPEG audio frames found in {path}")
+    first = parse_header(data, frames[0][0])
+
+    seek = []
+    elapsed = 0.0
+    for offset, _, samples, sample_rate, _ in frames:
+        if elapsed >= len(seek) * seek_interval:
+            seek.append(offset)
+        elapsed += samples / sample_rate
+    audio_bytes = sum(length for _, length, _, _, _ in frames)
+    return {
+        'duration': round(elapsed, 3),
+        'bitrate': round(audio_bytes * 8 / elapsed / 1000) if elapsed else 0,
+        'vbr': len({bitrate for _, _, _, _, bitrate in frames}) > 1,
+        'sample_rate': first.sample_rate,
+        'channels': first.channels,
+        'layer': first.layer,
+        'frames': len(frames),
+        'audio_bytes': audio_bytes,
+        'skipped_bytes': info['skipped_bytes'],
+        'seek_interval': seek_interval,
+        'seek': seek,
+    }
+
+
+def cut_clip(source_path, target_path, seconds, start_seconds=0.0):
+    """
+    Copies the whole frames playing from `start_seconds` for `seconds` seconds (plus an ID3v2
+    tag at the start of the source) to `target_path`, without decoding. The Xing/Info header
+    is left out since its frame count and TOC would describe the full song.
+    Returns (clip duration in seconds, clip size in bytes). Raises ValueError, without touching
+    `target_path`, if `start_seconds` is not within the song or no frame would be copied.
+    """
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    frames, info = scan_frames(data)
+    if not frames:
+        raise ValueError(f"No MPEG audio frames found in {source_path}")
+    song_duration = sum(samples / sample_rate for _, _, samples, sample_rate, _ in frames)
+    if not 0 <= start_seconds < song_duration:
+        raise ValueError(f"Clip start {start_seconds}s is outside the song ({song_duration:.3f}s): {source_path}")
+
+    chunks = [data[:info['audio_start']]]
+    elapsed = clip_duration = 0.0
+    for offset, length, samples, sample_rate, _ in frames:
+        duration = samples / sample_rate
+        if elapsed + duration > start_seconds:
+            if clip_duration >= seconds:
+                break
+            chunks.append(data[offset:offset + length])
+            clip_duration += duration
+        elapsed += duration
+    if clip_duration == 0:
+        raise ValueError(f"No frames to copy for a {seconds}s clip from {start_seconds}s: {source_path}")
+
+    temp_path = f"{target_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    size = sum(len(chunk) for chunk in chunks)
+    os.replace(temp_path, target_path)
+    return round(clip_duration, 3), size
@@ -0,0 +1,208 @@
+"""
+Logging setup shared by the pipeline scripts.
+
+Records are handed to a background thread (QueueHandler/QueueListener), so the file and
+console writes never block the work itself. Secrets (the TMDB API key, `api_key=` query
+parameters) are redacted before a record is queued, tracebacks included, and ProgressLogger
+replaces per-item chatter with periodic aggregate lines.
+
+Worker processes would otherwise log into their own copy of the in-process queue, which
+nothing drains: pools are created with `**pipeline_logging.pool_options()`, whose initializer
+sends the worker's records through a multiprocessing queue to the same handlers.
+"""
+import argparse
+import atexit
+import logging
+import queue
+import re
+import sys
+import time
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+# Seconds between two aggregate progress lines
+PROGRESS_INTERVAL = 5.0
+
+_REDACTED = '***'
+_SECRET_PATTERNS = [
+    re.compile(r"(api_key=)[^&\s'\"]+"),
+    re.compile(r"""(['"]api_key['"]\s*:\s*['"])[^'"]*"""),
+]
+_secrets = set()
+_listener = None
+# Worker processes' records: (multiprocessing queue, its listener), created by the first pool
+_worker_queue = None
+_worker_listener = None
+
+
+def register_secret(value):
+    """Makes sure `value` never appears in a log line."""
+    if value and len(value) >= 4:
+        _secrets.add(value)
+
+
+def redact(text):
+    for secret in _secrets:
+        text = text.replace(secret, _REDACTED)
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(rf"\g<1>{_REDACTED}", text)
+    return text
+
+
+def _set_levels(root, level):
+    root.setLevel(level)
+    # Third-party HTTP chatter (one line per connection) is only useful when debugging
+    logging.getLogger('urllib3').setLevel(max(level, logging.WARNING))
+    logging.getLogger('PIL').setLevel(max(level, logging.INFO))
+
+
+def _redacting_queue_handler(log_queue):
+    """A QueueHandler that redacts the fully formatted message, tracebacks included."""
+    class RedactingQueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            record = super().prepare(record)
+            record.msg = redact(record.msg)
+            return record
+
+    return RedactingQueueHandler(log_queue)
+
+
+def add_logging_arguments(parser, sub_command=False):
+    """
+    --log-level / --quiet. On a sub-command's parser (`sub_command`) they default to SUPPRESS,
+    so leaving them out there keeps the values given before the sub-command name.
+    """
+    suppress = {'default': argparse.SUPPRESS} if sub_command else {}
+    parser.add_argument('--log-level', choices=LOG_LEVELS, **(suppress or {'default': 'INFO'}), help='Minimum level written to the log file (default: INFO).')
+    parser.add_argument('--quiet', action='store_true', **suppress, help='Only print warnings and errors to the console (the log file keeps --log-level).')
+
+
+def add_to_sub_commands(subparsers, *add_functions):
+    """
+    Calls `add(sub_parser, sub_command=True)` for every add function on every sub-command's parser,
+    so run options like --log-level / --profile are also accepted after the sub-command name
+    (`shuangju json` puts 'json' before the user's arguments). Call it after the last add_parser().
+    """
+    for sub_parser in subparsers.choices.values():
+        for add in add_functions:
+            add(sub_parser, sub_command=True)
+
+
+def setup_logging(log_file=None, level='INFO', quiet=False):
+    """
+    Routes the root logger through a queue to a file handler (if `log_file`) and stdout.
+    Safe to call again, e.g. from a second entry point; the previous listener is stopped.
+    """
+    global _listener
+    # logging.handlers pulls in socket, pickle etc.; only load it once logging is set up
+    import logging.handlers
+    stop_logging()
+
+    level = getattr(logging, level) if isinstance(level, str) else level
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(level)
+        handlers.append(file_handler)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(max(level, logging.WARNING) if quiet else level)
+    handlers.append(console_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _redacting_queue_handler(log_queue)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    _set_levels(root, level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _init_worker(log_queue, level, secrets):
+    """Pool initializer: the worker's records go to the parent's handlers through `log_queue`."""
+    import logging.handlers
+    _secrets.update(secrets)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_redacting_queue_handler(log_queue))
+    _set_levels(root, level)
+
+
+def pool_options():
+    """
+    Keyword arguments for a ProcessPoolExecutor (default start method, like every pool here)
+    whose workers should log like the parent. Empty unless setup_logging() ran, so library
+    callers keep their own logging setup.
+    """
+    global _worker_queue, _worker_listener
+    if _listener is None:
+        return {}
+    if _worker_queue is None:
+        import logging.handlers
+        import multiprocessing
+        _worker_queue = multiprocessing.Queue()
+        _worker_listener = logging.handlers.QueueListener(_worker_queue, *_listener.handlers, respect_handler_level=True)
+        _worker_listener.start()
+    return {'initializer': _init_worker, 'initargs': (_worker_queue, logging.getLogger().level, frozenset(_secrets))}
+
+
+def stop_logging():
+    """Flushes the queues and closes the handlers (also registered to run at exit)."""
+    global _listener, _worker_queue, _worker_listener
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_queue.close()
+        _worker_queue = _worker_listener = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+class ProgressLogger:
+    """
+    Logs "label: done/total (percent), rate, ETA" at most every `interval` seconds,
+    plus named counters (e.g. failed=2), instead of one line per item.
+    """
+
+    def __init__(self, label, total=None, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.counters = {}
+        self.started = self._last_logged = time.monotonic()
+
+    def update(self, count=1, **counters):
+        self.done += count
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        now = time.monotonic()
+        if now - self._last_logged >= self.interval:
+            self._last_logged = now
+            logging.info(self._line(now))
+
+    def finish(self):
+        logging.info(self._line(time.monotonic(), final=True))
+
+    def _line(self, now, final=False):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0
+        progress = f"{self.done}/{self.total} ({self.done * 100 / self.total:.1f}%)" if self.total else f"{self.done}"
+        parts = [f"{self.label}: {progress}", f"{rate:.1f}/s"]
+        if final:
+            parts.append(f"done in {elapsed:.1f}s")
+        elif self.total and rate > 0:
+            parts.append(f"ETA {(self.total - self.done) / rate:.0f}s")
+        parts.extend(f"{name}={value}" for name, value in sorted(self.counters.items()))
+        return ", ".join(parts)
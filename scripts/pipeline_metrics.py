@@ -0,0 +1,199 @@
+"""
+Per-stage timing and counters shared by the pipeline scripts.
+
+Wrap a unit of work in `stage(name, item)` and, at the end of the run, `write_report(path)`
+dumps per-stage totals, latency histograms, bytes moved, cache hit rates and the slowest
+items as JSON. Worker processes record into their own copy of `METRICS`; the worker returns
+`drain()` with its result and the parent process `merge()`s it.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Slowest items kept per stage for the top-N table
+SLOWEST_PER_STAGE = 20
+# Reports go to the project's (git-ignored) .cache, whatever the current directory
+METRICS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'metrics')
+
+
+def _empty_stage():
+    return {'count': 0, 'seconds': 0.0, 'min': None, 'max': 0.0, 'bytes': 0, 'errors': 0,
+            'buckets': [0] * (len(BUCKET_BOUNDS_MS) + 1), 'slowest': []}
+
+
+def _bucket_index(seconds):
+    ms = seconds * 1000
+    for index, bound in enumerate(BUCKET_BOUNDS_MS):
+        if ms <= bound:
+            return index
+    return len(BUCKET_BOUNDS_MS)
+
+
+class StageTimer:
+    """Handed out by Metrics.stage() so the caller can attach the bytes it moved."""
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.caches = {}
+
+    @contextmanager
+    def stage(self, name, item=None):
+        timer = StageTimer()
+        start = time.perf_counter()
+        error = False
+        try:
+            yield timer
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, item, timer.bytes, error)
+
+    def record(self, name, seconds, item=None, nbytes=0, error=False):
+        with self._lock:
+            stage = self.stages.setdefault(name, _empty_stage())
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            stage['min'] = seconds if stage['min'] is None else min(stage['min'], seconds)
+            stage['max'] = max(stage['max'], seconds)
+            stage['bytes'] += nbytes
+            stage['errors'] += int(error)
+            stage['buckets'][_bucket_index(seconds)] += 1
+            if item is not None:
+                entry = (seconds, str(item))
+                if len(stage['slowest']) < SLOWEST_PER_STAGE:
+                    heapq.heappush(stage['slowest'], entry)
+                elif entry > stage['slowest'][0]:
+                    heapq.heapreplace(stage['slowest'], entry)
+
+    def _reset_after_fork(self):
+        # A forked worker starts with a copy of the parent's data, which the parent already has
+        self._lock = threading.Lock()
+        self.stages, self.counters, self.caches = {}, {}, {}
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def cache(self, name, hit):
+        """Records one lookup in cache `name`."""
+        with self._lock:
+            hits_misses = self.caches.setdefault(name, [0, 0])
+            hits_misses[0 if hit else 1] += 1
+
+    def drain(self):
+        """Returns the recorded data as a plain (picklable) dict and starts over."""
+        with self._lock:
+            snapshot = {'stages': self.stages, 'counters': self.counters, 'caches': self.caches}
+            self.stages, self.counters, self.caches = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Adds a drain() snapshot, typically from a worker process."""
+        if not snapshot:
+            return
+        with self._lock:
+            for name, other in snapshot['stages'].items():
+                stage = self.stages.setdefault(name, _empty_stage())
+                for key in ('count', 'seconds', 'bytes', 'errors'):
+                    stage[key] += other[key]
+                if other['min'] is not None:
+                    stage['min'] = other['min'] if stage['min'] is None else min(stage['min'], other['min'])
+                stage['max'] = max(stage['max'], other['max'])
+                stage['buckets'] = [a + b for a, b in zip(stage['buckets'], other['buckets'])]
+                stage['slowest'] = heapq.nlargest(SLOWEST_PER_STAGE, stage['slowest'] + other['slowest'])
+                heapq.heapify(stage['slowest'])
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, (hits, misses) in snapshot['caches'].items():
+                hits_misses = self.caches.setdefault(name, [0, 0])
+                hits_misses[0] += hits
+                hits_misses[1] += misses
+
+    def slowest(self, top=10):
+        """The `top` slowest recorded items over all stages as [(stage, item, seconds)]."""
+        with self._lock:
+            entries = [(seconds, name, item) for name, stage in self.stages.items()
+                       for seconds, item in stage['slowest']]
+        return [(name, item, seconds) for seconds, name, item in heapq.nlargest(top, entries)]
+
+    def report(self, top=10):
+        labels = [f"<={bound}ms" for bound in BUCKET_BOUNDS_MS] + [f">{BUCKET_BOUNDS_MS[-1]}ms"]
+        with self._lock:
+            stages = {
+                name: {
+                    'count': stage['count'],
+                    'total_seconds': round(stage['seconds'], 4),
+                    'mean_ms': round(stage['seconds'] / stage['count'] * 1000, 3) if stage['count'] else 0,
+                    'min_ms': round((stage['min'] or 0) * 1000, 3),
+                    'max_ms': round(stage['max'] * 1000, 3),
+                    'bytes': stage['bytes'],
+                    'errors': stage['errors'],
+                    'histogram': {label: n for label, n in zip(labels, stage['buckets']) if n},
+                }
+                for name, stage in sorted(self.stages.items())
+            }
+            caches = {
+                name: {'hits': hits, 'misses': misses,
+                       'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+                for name, (hits, misses) in sorted(self.caches.items())
+            }
+            counters = dict(sorted(self.counters.items()))
+        return {
+            'wall_seconds': round(time.perf_counter() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+            'caches': caches,
+            'slowest': [{'stage': name, 'item': item, 'ms': round(seconds * 1000, 3)}
+                        for name, item, seconds in self.slowest(top)],
+        }
+
+    def format_slowest(self, top=10):
+        rows = self.slowest(top)
+        if not rows:
+            return "No timed items recorded."
+        lines = [f"{'ms':>10}  {'stage':<20}  item"]
+        for name, item, seconds in rows:
+            lines.append(f"{seconds * 1000:>10.1f}  {name:<20}  {item}")
+        return "\n".join(lines)
+
+    def write(self, path, top=10):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(top), f, ensure_ascii=False, indent=4)
+
+
+# Process-wide instance used by the scripts
+METRICS = Metrics()
+stage = METRICS.stage
+record = METRICS.record
+count = METRICS.count
+cache = METRICS.cache
+drain = METRICS.drain
+merge = METRICS.merge
+format_slowest = METRICS.format_slowest
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=METRICS._reset_after_fork)
+
+
+def write_report(path, top=10):
+    METRICS.write(path, top)
+
+
+def metrics_path_for(log_file):
+    """'manage_tv_shows.log' (or 'manage_tv_shows') -> '<project>/.cache/metrics/manage_tv_shows.metrics.json'."""
+    base, _ = os.path.splitext(os.path.basename(log_file))
+    return os.path.join(METRICS_DIR, f"{base}.metrics.json")
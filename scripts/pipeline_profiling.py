@@ -0,0 +1,140 @@
+"""
+Opt-in profiling for the pipeline scripts (`--profile cpu|mem`).
+
+`run(mode, log_file, function, *args)` calls `function` under cProfile (cpu) or tracemalloc
+(mem) and writes the results next to `log_file`:
+
+    cpu: <log>.cpu.prof (load with pstats/snakeviz) and <log>.cpu.txt (top functions)
+    mem: <log>.mem.txt (peak memory and top allocation sites)
+
+Worker processes started through multiprocessing / concurrent.futures (fork or spawn)
+profile themselves as well and write <log>.<mode>.worker-<pid>.* when they exit.
+"""
+import argparse
+import io
+import logging
+import os
+
+PROFILE_MODES = ('cpu', 'mem')
+# Tells worker processes to profile ("<mode>:<pid of the profiled process>:<output base>"),
+# inherited with both fork and spawn
+PROFILE_ENV_VAR = 'SHUANGJU_PROFILE'
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+TRACEMALLOC_FRAMES = 10
+
+
+class _State:
+    mode = None
+    output_base = None
+    profiler = None
+
+
+_state = _State()
+
+
+def add_profile_argument(parser, sub_command=False):
+    """--profile; on a sub-command's parser it defaults to SUPPRESS (see pipeline_logging.add_logging_arguments)"""
+    parser.add_argument('--profile', choices=PROFILE_MODES, **({'default': argparse.SUPPRESS} if sub_command else {}),
+                        help='Profile the run: cpu (cProfile) or mem (tracemalloc); results are written next to the log file.')
+
+
+def output_base_for(log_file, mode):
+    """'manage_tv_shows.log' -> 'manage_tv_shows.cpu'"""
+    base, _ = os.path.splitext(log_file)
+    return f"{base}.{mode}"
+
+
+def _start(mode):
+    # Profilers are imported on demand, an unprofiled run never loads them
+    import cProfile
+    import tracemalloc
+    if mode == 'cpu':
+        _state.profiler = cProfile.Profile()
+        _state.profiler.enable()
+    else:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+
+def _stop_and_write(output_base):
+    """Stops profiling and writes the result files, returning their paths."""
+    import pstats
+    import tracemalloc
+    if _state.mode == 'cpu':
+        profiler, _state.profiler = _state.profiler, None
+        profiler.disable()
+        profiler.dump_stats(f"{output_base}.prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        with open(f"{output_base}.txt", 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+        return [f"{output_base}.prof", f"{output_base}.txt"]
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    with open(f"{output_base}.txt", 'w', encoding='utf-8') as f:
+        f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB, still allocated at exit: {current / 1024 / 1024:.1f} MiB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocation sites (by line):\n")
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+        f.write(f"\nTop {TOP_ALLOCATIONS // 3} allocation tracebacks:\n")
+        for stat in snapshot.statistics('traceback')[:TOP_ALLOCATIONS // 3]:
+            f.write(f"\n{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+            f.write("\n".join(stat.traceback.format()) + "\n")
+    return [f"{output_base}.txt"]
+
+
+def run(mode, log_file, function, *args, **kwargs):
+    """Calls function(*args, **kwargs), profiled if `mode` is 'cpu' or 'mem'."""
+    if not mode:
+        return function(*args, **kwargs)
+
+    import multiprocessing.util
+    # Forked workers inherit this registration (spawned ones check the environment on import)
+    multiprocessing.util.register_after_fork(_state, _start_worker_profiling)
+    output_base = output_base_for(log_file, mode)
+    _state.mode, _state.output_base = mode, output_base
+    os.environ[PROFILE_ENV_VAR] = f"{mode}:{os.getpid()}:{output_base}"
+    _start(mode)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        paths = _stop_and_write(output_base)
+        del os.environ[PROFILE_ENV_VAR]
+        _state.mode = None
+        logging.info(f"{mode.upper()} profile written to: {', '.join(paths)}")
+
+
+def _write_worker_profile():
+    _stop_and_write(f"{_state.output_base}.worker-{os.getpid()}")
+
+
+def _start_worker_profiling(_=None):
+    """Runs in every new multiprocessing child (after fork, or on import when spawned)."""
+    setting = os.environ.get(PROFILE_ENV_VAR)
+    if not setting:
+        return
+    mode, profiled_pid, output_base = setting.split(':', 2)
+    if profiled_pid == str(os.getpid()):
+        return
+    import multiprocessing.util
+    import tracemalloc
+    # A forked child inherits the parent's running profiler; start over with a clean one
+    if _state.profiler is not None:
+        _state.profiler.disable()
+        _state.profiler = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state.mode, _state.output_base = mode, output_base
+    _start(mode)
+    # multiprocessing runs finalizers with an exit priority when the worker process exits
+    multiprocessing.util.Finalize(None, _write_worker_profile, exitpriority=100)
+
+
+# Spawned (and forkserver) workers don't run after-fork hooks but import this module afresh
+_start_worker_profiling()
@@ -0,0 +1,141 @@
+"""
+Pre-rendered quote cards: a still with its inline_lines quote drawn on a band at the bottom,
+like the gallery composites it at runtime, so the app can show the card as a plain image.
+
+Fonts and per-character advances are cached per process, so a worker that renders many cards
+opens the font file and measures each glyph only once.
+"""
+import functools
+import os
+from lazy_modules import lazy_import
+
+Image = lazy_import('PIL.Image')
+ImageDraw = lazy_import('PIL.ImageDraw')
+ImageFont = lazy_import('PIL.ImageFont')
+ImageStat = lazy_import('PIL.ImageStat')
+
+# Cards are written to <show>/cards/<still name>.jpg
+CARDS_DIR_NAME = 'cards'
+# Bump when the layout changes, so every card is rendered again
+CARD_RENDER_VERSION = 1
+DEFAULT_CARD_WIDTH = 1080
+DEFAULT_QUALITY = 85
+# Tried in order when no font is given; the first one that exists is used
+FONT_CANDIDATES = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/System/Library/Fonts/STHeiti Medium.ttc',
+    'C:/Windows/Fonts/msyh.ttc',
+]
+MAX_LINES = 3
+# Font size relative to the card width, line height relative to the font size
+FONT_SIZE_RATIO = 1 / 22
+LINE_SPACING = 1.4
+# Mean luma (0-1) of the band area above which the text is dark on a light band
+LIGHT_BACKGROUND_LUMA = 0.55
+LIGHT_TEXT = ((255, 255, 255), (0, 0, 0, 153))  # text color, band color (same as the app)
+DARK_TEXT = ((20, 20, 20), (255, 255, 255, 140))
+ELLIPSIS = '…'
+
+
+def find_font(path=None):
+    """Returns `path` if given, otherwise the first installed font of FONT_CANDIDATES (or None)."""
+    if path:
+        return path
+    return next((candidate for candidate in FONT_CANDIDATES if os.path.isfile(candidate)), None)
+
+
+@functools.lru_cache(maxsize=16)
+def load_font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=65536)
+def _advance(path, size, char):
+    return load_font(path, size).getlength(char)
+
+
+def _line_width(path, size, line):
+    return sum(_advance(path, size, char) for char in line)
+
+
+def wrap_text(text, font_path, size, max_width, max_lines=MAX_LINES):
+    """
+    Breaks `text` into lines of at most `max_width` pixels: at any CJK character, inside
+    Latin words only at the last space (or anywhere if a word is longer than the line). If it
+    needs more than `max_lines`, the last line ends with an ellipsis.
+    """
+    lines = []
+    current, width = '', 0
+    for char in ' '.join(text.split()):
+        advance = _advance(font_path, size, char)
+        if current and width + advance > max_width:
+            space = current.rfind(' ')
+            if char == ' ' or not char.isascii() or space <= 0:
+                lines.append(current.rstrip())
+                current = ''
+            else:
+                lines.append(current[:space])
+                current = current[space + 1:]
+            width = _line_width(font_path, size, current)
+            if char == ' ' and not current:
+                continue
+        current += char
+        width += advance
+    if current:
+        lines.append(current)
+    if len(lines) > max_lines:
+        last = lines[max_lines - 1]
+        ellipsis_width = _advance(font_path, size, ELLIPSIS)
+        while last and _line_width(font_path, size, last) + ellipsis_width > max_width:
+            last = last[:-1]
+        lines = lines[:max_lines - 1] + [last + ELLIPSIS]
+    return lines
+
+
+def band_luma(img, top):
+    """Mean luma (0-1) of `img` from row `top` to the bottom, measured on a small thumbnail."""
+    band = img.crop((0, top, img.width, img.height)).convert('L')
+    band.thumbnail((64, 64))
+    return ImageStat.Stat(band).mean[0] / 255
+
+
+def render_card(image_path, quote, output_path, font_path, width=DEFAULT_CARD_WIDTH, quality=DEFAULT_QUALITY):
+    """
+    Renders `quote` onto the still at `image_path` (downscaled to at most `width` pixels wide)
+    and saves it as JPEG at `output_path`. Returns {'width', 'height', 'text': 'light' | 'dark'}.
+    """
+    with Image.open(image_path) as img:
+        if img.format == 'JPEG':
+            # Let the JPEG decoder do most of the downscaling
+            img.draft('RGB', (width, width))
+        img = img.convert('RGB')
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+
+    size = max(12, round(img.width * FONT_SIZE_RATIO))
+    padding = size // 2
+    line_height = round(size * LINE_SPACING)
+    lines = wrap_text(quote, font_path, size, img.width - 2 * padding)
+    band_top = max(0, img.height - len(lines) * line_height - 2 * padding)
+    light_background = band_luma(img, band_top) > LIGHT_BACKGROUND_LUMA
+    text_color, band_color = DARK_TEXT if light_background else LIGHT_TEXT
+
+    card = img.convert('RGBA')
+    overlay = Image.new('RGBA', card.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    draw.rectangle((0, band_top, card.width, card.height), fill=band_color)
+    font = load_font(font_path, size)
+    for index, line in enumerate(lines):
+        x = (card.width - _line_width(font_path, size, line)) / 2
+        draw.text((x, band_top + padding + index * line_height), line, font=font, fill=text_color + (255,))
+    card = Image.alpha_composite(card, overlay).convert('RGB')
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.tmp"
+    card.save(temp_path, 'JPEG', quality=quality, optimize=True)
+    os.replace(temp_path, output_path)
+    return {'width': card.width, 'height': card.height, 'text': 'dark' if light_background else 'light'}
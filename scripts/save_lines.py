@@ -1,5 +1,17 @@
+import argparse
+import logging
 import os
 import json
+import catalog_codec
+import pipeline_logging
+import pipeline_metrics
+import pipeline_profiling
+import text_similarity
+
+# 各阶段耗时统计
+METRICS_FILE = pipeline_metrics.metrics_path_for('save_lines')
+# --profile 的输出文件名前缀 (save_lines.cpu.prof 等)
+PROFILE_NAME = 'save_lines'
 
 tv_quotes = {
     "爱的厘米": [
@@ -464,30 +476,149 @@ tv_quotes = {
     ]
 }
 
-def save_quotes_to_json(tv_show_name, quotes):
+def merge_quotes(existing, quotes):
+    """
+    在 existing 之后追加 quotes 中尚未出现的台词，保持原有顺序；
+    只有标点或空白不同的台词视为同一条 (保留先出现的)
+    """
+    merged = []
+    seen = set()
+    for quote in [*existing, *quotes]:
+        key = text_similarity.normalize_quote(quote) or quote
+        if key not in seen:
+            seen.add(key)
+            merged.append(quote)
+    return merged
+
+def dedupe_lines(quotes, threshold=text_similarity.DEFAULT_THRESHOLD):
+    """去掉同一剧集台词中的近似重复：每个簇只保留第一次出现的那条，其余顺序不变"""
+    clusters = text_similarity.find_clusters(dict(enumerate(quotes)), threshold)
+    dropped = {index for keys, _ in clusters for index in keys[1:]}
+    return [quote for index, quote in enumerate(quotes) if index not in dropped]
+
+def expected_lines(quotes, dedupe=None):
+    """写入 init.json 的 lines (dedupe 为相似度阈值时合并近似重复)；build 据此判断 lines 是否过期"""
+    return dedupe_lines(quotes, dedupe) if dedupe else quotes
+
+def add_dedupe_argument(parser):
+    """写入时合并近似重复台词的参数 (save_lines.py、build 和 watch 共用)"""
+    parser.add_argument('--dedupe-lines', type=float, nargs='?', const=text_similarity.DEFAULT_THRESHOLD, metavar='THRESHOLD',
+                        help=f'写入 lines 时合并同一剧集内的近似重复台词 (阈值默认 {text_similarity.DEFAULT_THRESHOLD})')
+
+def check_dedupe_argument(parser, args):
+    if args.dedupe_lines is not None and not 0 < args.dedupe_lines <= 1:
+        parser.error("--dedupe-lines 的阈值必须在 (0, 1] 之间")
+
+def save_quotes_to_json(tv_show_name, quotes, append=False, dedupe=None):
+    """
+    将台词写入 init.json 的 lines (append 为 True 时追加到已有台词之后，否则整体替换；
+    dedupe 为相似度阈值时再合并近似重复的台词)。
+    只有文件内容 (按统一的 indent=4 格式) 实际变化时才写入，返回是否写入了文件。
+    """
     # 创建目录
     dir_path = f"assets/tv_shows/{tv_show_name}"
     os.makedirs(dir_path, exist_ok=True)
-    
+
     # 构建数据
     file_path = f"{dir_path}/init.json"
     data = {"lines": quotes}
-    print("saving " + tv_show_name + " quotes")
-    
+    old_content = None
+
     # 如果文件已存在，读取原有数据
     if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            existing_data = json.load(f)
-            # 更新原有的 lines 为新的 quotes
-            existing_data["lines"] = quotes
-            data = existing_data
-    
-    # 写入JSON文件
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(file_path, "rb") as f:
+            old_content = f.read()
+        data = json.loads(old_content)
+        data["lines"] = merge_quotes(data.get("lines", []), quotes) if append else quotes
+    if dedupe:
+        with pipeline_metrics.stage('dedupe.lines', tv_show_name):
+            data["lines"] = dedupe_lines(data["lines"], dedupe)
+
+    # 与其他脚本相同的格式；内容未变化时不写入 (不改变 mtime，也就不会触发重新打包)
+    content = catalog_codec.dumps(data)
+    if content == old_content:
+        return False
+    print("saving " + tv_show_name + " quotes")
+    with pipeline_metrics.stage('json.dump', file_path), open(file_path, "wb") as f:
+        f.write(content)
+    return True
+
+def save_all_quotes(append=False, dedupe=None):
+    # 处理所有电视剧
+    written = 0
+    for tv_show, quotes in tv_quotes.items():
+        if save_quotes_to_json(tv_show, quotes, append, dedupe):
+            written += 1
+
+    print(f"所有电视剧台词已保存完毕！（写入 {written} 个文件，{len(tv_quotes) - written} 个无变化）")
+    pipeline_metrics.write_report(METRICS_FILE)
+
+def find_duplicate_quotes(threshold=text_similarity.DEFAULT_THRESHOLD):
+    """
+    在所有剧集 (同一剧集内和跨剧集) 的台词中查找近似重复 (忽略标点和空白)。
+    返回 [(簇内台词 [(剧名, 序号)], {((剧名, 序号), (剧名, 序号)): 相似度})]
+    """
+    texts = {(tv_show, index): quote for tv_show, quotes in tv_quotes.items() for index, quote in enumerate(quotes)}
+    with pipeline_metrics.stage('dedupe.cluster', f"{len(texts)} quotes"):
+        return text_similarity.find_clusters(texts, threshold)
+
+def dedupe_quotes(threshold=text_similarity.DEFAULT_THRESHOLD, merge=False, report_path=None):
+    clusters = find_duplicate_quotes(threshold)
+    # 同一剧集内每个簇只保留第一次出现的台词；跨剧集的重复只报告 (归属哪部剧需要人工判断)
+    dropped = set()
+    report = []
+    for cluster_index, (keys, pairs) in enumerate(clusters, start=1):
+        shows = sorted({tv_show for tv_show, _ in keys})
+        scope = "跨剧集" if len(shows) > 1 else "同一剧集"
+        print(f"簇 {cluster_index}（{scope}，相似度 ≥ {min(pairs.values()):.2f}）:")
+        for tv_show, index in keys:
+            print(f"  {tv_show} #{index}: {tv_quotes[tv_show][index]}")
+        for tv_show in shows:
+            dropped.update([key for key in keys if key[0] == tv_show][1:])
+        report.append({
+            'shows': shows,
+            'quotes': [{'show': tv_show, 'index': index, 'text': tv_quotes[tv_show][index]} for tv_show, index in keys],
+            'min_similarity': round(min(pairs.values()), 3),
+        })
+
+    cross_show = sum(1 for item in report if len(item['shows']) > 1)
+    print(f"共 {len(clusters)} 个近似重复簇（其中跨剧集 {cross_show} 个），同一剧集内可合并 {len(dropped)} 条台词。")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({'threshold': threshold, 'clusters': report}, f, ensure_ascii=False, indent=4)
+        print(f"报告已写入：{os.path.abspath(report_path)}")
+
+    if merge:
+        # 与 `lines --dedupe-lines`、build / watch 的 --dedupe-lines 写入相同的结果
+        written = sum(save_quotes_to_json(tv_show, tv_quotes[tv_show], dedupe=threshold)
+                      for tv_show in sorted({tv_show for tv_show, _ in dropped}))
+        print(f"已合并重复台词，写入 {written} 个 init.json。"
+              f"之后运行 lines / build / watch 时请加上 --dedupe-lines {threshold}，否则会恢复 tv_quotes 中的重复台词。")
+    pipeline_metrics.write_report(METRICS_FILE)
+    return clusters
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="将 tv_quotes 中的台词写入各剧集的 init.json")
+    parser.add_argument('--append', action='store_true', help='将台词追加到 init.json 已有的 lines 之后 (去重，保持顺序)，而不是整体替换')
+    add_dedupe_argument(parser)
+    pipeline_profiling.add_profile_argument(parser)
+    subparsers = parser.add_subparsers(dest='command', help='不带子命令时写入所有台词')
+    parser_dedupe = subparsers.add_parser('dedupe', help='查找 (并可合并) 近似重复的台词 (MinHash/LSH)')
+    parser_dedupe.add_argument('--threshold', type=float, default=text_similarity.DEFAULT_THRESHOLD, help='字符二元组 Jaccard 相似度阈值 (默认: %(default)s)')
+    parser_dedupe.add_argument('--merge', action='store_true', help='将同一剧集内的重复台词合并后写入 init.json 的 lines')
+    parser_dedupe.add_argument('--report', metavar='PATH', help='将重复簇以 JSON 格式写入该文件')
+    pipeline_logging.add_to_sub_commands(subparsers, pipeline_profiling.add_profile_argument)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    check_dedupe_argument(parser, args)
+    if args.command == 'dedupe':
+        if not 0 < args.threshold <= 1:
+            parser.error("--threshold 必须在 (0, 1] 之间")
+        pipeline_profiling.run(args.profile, PROFILE_NAME, dedupe_quotes, args.threshold, args.merge, args.report)
+    else:
+        pipeline_profiling.run(args.profile, PROFILE_NAME, save_all_quotes, args.append, args.dedupe_lines)
 
-# 处理所有电视剧
-for tv_show, quotes in tv_quotes.items():
-    save_quotes_to_json(tv_show, quotes)
 
-print("所有电视剧台词已保存完毕！")
+if __name__ == "__main__":
+    main()
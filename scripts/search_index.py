@@ -0,0 +1,618 @@
+"""
+Full-text search over the quotes (lines, inline_lines), overviews and thoughts of every show
+(`shuangju search "部分台词"`).
+
+Text is NFKC-normalized and case-folded, and every run of letters/digits is indexed as
+overlapping character bigrams with their positions, plus a (last char, end) term per run, so
+any substring of two or more characters is found as a phrase and a single character through
+the terms it starts. Matches are ranked with BM25 (phrase occurrences against text length)
+weighted by field.
+
+The index lives in .cache/search/ as immutable segment files plus manifest.json, which
+records each show's init.json stamp (size, mtime) and the segment holding its current
+version. An update only tokenizes the shows whose init.json changed into a new, small
+segment; older copies of those shows are simply no longer live. Once there are more than
+MAX_SEGMENTS segments the smaller ones are merged, copying the encoded postings without
+decoding them. Queries mmap the segments and only decode the postings of the query's terms.
+
+`--export PATH` merges everything into one segment file, the compact form for the app to
+memory-map. Segment format (little-endian; fixed-width tables, absolute section offsets):
+
+    header   '<4s10I'   magic b'SJIX', version, show/doc/term counts, total normalized text
+                        length, offsets of the show, doc, term, postings and string sections
+    shows    '<IIII'    name offset, name length (in strings), first doc, doc count
+    docs     '<7I'      show, field, key offset, key length, text offset, text length,
+                        normalized length
+    terms    '<QI'      key (first char << 21 | second char, 0 = end of run), postings offset
+                        relative to the section; sorted by key, a term's postings end where
+                        the next term's begin
+    postings varint document frequency, then per show: varint show, varint doc count,
+             varint byte length, and per doc: varint doc delta (within the show), varint
+             position count, varint position deltas
+    strings  UTF-8
+"""
+import argparse
+import logging
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+import unicodedata
+from pathlib import Path
+import manage_tv_shows
+import pipeline_metrics
+
+INDEX_DIR = manage_tv_shows.CACHE_DIR / "search"
+MANIFEST_FILE = INDEX_DIR / "manifest.json"
+MANIFEST_VERSION = 1
+INDEX_MAGIC = b'SJIX'
+INDEX_VERSION = 1
+# More segments than this and the smaller ones are merged into one
+MAX_SEGMENTS = 8
+# Indexed init.json fields and their weight in the ranking
+FIELDS = ('lines', 'inline_lines', 'thoughts', 'overview')
+FIELD_WEIGHTS = {'lines': 1.0, 'inline_lines': 1.0, 'thoughts': 0.8, 'overview': 0.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_LIMIT = 10
+
+_HEADER = struct.Struct('<4s10I')
+_SHOW = struct.Struct('<IIII')
+_DOC = struct.Struct('<7I')
+_TERM = struct.Struct('<QI')
+END_OF_RUN = 0
+# Unicode code points fit in 21 bits
+CHAR_BITS = 21
+
+
+# --- Tokenizing ---
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def text_runs(text):
+    """Yields (start, run) for every maximal run of letters/digits in normalized `text`."""
+    start = None
+    for position, char in enumerate(text):
+        if char.isalnum():
+            if start is None:
+                start = position
+        elif start is not None:
+            yield start, text[start:position]
+            start = None
+    if start is not None:
+        yield start, text[start:]
+
+
+def term_positions(text):
+    """{term key: [positions]} of normalized `text`."""
+    terms = {}
+    for start, run in text_runs(text):
+        codes = [ord(char) for char in run] + [END_OF_RUN]
+        for offset in range(len(run)):
+            terms.setdefault(codes[offset] << CHAR_BITS | codes[offset + 1], []).append(start + offset)
+    return terms
+
+
+def _varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def show_documents(show_dir):
+    """[(field, key, text)] of one show's init.json."""
+    data = manage_tv_shows.load_show_json(show_dir)
+    documents = []
+    for field in FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            items = [('', value)]
+        elif isinstance(value, list):
+            items = [(str(index), item) for index, item in enumerate(value)]
+        elif isinstance(value, dict):
+            items = list(value.items())
+        else:
+            continue
+        documents.extend((field, str(key), text) for key, text in items if isinstance(text, str) and text.strip())
+    return documents
+
+
+def tokenize_show(show_dir):
+    """Returns ([(field, key, text, normalized length)], {term key: (doc count, encoded postings)})."""
+    documents = []
+    postings = {}
+    for doc, (field, key, text) in enumerate(show_documents(show_dir)):
+        normalized = normalize(text)
+        documents.append((field, key, text, len(normalized)))
+        for term, positions in term_positions(normalized).items():
+            entry = postings.get(term)
+            if entry is None:
+                postings[term] = entry = [0, 0, bytearray()]  # doc count, previous doc, bytes
+            _varint(doc - entry[1], entry[2])
+            entry[0] += 1
+            entry[1] = doc
+            _varint(len(positions), entry[2])
+            previous = 0
+            for position in positions:
+                _varint(position - previous, entry[2])
+                previous = position
+    return documents, {term: (count, bytes(data)) for term, (count, _, data) in postings.items()}
+
+
+# --- Segments ---
+
+class SegmentWriter:
+    """Collects shows (tokenized, or copied from other segments) and writes one segment file."""
+
+    def __init__(self):
+        self.shows = bytearray()
+        self.docs = bytearray()
+        self.strings = bytearray()
+        self.terms = {}  # term key -> [document frequency, [encoded chunks]]
+        self.show_count = self.doc_count = self.total_length = 0
+
+    def _add_string(self, data):
+        offset = len(self.strings)
+        self.strings += data
+        return offset, len(data)
+
+    def _add_show(self, name, documents):
+        """documents: [(field id, key bytes, text bytes, normalized length)]; returns the show id."""
+        show_id = self.show_count
+        self.shows += _SHOW.pack(*self._add_string(name.encode('utf-8')), self.doc_count, len(documents))
+        for field_id, key, text, length in documents:
+            self.docs += _DOC.pack(show_id, field_id, *self._add_string(key), *self._add_string(text), length)
+            self.total_length += length
+        self.show_count += 1
+        self.doc_count += len(documents)
+        return show_id
+
+    def _add_chunk(self, term, show_id, doc_count, body):
+        chunk = bytearray()
+        for value in (show_id, doc_count, len(body)):
+            _varint(value, chunk)
+        chunk += body
+        entry = self.terms.get(term)
+        if entry is None:
+            self.terms[term] = entry = [0, []]
+        entry[0] += doc_count
+        entry[1].append(chunk)
+
+    def add_tokenized_show(self, name, documents, postings):
+        field_ids = {field: index for index, field in enumerate(FIELDS)}
+        show_id = self._add_show(name, [(field_ids[field], key.encode('utf-8'), text.encode('utf-8'), length)
+                                        for field, key, text, length in documents])
+        for term, (doc_count, body) in postings.items():
+            self._add_chunk(term, show_id, doc_count, body)
+
+    def add_segment_shows(self, segment, names):
+        """Copies the shows `names` of `segment` over, postings still encoded."""
+        id_map = {}
+        for name in names:
+            old_id = segment.show_ids[name]
+            first_doc, doc_count = segment.show_docs(old_id)
+            documents = [segment.raw_document(doc) for doc in range(first_doc, first_doc + doc_count)]
+            id_map[old_id] = self._add_show(name, documents)
+        if not id_map:
+            return
+        for index in range(segment.term_count):
+            term = None
+            for old_id, doc_count, start, end in segment.chunks(index):
+                if old_id in id_map:
+                    term = segment.term_key(index) if term is None else term
+                    self._add_chunk(term, id_map[old_id], doc_count, segment.raw(start, end))
+
+    def write(self, path):
+        term_table = bytearray()
+        postings = bytearray()
+        for term in sorted(self.terms):
+            frequency, chunks = self.terms[term]
+            term_table += _TERM.pack(term, len(postings))
+            _varint(frequency, postings)
+            postings += b''.join(chunks)
+        shows_offset = _HEADER.size
+        docs_offset = shows_offset + len(self.shows)
+        terms_offset = docs_offset + len(self.docs)
+        postings_offset = terms_offset + len(term_table)
+        strings_offset = postings_offset + len(postings)
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.show_count, self.doc_count, len(self.terms),
+                                 self.total_length, shows_offset, docs_offset, terms_offset, postings_offset, strings_offset))
+            for section in (self.shows, self.docs, term_table, postings, self.strings):
+                f.write(section)
+        os.replace(temp_path, path)
+
+
+class Segment:
+    """Read-only view of one segment file through mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.show_count, self.doc_count, self.term_count, self.total_length, self._shows,
+         self._docs, self._terms, self._postings, self._strings) = _HEADER.unpack_from(self._data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            self._data.close()
+            raise ValueError(f"{path} is not a version {INDEX_VERSION} search index")
+        self.show_names = []
+        self.first_docs = []
+        for show_id in range(self.show_count):
+            name_offset, name_length, first_doc, _ = _SHOW.unpack_from(self._data, self._shows + show_id * _SHOW.size)
+            self.show_names.append(self._bytes(name_offset, name_length).decode('utf-8'))
+            self.first_docs.append(first_doc)
+        self.show_ids = {name: show_id for show_id, name in enumerate(self.show_names)}
+
+    @staticmethod
+    def count_shows(path):
+        """Show count from the header, without mapping the file."""
+        with open(path, 'rb') as f:
+            return _HEADER.unpack(f.read(_HEADER.size))[2]
+
+    def close(self):
+        self._data.close()
+
+    def raw(self, start, end):
+        return self._data[start:end]
+
+    def _bytes(self, offset, length):
+        start = self._strings + offset
+        return self._data[start:start + length]
+
+    def show_docs(self, show_id):
+        """(first doc, doc count) of a show."""
+        return _SHOW.unpack_from(self._data, self._shows + show_id * _SHOW.size)[2:]
+
+    def doc_info(self, doc):
+        """(show id, field id, normalized length) of a doc."""
+        values = _DOC.unpack_from(self._data, self._docs + doc * _DOC.size)
+        return values[0], values[1], values[6]
+
+    def raw_document(self, doc):
+        """(field id, key bytes, text bytes, normalized length) of a doc."""
+        _, field_id, key_offset, key_length, text_offset, text_length, length = _DOC.unpack_from(self._data, self._docs + doc * _DOC.size)
+        return field_id, self._bytes(key_offset, key_length), self._bytes(text_offset, text_length), length
+
+    def document(self, doc):
+        field_id, key, text, length = self.raw_document(doc)
+        return {'show': self.show_names[self.doc_info(doc)[0]], 'field': FIELDS[field_id], 'key': key.decode('utf-8'),
+                'text': text.decode('utf-8'), 'length': length}
+
+    def term_key(self, index):
+        return _TERM.unpack_from(self._data, self._terms + index * _TERM.size)[0]
+
+    def lower_bound(self, key):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, key):
+        index = self.lower_bound(key)
+        return index if index < self.term_count and self.term_key(index) == key else None
+
+    def _postings_range(self, index):
+        start = _TERM.unpack_from(self._data, self._terms + index * _TERM.size)[1]
+        end = (_TERM.unpack_from(self._data, self._terms + (index + 1) * _TERM.size)[1]
+               if index + 1 < self.term_count else self._strings - self._postings)
+        return self._postings + start, self._postings + end
+
+    def document_frequency(self, index):
+        return _read_varint(self._data, self._postings_range(index)[0])[0]
+
+    def chunks(self, index):
+        """Yields (show id, doc count, body start, body end) of a term's postings."""
+        data = self._data
+        position, end = self._postings_range(index)
+        _, position = _read_varint(data, position)
+        while position < end:
+            show_id, position = _read_varint(data, position)
+            doc_count, position = _read_varint(data, position)
+            length, position = _read_varint(data, position)
+            yield show_id, doc_count, position, position + length
+            position += length
+
+    def decode_postings(self, index, live_shows=None, out=None):
+        """Adds one term's postings to {doc: [positions]}, skipping shows not in `live_shows`."""
+        out = {} if out is None else out
+        data = self._data
+        for show_id, doc_count, position, _ in self.chunks(index):
+            if live_shows is not None and show_id not in live_shows:
+                continue
+            doc = self.first_docs[show_id]
+            for _ in range(doc_count):
+                delta, position = _read_varint(data, position)
+                doc += delta
+                count, position = _read_varint(data, position)
+                positions = out.setdefault(doc, [])
+                value = 0
+                for _ in range(count):
+                    delta, position = _read_varint(data, position)
+                    value += delta
+                    positions.append(value)
+        return out
+
+    def phrase_matches(self, run, live_shows=None):
+        """{doc: [start positions]} of the phrase `run` (normalized letters/digits)."""
+        if len(run) == 1:
+            # Every occurrence of a single character starts one of the terms (char, *)
+            code = ord(run)
+            matches = {}
+            for index in range(self.lower_bound(code << CHAR_BITS), self.lower_bound((code + 1) << CHAR_BITS)):
+                self.decode_postings(index, live_shows, matches)
+            return {doc: sorted(starts) for doc, starts in matches.items()}
+
+        terms = []
+        for offset in range(len(run) - 1):
+            index = self.find(ord(run[offset]) << CHAR_BITS | ord(run[offset + 1]))
+            if index is None:
+                return {}
+            terms.append((self.document_frequency(index), offset, index))
+        # Start from the rarest bigram so the candidate set is small from the beginning
+        terms.sort()
+        matches = None
+        for _, offset, index in terms:
+            shifted = {doc: {position - offset for position in positions}
+                       for doc, positions in self.decode_postings(index, live_shows).items()
+                       if matches is None or doc in matches}
+            if matches is None:
+                matches = shifted
+            else:
+                matches = {doc: starts & shifted[doc] for doc, starts in matches.items() if doc in shifted}
+                matches = {doc: starts for doc, starts in matches.items() if starts}
+            if not matches:
+                return {}
+        return {doc: sorted(starts) for doc, starts in matches.items()}
+
+
+# --- Index (manifest + segments) ---
+
+def load_manifest():
+    manifest = manage_tv_shows.load_cache(MANIFEST_FILE)
+    if manifest.get('version') != MANIFEST_VERSION:
+        manifest = {'version': MANIFEST_VERSION, 'next_segment': 0, 'segments': [], 'shows': {}}
+    return manifest
+
+
+def _new_segment_name(manifest):
+    name = f"segment-{manifest['next_segment']:06d}.bin"
+    manifest['next_segment'] += 1
+    return name
+
+
+def _live_shows(manifest):
+    """{segment file: [names of the shows whose current version it holds]}"""
+    live = {name: [] for name in manifest['segments']}
+    for show, entry in manifest['shows'].items():
+        live[entry['segment']].append(show)
+    return live
+
+
+def merge_segments(manifest, segment_names, path):
+    """Writes the live shows of `segment_names` into one segment file at `path`."""
+    live = _live_shows(manifest)
+    writer = SegmentWriter()
+    for segment_name in segment_names:
+        segment = Segment(INDEX_DIR / segment_name)
+        try:
+            writer.add_segment_shows(segment, sorted(live[segment_name]))
+        finally:
+            segment.close()
+    writer.write(path)
+
+
+def update_index(base_path=None, force=False):
+    """
+    Indexes the shows whose init.json changed into a new segment, merging segments when there
+    are too many. Returns (re-indexed or removed show count, total show count).
+    """
+    base_path = base_path or manage_tv_shows.TV_SHOWS_BASE_PATH
+    manifest = load_manifest()
+    if force:
+        manifest['shows'] = {}
+    current = {}
+    for entry in os.scandir(base_path):
+        if entry.is_dir(follow_symlinks=False):
+            try:
+                stat = os.stat(os.path.join(entry.path, 'init.json'))
+            except OSError:
+                continue
+            current[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+    removed = [name for name in manifest['shows'] if name not in current]
+    changed = sorted(name for name, stamp in current.items()
+                     if manifest['shows'].get(name, {}).get('stamp') != stamp)
+    if not removed and not changed:
+        return 0, len(current)
+
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    for name in removed:
+        del manifest['shows'][name]
+    if changed:
+        writer = SegmentWriter()
+        for name in changed:
+            with pipeline_metrics.stage('search.tokenize', name):
+                writer.add_tokenized_show(name, *tokenize_show(base_path / name))
+        segment_name = _new_segment_name(manifest)
+        writer.write(INDEX_DIR / segment_name)
+        manifest['segments'].append(segment_name)
+        for name in changed:
+            manifest['shows'][name] = {'stamp': current[name], 'segment': segment_name}
+
+    # Drop segments without live shows, then merge the smaller ones if there are too many
+    live = _live_shows(manifest)
+    manifest['segments'] = [name for name in manifest['segments'] if live[name]]
+    if len(manifest['segments']) > MAX_SEGMENTS:
+        sizes = {name: os.path.getsize(INDEX_DIR / name) for name in manifest['segments']}
+        largest = max(manifest['segments'], key=sizes.get)
+        largest_segment = Segment(INDEX_DIR / largest)
+        # The largest segment is only rewritten once most of its shows have newer versions
+        mostly_dead = len(live[largest]) * 2 < largest_segment.show_count
+        largest_segment.close()
+        to_merge = [name for name in manifest['segments'] if name != largest or mostly_dead]
+        segment_name = _new_segment_name(manifest)
+        with pipeline_metrics.stage('search.merge', segment_name):
+            merge_segments(manifest, to_merge, INDEX_DIR / segment_name)
+        for entry in manifest['shows'].values():
+            if entry['segment'] in to_merge:
+                entry['segment'] = segment_name
+        manifest['segments'] = [name for name in manifest['segments'] if name not in to_merge] + [segment_name]
+
+    manifest['shows'] = dict(sorted(manifest['shows'].items()))
+    manage_tv_shows.save_cache(MANIFEST_FILE, manifest)
+    for entry in os.scandir(INDEX_DIR):
+        if entry.name.startswith('segment-') and entry.name not in manifest['segments']:
+            os.remove(entry.path)
+    return len(changed) + len(removed), len(current)
+
+
+def export_index(path):
+    """Merges the current version of every show into one segment file at `path`."""
+    manifest = load_manifest()
+    segments = manifest['segments']
+    if len(segments) == 1 and Segment.count_shows(INDEX_DIR / segments[0]) == len(manifest['shows']):
+        shutil.copyfile(INDEX_DIR / segments[0], path)
+    else:
+        merge_segments(manifest, segments, Path(path))
+
+
+class SearchIndex:
+    """Searches the live shows of all segments in the manifest, or one exported segment file."""
+
+    def __init__(self, path=None):
+        self.segments = []  # [(Segment, live show ids or None for all)]
+        if path is not None:
+            self.segments.append((Segment(path), None))
+        else:
+            manifest = load_manifest()
+            for name, shows in _live_shows(manifest).items():
+                segment = Segment(INDEX_DIR / name)
+                self.segments.append((segment, {segment.show_ids[show] for show in shows}))
+        self.show_count = self.doc_count = 0
+        for segment, live in self.segments:
+            show_ids = range(segment.show_count) if live is None else live
+            self.show_count += len(show_ids)
+            self.doc_count += sum(segment.show_docs(show_id)[1] for show_id in show_ids)
+        # Superseded copies of shows count too, close enough for length normalization
+        total_docs = sum(segment.doc_count for segment, _ in self.segments)
+        total_length = sum(segment.total_length for segment, _ in self.segments)
+        self.average_length = total_length / total_docs if total_docs else 1.0
+
+    def close(self):
+        for segment, _ in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Returns up to `limit` (score, document, [(start, end)] of the first phrase's matches),
+        best first. Every letter/digit run of the query must occur as a phrase.
+        """
+        runs = [run for _, run in text_runs(normalize(query))]
+        if not runs or not self.doc_count:
+            return []
+        scores = None
+        highlights = {}
+        for run_index, run in enumerate(runs):
+            matches = {}
+            for segment_index, (segment, live) in enumerate(self.segments):
+                for doc, starts in segment.phrase_matches(run, live).items():
+                    if scores is None or (segment_index, doc) in scores:
+                        matches[(segment_index, doc)] = starts
+            if not matches:
+                return []
+            idf = math.log(1 + (self.doc_count - len(matches) + 0.5) / (len(matches) + 0.5))
+            run_scores = {}
+            for (segment_index, doc), starts in matches.items():
+                length = self.segments[segment_index][0].doc_info(doc)[2]
+                tf = len(starts)
+                run_scores[(segment_index, doc)] = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length))
+                if run_index == 0:
+                    highlights[(segment_index, doc)] = [(start, start + len(run)) for start in starts]
+            scores = run_scores if scores is None else {key: scores[key] + value for key, value in run_scores.items()}
+
+        results = []
+        for (segment_index, doc), score in scores.items():
+            field_id = self.segments[segment_index][0].doc_info(doc)[1]
+            results.append((score * FIELD_WEIGHTS[FIELDS[field_id]], segment_index, doc))
+        results.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return [(score, self.segments[segment_index][0].document(doc), highlights[(segment_index, doc)])
+                for score, segment_index, doc in results[:limit]]
+
+
+def format_result(document, spans):
+    """'show [field key] text' with the first match in 【】 (positions are in normalized text)."""
+    text = document['text']
+    if spans and len(normalize(text)) == len(text):
+        start, end = spans[0]
+        text = f"{text[:start]}【{text[start:end]}】{text[end:]}"
+    key = f" {document['key']}" if document['key'] else ""
+    return f"{document['show']} [{document['field']}{key}] {text}"
+
+
+# --- Main Execution ---
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Search quotes, overviews and thoughts of all shows (character-bigram index).")
+    parser.add_argument('query', nargs='*', help='Words or partial phrases; every one must match.')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help='Number of results (default: %(default)s).')
+    parser.add_argument('--no-update', action='store_true', help='Search the existing index without checking for changed init.json files.')
+    parser.add_argument('--rebuild', action='store_true', help='Re-index every show.')
+    parser.add_argument('--export', metavar='PATH', help='Write the whole index as one mmap-friendly segment file (format in search_index.py).')
+    parser.add_argument('--index', metavar='PATH', help='Search an exported index file instead of the cache.')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if not args.query and not args.export and not args.rebuild:
+        parser.error("nothing to search for")
+
+    if not args.index and (not args.no_update or args.rebuild or not MANIFEST_FILE.exists()):
+        started = time.perf_counter()
+        changed, total = update_index(force=args.rebuild)
+        if changed:
+            logging.info(f"Search index updated: {changed} of {total} shows re-indexed in {time.perf_counter() - started:.2f}s.")
+    if args.export:
+        export_index(os.path.abspath(args.export))
+        logging.info(f"Search index exported to {args.export} ({os.path.getsize(args.export) / 1024:.0f} KB).")
+    if not args.query:
+        return
+
+    with SearchIndex(args.index) as index:
+        started = time.perf_counter()
+        results = index.search(" ".join(args.query), args.limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for rank, (score, document, spans) in enumerate(results, 1):
+            print(f"{rank:>3}. {format_result(document, spans)}  ({score:.2f})")
+        print(f"{len(results)} result(s) in {elapsed_ms:.1f} ms ({index.doc_count} texts, {index.show_count} shows)")
+    if not results:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
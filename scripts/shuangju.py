@@ -0,0 +1,73 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "requests",
+#     "Pillow",
+# ]
+# ///
+"""
+Single entry point for the asset pipeline (run from the project root):
+
+    python scripts/shuangju.py fetch "剧名" ...                 create_and_fetch_tvshows.py
+    python scripts/shuangju.py images rename-images ...         manage_tv_shows.py image sub-commands
+    python scripts/shuangju.py json --action add --key ...      manage_tv_shows.py json
+    python scripts/shuangju.py lines                            save_lines.py
+    python scripts/shuangju.py lines dedupe [--merge]           save_lines.py near-duplicate quotes
+    python scripts/shuangju.py archive                          create_tvshows_archive.py
+    python scripts/shuangju.py build                            build_pipeline.py (all of the above, incremental)
+    python scripts/shuangju.py watch                            watch_pipeline.py (rebuild on every change)
+    python scripts/shuangju.py search "部分台词"                search_index.py
+    python scripts/shuangju.py serve serve                      dev_server.py
+    python scripts/shuangju.py sources [--write]                check_sources.py
+
+A sub-command's module (and with it requests / Pillow) is only imported when that
+sub-command runs, so `--help` and the cheap sub-commands start quickly. The modules are
+also a library: importing e.g. `manage_tv_shows` has no side effects (no log file, no
+network, no Pillow until an image is touched).
+"""
+import argparse
+import importlib
+import sys
+
+# name -> (module, arguments prepended to the forwarded ones, help)
+COMMANDS = {
+    'fetch': ('create_and_fetch_tvshows', [], 'Search TMDB and create show folders, init.json, cover and stills.'),
+    'images': ('manage_tv_shows', [], 'Image sub-commands: rename-images, similar, optimize, benchmark-formats, placeholders, crops, render-cards, themesongs, budget.'),
+    'json': ('manage_tv_shows', ['json'], 'Add or delete a field in the init.json files.'),
+    'lines': ('save_lines', [], 'Write the quotes from save_lines.py into the init.json files (dedupe: find near-duplicate quotes).'),
+    'archive': ('create_tvshows_archive', [], 'Pack assets/tv_shows into assets/tv_shows_archive.zip (verify: check CRCs, simulate the app\'s extraction).'),
+    'build': ('build_pipeline', [], 'Run fetch, lines, rename-images and archive, only for what changed.'),
+    'watch': ('watch_pipeline', [], 'Rebuild the changed shows, catalog index and archive whenever assets change.'),
+    'search': ('search_index', [], 'Search the quotes, overviews and thoughts of all shows.'),
+    'serve': ('dev_server', [], 'Serve assets/tv_shows over HTTP for testing the app (serve / stress).'),
+    'sources': ('check_sources', [], 'Probe the play sources in assets/sources.json and rank them by health and latency.'),
+}
+IMAGE_COMMANDS = ['rename-images', 'similar', 'optimize', 'benchmark-formats', 'placeholders', 'crops', 'render-cards', 'themesongs', 'budget']
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog='shuangju',
+        description="ShuangJu asset pipeline.",
+        epilog="commands:\n" + "\n".join(f"  {name:<9} {help_text}" for name, (_, _, help_text) in COMMANDS.items())
+               + "\n\nRun 'shuangju <command> --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    # Only the command name is parsed here, everything after it belongs to the command's own parser
+    args = parser.parse_args(argv[:1])
+    forwarded = argv[1:]
+
+    module_name, prefix, _ = COMMANDS[args.command]
+    if args.command == 'images' and forwarded and not forwarded[0].startswith('-') and forwarded[0] not in IMAGE_COMMANDS:
+        parser.error(f"unknown images command '{forwarded[0]}' (choose from {', '.join(IMAGE_COMMANDS)})")
+
+    module = importlib.import_module(module_name)
+    # With a prefix (json) the module's own sub-command parser already adds the command name
+    prog = "shuangju" if prefix else f"shuangju {args.command}"
+    return module.main(prefix + forwarded, prog=prog)
+
+
+if __name__ == "__main__":
+    main()
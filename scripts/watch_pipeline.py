@@ -0,0 +1,360 @@
+# /// script
+# requires-python = ">=3.13"
+# dependencies = [
+#     "Pillow",
+# ]
+# ///
+"""
+Watch mode (`shuangju watch`): keeps the catalog index and the archive current while stills
+and quotes are being curated.
+
+Changes under assets/tv_shows and to save_lines.py are picked up through inotify (Linux, via
+ctypes) or, elsewhere or with --poll, by re-stat'ing the catalog every --poll-interval seconds.
+A burst of changes is debounced into one rebuild, which only touches the affected shows:
+
+    quotes edited   -> init.json "lines" of the shows whose quotes changed
+    show changed    -> rename/convert its stills, refresh its catalog.json entries,
+                       re-pack its folder in assets/tv_shows_archive.zip (other entries are
+                       copied over compressed, see create_tvshows_archive.patch_archive)
+
+Results are recorded in .cache/build_state.json, so a later `shuangju build` sees them as
+up to date. Titles without a show folder still need `shuangju build` (fetching is not watched).
+"""
+import argparse
+import ctypes
+import ctypes.util
+import importlib
+import logging
+import os
+import select
+import struct
+import sys
+import time
+import build_pipeline
+import create_tvshows_archive
+import manage_tv_shows
+import pipeline_logging
+import pipeline_metrics
+import save_lines
+
+LOG_FILE = 'watch_pipeline.log'
+METRICS_FILE = pipeline_metrics.metrics_path_for(LOG_FILE)
+QUOTES_FILE = os.path.abspath(save_lines.__file__)
+# Quiet period (s) after the last change before rebuilding, and the longest a change may wait
+DEBOUNCE_SECONDS = 0.5
+MAX_DELAY_SECONDS = 3.0
+POLL_INTERVAL = 1.0
+# Change keys besides show folder names (which can't contain '/')
+ROOT_KEY = '/'  # a file directly in assets/tv_shows (catalog.json)
+QUOTES_KEY = '/quotes'  # save_lines.py
+RESCAN_KEY = '/rescan'  # events were lost, compare every show
+
+# <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (the name follows)
+
+
+class InotifyWatcher:
+    """Reports changed keys using Linux inotify; raises OSError where it isn't available."""
+
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, base_path, quotes_file):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}  # watch descriptor -> directory
+        self.base_path = str(base_path)
+        self.quotes_file = quotes_file
+        # Editors often replace a file instead of writing it, so watch its directory
+        self._add_watch(os.path.dirname(quotes_file))
+        self._add_tree(self.base_path)
+        logging.info(f"Watching {len(self._directories)} directories with inotify.")
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # ENOSPC: fs.inotify.max_user_watches is too low for the catalog
+            raise OSError(error, f"inotify_add_watch({directory}) failed: {os.strerror(error)}")
+        self._directories[wd] = directory
+
+    def _add_tree(self, directory):
+        self._add_watch(directory)
+        for root, dirs, _ in os.walk(directory):
+            for name in dirs:
+                self._add_watch(os.path.join(root, name))
+
+    def poll(self, timeout):
+        """Returns the keys changed within `timeout` seconds (None waits for the next change)."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return set()
+        keys = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _INOTIFY_EVENT.size:offset + _INOTIFY_EVENT.size + length].rstrip(b'\0'))
+            offset += _INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                keys.add(RESCAN_KEY)
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_tree(path)
+                except OSError as e:
+                    logging.warning(f"Cannot watch new directory {path}: {e}")
+                    keys.add(RESCAN_KEY)
+            key = self._key(path, mask & IN_ISDIR)
+            if key:
+                keys.add(key)
+        return keys
+
+    def _key(self, path, is_dir):
+        if path == self.quotes_file:
+            return QUOTES_KEY
+        relative = os.path.relpath(path, self.base_path)
+        if relative.startswith(os.pardir):
+            return None  # another file next to save_lines.py
+        top, sep, _ = relative.partition(os.sep)
+        return top if sep or is_dir else ROOT_KEY
+
+
+class PollingWatcher:
+    """Fallback watcher: re-stats the catalog every `interval` seconds and reports what changed."""
+
+    def __init__(self, base_path, quotes_file, interval=POLL_INTERVAL):
+        self.base_path = base_path
+        self.quotes_file = quotes_file
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+        logging.info(f"Polling {len(self._snapshot[0])} show folders every {interval:g}s.")
+
+    def _scan(self):
+        shows, root = {}, {}
+        for entry in os.scandir(self.base_path):
+            if entry.is_dir(follow_symlinks=False):
+                shows[entry.name] = build_pipeline.directory_fingerprint(entry.path)
+            else:
+                root[entry.name] = build_pipeline.file_stamp(entry.path)
+        return shows, root, build_pipeline.file_stamp(self.quotes_file)
+
+    def poll(self, timeout):
+        delay = max(0.0, self._next_scan - time.monotonic())
+        if timeout is not None and timeout < delay:
+            time.sleep(timeout)
+            return set()
+        time.sleep(delay)
+        self._next_scan = time.monotonic() + self.interval
+        (old_shows, old_root, old_quotes), self._snapshot = self._snapshot, self._scan()
+        shows, root, quotes = self._snapshot
+        keys = {name for name in old_shows.keys() | shows.keys() if old_shows.get(name) != shows.get(name)}
+        if old_root != root:
+            keys.add(ROOT_KEY)
+        if old_quotes != quotes:
+            keys.add(QUOTES_KEY)
+        return keys
+
+
+class IncrementalBuilder:
+    """Rebuilds the shows behind a set of change keys and records the result in the build state."""
+
+    def __init__(self, args, converter):
+        self.args = args
+        self.converter = converter
+        self.base_path = manage_tv_shows.TV_SHOWS_BASE_PATH
+        self.options_key = build_pipeline.image_options_key(args)
+        self.format_key = build_pipeline.archive_format_key(args)
+        self.state = build_pipeline.load_state()
+        self.fingerprints = self._current_fingerprints()
+        self.root_stamps = self._root_stamps()
+
+    def _current_fingerprints(self):
+        return {entry.name: build_pipeline.directory_fingerprint(entry.path)
+                for entry in os.scandir(self.base_path) if entry.is_dir(follow_symlinks=False)}
+
+    def _root_stamps(self):
+        return {entry.name: build_pipeline.file_stamp(entry.path)
+                for entry in os.scandir(self.base_path) if not entry.is_dir(follow_symlinks=False)}
+
+    def catch_up(self):
+        """Rebuilds whatever changed since the last build / watch session."""
+        recorded = self.state['shows']
+        keys = {name for name, fingerprint in self.fingerprints.items()
+                if recorded.get(name, {}).get('fingerprint') != fingerprint or recorded[name].get('options') != self.options_key}
+        keys |= {name for name in recorded if name not in self.fingerprints}
+        # Forget the fingerprints of those shows so rebuild() doesn't take them as unchanged
+        for name in keys:
+            self.fingerprints.pop(name, None)
+        if self.state['archive'].get('tree') != build_pipeline.tree_fingerprint(self.base_path, self.fingerprints):
+            keys.add(ROOT_KEY)
+            self.root_stamps = {}
+        archive_stale = (self.state['archive'].get('zip') != build_pipeline.file_stamp(build_pipeline.ARCHIVE_PATH)
+                         or self.state['archive'].get('format', self.format_key) != self.format_key)
+        if keys or archive_stale:
+            logging.info(f"Catching up on {len(keys)} change(s) since the last build.")
+        self.rebuild(keys | {QUOTES_KEY}, full_archive=archive_stale)
+
+    def _sync_quotes(self):
+        """Reloads save_lines.py and writes the quotes that changed; returns the affected show folders."""
+        try:
+            importlib.reload(save_lines)
+        except Exception as e:
+            logging.error(f"Could not reload {QUOTES_FILE}, keeping the previous quotes: {e}")
+            return set()
+        folders = set()
+        for title, quotes in save_lines.tv_quotes.items():
+            folder = self.state['fetched'].get(title, title)
+            if not (self.base_path / folder).is_dir():
+                logging.warning(f"[{title}] No show folder yet, run 'shuangju build' to fetch it.")
+                continue
+            if save_lines.save_quotes_to_json(folder, quotes, dedupe=self.args.dedupe_lines):
+                folders.add(folder)
+        return folders
+
+    def rebuild(self, keys, full_archive=False):
+        started = time.perf_counter()
+        if QUOTES_KEY in keys:
+            keys = keys | self._sync_quotes()
+        if RESCAN_KEY in keys:
+            current = self._current_fingerprints()
+            keys = keys | {name for name in current.keys() | self.fingerprints.keys() if current.get(name) != self.fingerprints.get(name)}
+            keys.add(ROOT_KEY)
+
+        # Events caused by our own renames/writes leave the fingerprint as we recorded it
+        changed = {}
+        for name in sorted(key for key in keys if not key.startswith('/')):
+            show_dir = self.base_path / name
+            fingerprint = build_pipeline.directory_fingerprint(show_dir) if show_dir.is_dir() else None
+            if fingerprint != self.fingerprints.get(name):
+                changed[name] = show_dir if fingerprint else None
+        root_changed = ROOT_KEY in keys and self._root_stamps() != self.root_stamps
+        if not changed and not root_changed and not full_archive:
+            return
+
+        existing = [show_dir for show_dir in changed.values() if show_dir is not None]
+        failed = []
+        for show_dir in existing:
+            with pipeline_metrics.stage('watch.convert', show_dir.name):
+                if not manage_tv_shows.rename_and_convert_images(show_dir, self.args.output_format, self.args.quality, self.converter):
+                    failed.append(show_dir.name)
+        if changed:
+            with pipeline_metrics.stage('watch.catalog'):
+                manage_tv_shows.update_image_metadata(existing, self.args.workers)
+
+        for name, show_dir in changed.items():
+            if show_dir is None:
+                self.fingerprints.pop(name, None)
+                self.state['shows'].pop(name, None)
+            else:
+                self.fingerprints[name] = build_pipeline.directory_fingerprint(show_dir)
+                if name in failed:
+                    self.state['shows'].pop(name, None)
+                else:
+                    self.state['shows'][name] = {'fingerprint': self.fingerprints[name], 'options': self.options_key}
+
+        with pipeline_metrics.stage('watch.archive'):
+            if full_archive:
+                build_pipeline.build_archive(self.args.catalog_format, self.args.minify_json)
+            else:
+                create_tvshows_archive.patch_archive(str(self.base_path), str(build_pipeline.ARCHIVE_PATH), changed,
+                                                     self.args.catalog_format, self.args.minify_json)
+        self.root_stamps = self._root_stamps()
+        self.state['archive'] = {'tree': build_pipeline.tree_fingerprint(self.base_path, self.fingerprints),
+                                 'zip': build_pipeline.file_stamp(build_pipeline.ARCHIVE_PATH), 'format': self.format_key}
+        manage_tv_shows.save_cache(build_pipeline.STATE_FILE, self.state)
+
+        summary = f"Rebuilt {len(changed)} show(s) in {time.perf_counter() - started:.2f}s"
+        if changed:
+            summary += ": " + ", ".join(sorted(changed)[:5]) + (" ..." if len(changed) > 5 else "")
+        logging.log(logging.WARNING if failed else logging.INFO,
+                    summary + (f" (image errors in {', '.join(failed)})" if failed else ""))
+
+
+def watch(args):
+    base_path = manage_tv_shows.TV_SHOWS_BASE_PATH
+    base_path.mkdir(parents=True, exist_ok=True)
+    watcher = None
+    if not args.poll:
+        try:
+            watcher = InotifyWatcher(base_path, QUOTES_FILE)
+        except OSError as e:
+            logging.warning(f"inotify unavailable ({e}), falling back to polling.")
+    if watcher is None:
+        watcher = PollingWatcher(base_path, QUOTES_FILE, args.poll_interval)
+
+    with manage_tv_shows.BoundedImageConverter(args.workers, args.memory_budget, args.max_pixels) as converter:
+        builder = IncrementalBuilder(args, converter)
+        builder.catch_up()
+        logging.info("Waiting for changes (Ctrl+C to stop)...")
+        pending = set()
+        first_change = last_change = None
+        try:
+            while True:
+                if pending:
+                    now = time.monotonic()
+                    timeout = max(0.0, min(last_change + args.debounce, first_change + MAX_DELAY_SECONDS) - now)
+                else:
+                    timeout = None
+                keys = watcher.poll(timeout)
+                now = time.monotonic()
+                if keys:
+                    pending |= keys
+                    last_change = now
+                    first_change = first_change or now
+                if pending and (now - last_change >= args.debounce or now - first_change >= MAX_DELAY_SECONDS):
+                    keys, pending, first_change = pending, set(), None
+                    try:
+                        builder.rebuild(keys)
+                    except Exception as e:
+                        logging.error(f"Rebuild failed: {e}", exc_info=True)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
+    pipeline_metrics.write_report(METRICS_FILE)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Watch assets/tv_shows and save_lines.py and rebuild the affected shows, catalog index and archive.")
+    parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify.')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help='Seconds between two scans when polling (default: %(default)s).')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS, help=f'Seconds without changes before rebuilding (default: %(default)s, at most {MAX_DELAY_SECONDS:g}s after the first change).')
+    build_pipeline.add_image_arguments(parser)
+    create_tvshows_archive.add_format_arguments(parser)
+    save_lines.add_dedupe_argument(parser)
+    pipeline_logging.add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    create_tvshows_archive.check_format_arguments(parser, args)
+    save_lines.check_dedupe_argument(parser, args)
+
+    # save_lines and the archive use paths relative to the project root
+    os.chdir(manage_tv_shows.PROJECT_ROOT)
+    pipeline_logging.setup_logging(LOG_FILE, args.log_level, args.quiet)
+    watch(args)
+
+
+if __name__ == "__main__":
+    main()